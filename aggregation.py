@@ -0,0 +1,134 @@
+# 📁 aggregation.py
+# Shared, memoized aggregation layer for the Streamlit renderers.
+#
+# Every chart asks this module instead of queries.py directly. The rollup-based aggregates are
+# computed from the shared in-memory dataset (dataset.py), the scatter from the match-up table.
+# Results are kept in one process-wide LRU cache (bounded size + TTL) keyed by
+#     (query, region, variables, date or period, grid resolution, data version)
+# so moving a slider back and forth is a dictionary lookup. The data version is the one of the
+# shared snapshot (dataset.refresher swaps in a new one when ingest bumps the store's marker);
+# when it changes the cache is dropped and the next request recomputes from the new snapshot.
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+from config import cache_max_entries, cache_ttl_seconds, native_grid, default_region, scatter_max_points
+import queries
+import dataset
+import raster
+import regions
+import telemetry
+
+
+class AggregationCache:
+    def __init__(self, max_entries=cache_max_entries, ttl=cache_ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()    # key -> (stored_at, value)
+        self.lock = threading.Lock()
+        self.version = None
+        self.hits, self.misses = 0, 0
+
+    # Data version of the shared snapshot (no store query here: dataset.refresher polls the store)
+    def current_version(self):
+        version = dataset.snapshot().version
+        with self.lock:
+            if version != self.version:
+                if self.version is not None:
+                    print(f"🔄 Data version {self.version} -> {version}, clearing aggregation cache")
+                self.entries.clear()
+                self.version = version
+        return self.version
+
+    def get(self, key, compute):
+        key = key + (self.current_version(),)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                telemetry.count("aggregation_cache_hits")
+                return entry[1]
+        self.misses += 1
+        telemetry.count("aggregation_cache_misses")
+
+        with telemetry.stage(f"query_{key[0]}"):
+            value = compute()  # OUTSIDE THE LOCK - OTHER SESSIONS KEEP HITTING THE CACHE MEANWHILE
+
+        with self.lock:
+            self.entries[key] = (now, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses, "version": self.version}
+
+
+# One cache per process, shared by every dashboard session
+cache = AggregationCache()
+
+
+# In-memory dataset of the current data version (shared by every session, refreshed in the background)
+def snapshot():
+    return dataset.snapshot()
+
+
+def _day(date):
+    return None if date is None else pd.Timestamp(date).strftime("%Y-%m-%d")
+
+
+# Average value per grid cell for a period ('before'/'after') or a single date, in one region.
+# `resolution` is a grid level name (grids.pick_grid); each level is cached side by side.
+def aggregate_for_heatmap(variables, period=None, date=None, resolution=None, region=None):
+    variables = tuple(variables)
+    resolution = resolution or native_grid
+    region = region or default_region
+    if period is not None:
+        return cache.get(("heatmap", region, variables, period, resolution),
+                         lambda: snapshot().period_cell_means(variables, period, resolution, region))
+    if date is not None:
+        return cache.get(("heatmap", region, variables, _day(date), resolution),
+                         lambda: snapshot().day_cell_means(variables, date, resolution, region))
+    return cache.get(("heatmap", region, variables, "all", resolution),
+                     lambda: snapshot().cell_means(variables, grid=resolution, region=region))
+
+
+# The same heatmap rendered server-side to a PNG map layer over the region's bbox (raster.py).
+# Cached like the cells, so a view is rasterized once per data version.
+def heatmap_image(variables, period=None, date=None, resolution=None, region=None):
+    variables = tuple(variables)
+    resolution = resolution or native_grid
+    region = region or default_region
+    view = period or _day(date) or "all"
+    return cache.get(("heatmap_image", region, variables, view, resolution),
+                     lambda: raster.rasterize(aggregate_for_heatmap(variables, period, date, resolution, region),
+                                              resolution, regions.bbox_of(region)))
+
+
+def daily_totals(variables, region=None):
+    variables, region = tuple(variables), region or default_region
+    return cache.get(("daily_totals", region, variables, None, None), lambda: snapshot().daily_totals(variables, region))
+
+
+def period_stats(variables, split_date, region=None):
+    variables, region = tuple(variables), region or default_region
+    return cache.get(("period_stats", region, variables, _day(split_date), None),
+                     lambda: snapshot().period_stats(variables, split_date, region))
+
+
+def available_dates(variables, region=None):
+    variables, region = tuple(variables), region or default_region
+    return cache.get(("available_dates", region, variables, None, None), lambda: snapshot().available_dates(variables, region))
+
+
+def matchup(chl_variables, flh_variables, region=None, max_points=scatter_max_points, max_distance=None):
+    variables, region = tuple(chl_variables) + tuple(flh_variables), region or default_region
+    return cache.get(("matchup", region, variables, (max_points, max_distance), None),
+                     lambda: queries.matchup(chl_variables, flh_variables, region, max_points, max_distance))
@@ -1,12 +1,18 @@
 import streamlit as st
 import pandas as pd
-import pymysql
-from config import db_config
+import queries
 from PIL import Image
 import os
+import time
 import plotly.express as px
 from chlorophyll_analysis import render_chlorophyll_analysis
 from flh_analysis import render_flh_analysis
+import regions
+import telemetry
+import dataset
+
+telemetry.serve()   # PROMETHEUS_PORT: /metrics for the dashboard process (started once)
+dataset.start_refresher()   # NEW DATA IS LOADED AND SWAPPED IN BY A BACKGROUND THREAD (started once)
 
 st.set_page_config(
     page_title="OceanX Analysis",
@@ -28,13 +34,12 @@ try:
 except Exception as e:
     st.title("OceanX Analysis")
 
-@st.cache_data(show_spinner="Loading data from database...")
-def load_data():
-    conn = pymysql.connect(**db_config)                       
-    query = "SELECT * FROM satellite_metrics_simple ORDER BY date DESC"
-    df = pd.read_sql(query, conn)
-    conn.close()
-    return df
+# The renderers query exactly the aggregates they draw (see queries.py),
+# so startup only checks that there is something to show
+@telemetry.timed("app_has_data")
+@st.cache_data(show_spinner="Connecting to data store...", ttl=60)
+def has_data():
+    return queries.has_data()
 
 # Inject custom CSS for tabs
 st.markdown('''
@@ -63,40 +68,36 @@ st.markdown('''
 
 # Load and display the data
 with st.spinner("Loading data..."):
-    df = load_data()
-
-    if not df.empty:
-        # Rename columns if they exist
-        rename_dict = {}
-        if "variable" in df.columns:
-            rename_dict["variable"] = "Measurement"
-        if "latitude" in df.columns:
-            rename_dict["latitude"] = "Latitude"
-        if "longitude" in df.columns:
-            rename_dict["longitude"] = "Longitude"
-        df.rename(columns=rename_dict, inplace=True)
-
-        # Convert numeric columns
-        numeric_columns = ['Latitude', 'Longitude', 'value']
-        for col in numeric_columns:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
+    if has_data():
+        # Region picker (regions.json) - every chart below is for this region
+        region = st.selectbox("Region", regions.names(), format_func=regions.label, key="region")
 
-        # Create tabs for navigation
-        tab1, tab2 = st.tabs(["Chlorophyll Analysis", "Fluorescence Analysis"])
+        # Create tabs for navigation - switching tabs reruns the page and only the open tab is computed
+        tab1, tab2 = st.tabs(["Chlorophyll Analysis", "Fluorescence Analysis"], key="analysis_tab", on_change="rerun")
         
-        with tab1:
-            st.markdown(
-                '<div style="color:#fff;font-size:3.5rem;font-weight:700;line-height:1;margin-bottom:1.5rem;">Chlorophyll Analysis</div>',
-                unsafe_allow_html=True
-            )
-            render_chlorophyll_analysis(df)
+        if tab1.open:
+            with tab1:
+                st.markdown(
+                    '<div style="color:#fff;font-size:3.5rem;font-weight:700;line-height:1;margin-bottom:1.5rem;">Chlorophyll Analysis</div>',
+                    unsafe_allow_html=True
+                )
+                render_chlorophyll_analysis(region)
         
-        with tab2:
-            st.markdown(
-                '<div style="color:#fff;font-size:3.5rem;font-weight:700;line-height:1;margin-bottom:1.5rem;">Fluorescence Analysis</div>',
-                unsafe_allow_html=True
+        if tab2.open:
+            with tab2:
+                st.markdown(
+                    '<div style="color:#fff;font-size:3.5rem;font-weight:700;line-height:1;margin-bottom:1.5rem;">Fluorescence Analysis</div>',
+                    unsafe_allow_html=True
+                )
+                render_flh_analysis(region)
+
+        # Data refresh state (dataset.py): which data version this page shows and how long it took to load
+        refresh = dataset.refresher.status()
+        if refresh["loaded_at"]:
+            st.caption(
+                f"🔄 Data version {refresh['version']} · loaded {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(refresh['loaded_at']))} "
+                f"in {refresh['load_seconds']:.2f}s · {refresh['rows']:,} rows in memory ({refresh['bytes'] / 1e6:.1f} MB)"
+                + (f" · ⚠️ last refresh failed: {refresh['error']}" if refresh["error"] else "")
             )
-            render_flh_analysis(df)
     else:
         st.warning("No data found in the database.")
@@ -0,0 +1,631 @@
+# 📁 benchmark.py
+# Offline benchmarks for the pipeline. Nothing here talks to NASA or the production database.
+#
+# DB benchmarks need a local MySQL-compatible stand-in, e.g.:
+#   docker run -d -p 3306:3306 -e MARIADB_ALLOW_EMPTY_ROOT_PASSWORD=1 -e MARIADB_DATABASE=oceanx_bench mariadb --local-infile=1
+#   python benchmark.py insert --rows 200000
+#   python benchmark.py pool --queries 200                       # connection per query vs db_pool
+#
+# Point it somewhere else with BENCH_DB_HOST / BENCH_DB_PORT / BENCH_DB_USER / BENCH_DB_PASSWORD / BENCH_DB_NAME.
+#
+# Extraction benchmarks only need synthetic NetCDF fixtures:
+#   python benchmark.py extract --granules 5 --extent global
+#   python benchmark.py read --extent global
+#   python benchmark.py pipeline --days 10 --extent fixture       # fetch_and_process offline (fixtures instead of earthaccess)
+#   python benchmark.py aggregate --rows 10000,1000000,10000000   # lake rollups + dashboard queries at each size
+#   python benchmark.py cube --rows 10000,1000000,10000000        # dense cube vs lake: bytes on disk + the same aggregates
+#
+# Every command takes --json; results carry the git commit, so runs can be compared:
+#   python benchmark.py all --json bench/$(git rev-parse --short HEAD).json
+#   python benchmark.py compare bench/old.json bench/new.json --threshold 10
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pymysql
+import xarray as xr
+from config import bbox, variable_list, grid_levels, native_grid, default_region
+import aggregation
+import cube
+import database
+import dataset
+import db_pool
+import fixtures
+import granule_cache
+import ingest
+import lake
+import queries
+import regions
+import telemetry
+
+BENCH_TABLE = "satellite_metrics_bench"
+
+bench_db_config = {
+    "host": os.getenv("BENCH_DB_HOST", "127.0.0.1"),
+    "user": os.getenv("BENCH_DB_USER", "root"),
+    "password": os.getenv("BENCH_DB_PASSWORD", ""),
+    "database": os.getenv("BENCH_DB_NAME", "oceanx_bench"),
+    "port": int(os.getenv("BENCH_DB_PORT", "3306")),
+}
+
+
+# Fake metrics rows shaped like fetch_and_process output: every day is one granule of distinct 4km
+# pixels (~70% of a square grid centred on the region - the grid grows with n_rows / n_days, like a
+# bigger region would), metadata as categoricals so 10M rows fit in memory
+def synthetic_metrics(n_rows, n_days=10, seed=0):
+    rng = np.random.default_rng(seed)
+    step = grid_levels[native_grid]
+    per_day = np.diff(np.linspace(0, n_rows, n_days + 1).astype(np.int64))
+    side = int(np.ceil(np.sqrt(max(per_day.max(), 1) / 0.7)))
+    west = np.floor(((bbox[0] + bbox[2]) / 2) / step - side / 2) * step       # ON THE 4KM BIN EDGES (grids.bin_coord)
+    south = np.floor(((bbox[1] + bbox[3]) / 2) / step - side / 2) * step
+
+    days = pd.date_range("2024-12-15", periods=n_days, freq="D")
+    cells = np.concatenate([rng.choice(side * side, k, replace=False) for k in per_day])
+    day_idx = np.repeat(np.arange(n_days), per_day)
+    names = [fixtures.granule_filename("PACE_OCI_L3M_CHL", d) for d in days]
+    release = pd.Timestamp(regions.event_date())
+    return pd.DataFrame({
+        "region": pd.Categorical.from_codes(np.zeros(n_rows, dtype=np.int8), [default_region]),
+        "product": pd.Categorical.from_codes(np.zeros(n_rows, dtype=np.int8), ["PACE_OCI_L3M_CHL"]),
+        "filename": pd.Categorical.from_codes(day_idx.astype(np.int32), names),
+        "date": days.values[day_idx],
+        "period": pd.Categorical.from_codes((days.values[day_idx] >= release.to_datetime64()).astype(np.int8), ["before", "after"]),
+        "variable": pd.Categorical.from_codes(np.zeros(n_rows, dtype=np.int8), ["chlor_a"]),
+        "latitude": (south + (cells // side + 0.5) * step).astype(np.float32),
+        "longitude": (west + (cells % side + 0.5) * step).astype(np.float32),
+        "value": rng.lognormal(-1.0, 0.8, n_rows).astype(np.float32),
+        "units": pd.Categorical.from_codes(np.zeros(n_rows, dtype=np.int8), ["mg m^-3"]),
+    })
+
+
+# Legacy path kept for comparison: whole frame -> list of tuples -> one executemany
+def load_executemany(conn, cur, df, table):
+    insert_sql = f"INSERT INTO {table} ({', '.join(database.METRIC_COLUMNS)}) VALUES ({', '.join(['%s'] * len(database.METRIC_COLUMNS))})"
+    started = time.perf_counter()
+    rows = [tuple(row) for row in df[database.METRIC_COLUMNS].values]
+    cur.executemany(insert_sql, rows)
+    conn.commit()
+    seconds = max(time.perf_counter() - started, 1e-9)
+    return {"method": "executemany", "rows": len(rows), "bytes": None, "seconds": seconds,
+            "rows_per_s": len(rows) / seconds, "bytes_per_s": None}
+
+
+# The full incremental path ingest uses (MetricsSink.write: one transaction per granule, rollups
+# updated in the same transaction) against the bench database's own, emptied, tables
+def load_sink(conn, df):
+    cur = conn.cursor()
+    for table in [database.METRICS_TABLE, database.LOAD_LOG_TABLE, database.DAILY_TABLE,
+                  database.DAILY_CELLS_TABLE, database.PERIOD_CELLS_TABLE, database.MATCHUPS_TABLE]:
+        cur.execute(f"TRUNCATE TABLE {table}")
+    conn.commit()
+    sink = database.MetricsSink()
+    sink.pool = db_pool.ConnectionPool(bench_db_config, local_infile=True)    # USED ONLY IF IT HAS TO RECONNECT
+    sink.conn, sink.cur = conn, cur
+    started = time.perf_counter()
+    sink.write(df)
+    seconds = max(time.perf_counter() - started, 1e-9)
+    return {"method": "sink", "rows": len(df), "bytes": sink.totals.get("bytes"), "seconds": seconds,
+            "rows_per_s": len(df) / seconds, "bytes_per_s": None, "granules": sink.loaded, "failed": sink.failed}
+
+
+# Times executemany vs multi-row INSERT batches vs LOAD DATA LOCAL INFILE into a scratch table,
+# then the whole MetricsSink path (load + rollups) into the bench database's real tables
+def bench_insert(n_rows, batch_rows):
+    df = synthetic_metrics(n_rows)
+    conn = pymysql.connect(**bench_db_config, local_infile=True)
+    results = []
+    try:
+        database.migrate(conn)
+        cur = conn.cursor()
+        cur.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+        cur.execute(f"CREATE TABLE {BENCH_TABLE} LIKE {database.METRICS_TABLE}")
+        conn.commit()
+
+        for method in ["executemany", "multirow", "infile"]:
+            cur.execute(f"TRUNCATE TABLE {BENCH_TABLE}")
+            if method == "executemany":
+                stats = load_executemany(conn, cur, df, BENCH_TABLE)
+            else:
+                stats = database.bulk_load(conn, cur, df, method=method, table=BENCH_TABLE, batch_rows=batch_rows)
+                stats["method"] = method if stats["method"] == method else f"{method}->{stats['method']}"
+            results.append(stats)
+            database.print_throughput(stats)
+
+        cur.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+        conn.commit()
+        cur.close()
+
+        stats = load_sink(conn, df)
+        results.append(stats)
+        print(f"⏱️ sink (load + rollups): {stats['rows_per_s']:,.0f} rows/s over {stats['granules']} granules")
+    finally:
+        conn.close()
+    return {"benchmark": "insert", "rows": n_rows, "batch_rows": batch_rows, "results": results}
+
+
+# Legacy extraction kept for comparison: to_dataframe().reset_index() per variable,
+# metadata as full-length object columns, then rename + dropna
+def process_granule_dataframe(file_path, product):
+    file_path = Path(file_path)
+    frames = []
+    with xr.open_dataset(file_path) as ds:
+        date = pd.to_datetime(file_path.name.split(".")[1][:8])
+        for var_name, var_data in ds.data_vars.items():
+            if var_name.lower() == 'palette' or var_name.lower() not in variable_list:
+                continue
+            subset = var_data.sel({'lon': slice(bbox[0], bbox[2]), 'lat': slice(bbox[3], bbox[1])})
+            df = subset.to_dataframe().reset_index()
+            df['product'] = product
+            df['filename'] = file_path.name
+            df['date'] = date
+            df['period'] = regions.period_of(date)
+            df['variable'] = var_name
+            df['units'] = var_data.attrs.get('units', None)
+            df = df.rename(columns={'lat': 'latitude', 'lon': 'longitude', var_name: 'value'})
+            frames.append(df.dropna(subset=['value']))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+# Runs fn once under tracemalloc; returns (result, seconds, peak bytes allocated)
+def measure(fn, *args):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn(*args)
+    seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+# Per-granule time / peak memory / result size of the legacy vs the vectorized extraction
+# extent: "bbox" (just the region), "fixture" (fixtures.write_granule default) or "global" (full 4km grid)
+def bench_extract(n_granules, extent="fixture"):
+    extents = {"bbox": bbox, "fixture": (-66.0, -58.0, -52.0, -46.0), "global": None}
+    methods = {"to_dataframe": process_granule_dataframe, "vectorized": ingest.process_granule}
+    results = {method: [] for method in methods}
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"🧪 Writing {n_granules} synthetic granules ({extent})...")
+        paths = fixtures.make_granules(directory, "2024-12-15", pd.Timestamp("2024-12-15") + pd.Timedelta(days=n_granules - 1),
+                                       products=["PACE_OCI_L3M_CHL"], extent=extents[extent])
+        for path in paths:
+            ingest.process_granule(str(path), "PACE_OCI_L3M_CHL")          # WARM-UP (FILE CACHE, IMPORTS)
+            for method, fn in methods.items():
+                df, seconds, peak = measure(fn, str(path), "PACE_OCI_L3M_CHL")
+                results[method].append({"granule": path.name, "rows": len(df), "seconds": seconds,
+                                        "peak_bytes": peak, "frame_bytes": int(df.memory_usage(deep=True).sum())})
+
+    summary = []
+    for method, runs in results.items():
+        stats = {"method": method, "granules": len(runs),
+                 "rows_per_granule": int(np.mean([r["rows"] for r in runs])),
+                 "seconds_per_granule": float(np.median([r["seconds"] for r in runs])),
+                 "peak_bytes": int(max(r["peak_bytes"] for r in runs)),
+                 "frame_bytes": int(np.mean([r["frame_bytes"] for r in runs]))}
+        summary.append(stats)
+        print(f"⏱️ {method}: {stats['seconds_per_granule'] * 1000:.1f} ms/granule, peak {stats['peak_bytes'] / 1e6:.1f} MB, "
+              f"result {stats['frame_bytes'] / 1e6:.2f} MB for {stats['rows_per_granule']} rows")
+    return {"benchmark": "extract", "granules": n_granules, "extent": extent, "results": summary, "runs": results}
+
+
+# File wrapper counting the bytes the NetCDF reader actually pulls from storage
+class CountingFile:
+    def __init__(self, f):
+        self.f = f
+        self.bytes_read, self.reads = 0, 0
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.bytes_read += len(data)
+        self.reads += 1
+        return data
+
+    def readinto(self, buffer):
+        n = self.f.readinto(buffer)
+        self.bytes_read += n
+        self.reads += 1
+        return n
+
+    def __getattr__(self, name):
+        return getattr(self.f, name)
+
+
+# Bytes read / time for one granule: the legacy lazy .sel(bbox).values vs ingest's hyperslab read (bbox_slices)
+def bench_read(extent="global"):
+    extents = {"fixture": (-66.0, -58.0, -52.0, -46.0), "global": None}
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"🧪 Writing a synthetic {extent} granule...")
+        path = fixtures.write_granule(Path(directory) / fixtures.granule_filename("PACE_OCI_L3M_CHL", "2024-12-15"),
+                                      "PACE_OCI_L3M_CHL", "2024-12-15", extent=extents[extent])
+        for method in ["sel_values", "bbox_hyperslab"]:
+            with open(path, "rb") as raw:
+                f = CountingFile(raw)
+                started = time.perf_counter()
+                with xr.open_dataset(f, engine="h5netcdf") as ds:
+                    if method == "sel_values":                    # WHAT process_granule_dataframe READ
+                        ds["chlor_a"].sel({"lon": slice(bbox[0], bbox[2]), "lat": slice(bbox[3], bbox[1])}).values
+                    else:
+                        ds["chlor_a"].isel(ingest.bbox_slices(ds)).load()
+                seconds = time.perf_counter() - started
+            results.append({"method": method, "file_bytes": path.stat().st_size, "bytes_read": f.bytes_read,
+                            "reads": f.reads, "seconds": seconds})
+            print(f"📖 {method}: {f.bytes_read / 1e6:.2f} of {path.stat().st_size / 1e6:.2f} MB read "
+                  f"in {f.reads} reads, {seconds * 1000:.1f} ms")
+    return {"benchmark": "read", "extent": extent, "results": results}
+
+
+# fetch_and_process end to end, offline: fixture granules (both products) searched/downloaded through
+# fixtures.LocalGranuleSource instead of earthaccess, written to a scratch lake (or to no sink at all).
+# Per-stage seconds come from the run's telemetry (search, download, open, decode, subset, concat, write_*).
+def bench_pipeline(n_days, extent="fixture", workers=2, download_workers=2, mode="download", sink="lake"):
+    extents = {"bbox": bbox, "fixture": (-66.0, -58.0, -52.0, -46.0), "global": None}
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        start = pd.Timestamp("2024-12-15")
+        end = start + pd.Timedelta(days=n_days - 1)
+        print(f"🧪 Writing {n_days} days of synthetic granules ({extent})...")
+        fixtures.make_granules(directory / "source", start, end, extent=extents[extent])
+        source = fixtures.LocalGranuleSource(directory / "source")
+        sinks = [lake.LakeSink(directory / "lake")] if sink == "lake" else []
+
+        started = time.perf_counter()
+        jobs = ingest.search_jobs(source, start=f"{start:%Y-%m-%d}", end=f"{end:%Y-%m-%d}")
+        rows = ingest.fetch_and_process(source, sinks, download_workers=download_workers, process_workers=workers,
+                                        read_mode=mode, cache=granule_cache.GranuleCache(directory / "downloads"),
+                                        jobs=jobs, run="benchmark")
+        seconds = time.perf_counter() - started
+
+    summary = telemetry.current.summary()
+    granules = summary["counters"].get("granules", 0)
+    stages = [{"stage": name, "calls": stats["calls"], "seconds": stats["seconds"]}
+              for name, stats in sorted(summary["stages"].items())]
+    print(f"⏱️ pipeline: {granules} granules, {rows} rows in {seconds:.2f} s ({granules / seconds:.1f} granules/s)")
+    return {"benchmark": "pipeline", "days": n_days, "extent": extent, "workers": workers, "read_mode": mode, "sink": sink,
+            "results": [{"method": "fetch_and_process", "granules": granules, "rows": rows, "seconds": seconds,
+                         "granules_per_s": granules / seconds, "rows_per_s": rows / seconds,
+                         "peak_rss_bytes": summary["peak_rss_bytes"]}],
+            "stages": stages}
+
+
+# Median seconds of `repeat` calls of fn (the aggregation cache is emptied before each call when cold=True)
+def time_query(fn, repeat, cold=True):
+    times = []
+    for _ in range(repeat):
+        if cold:
+            aggregation.cache.clear()
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    return float(np.median(times)), len(result)
+
+
+# Query latency: a new connection per query (the old queries.run) vs the shared pool, on `n_queries` small queries
+def bench_pool(n_queries, pool_size=4):
+    sql = "SELECT 1 AS n"
+    results = []
+
+    started = time.perf_counter()
+    for _ in range(n_queries):
+        conn = pymysql.connect(**bench_db_config)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(sql)
+                cur.fetchall()
+        finally:
+            conn.close()
+    seconds = time.perf_counter() - started
+    results.append({"method": "connect_per_query", "queries": n_queries, "connects": n_queries, "seconds": seconds})
+
+    pool = db_pool.ConnectionPool(bench_db_config, size=pool_size)
+    started = time.perf_counter()
+    for _ in range(n_queries):
+        db_pool.read_df(sql, pool=pool)
+    seconds = time.perf_counter() - started
+    results.append({"method": "pooled", "queries": n_queries, "connects": pool.stats()["connects"], "seconds": seconds})
+    pool.close()
+
+    for r in results:
+        print(f"⏱️ {r['method']}: {1000 * r['seconds'] / n_queries:.2f} ms/query ({r['connects']} connections)")
+    return {"benchmark": "pool", "results": results}
+
+
+# Points the dashboard query layer (lake root, data source, snapshot) at a scratch lake for the block
+# and back to what it was afterwards, so later benchmarks / importers never see the deleted temp lake
+@contextmanager
+def scratch_lake(root):
+    saved = lake.lake_dir, queries.data_source
+    lake.lake_dir, queries.data_source = root, "lake"
+    queries.reset_connections()
+    dataset.refresher.checked_at = 0.0                                         # RE-POLL THE VERSION NOW
+    try:
+        yield root
+    finally:
+        lake.lake_dir, queries.data_source = saved
+        queries.reset_connections()
+        aggregation.cache.clear()
+        dataset.refresher.current, dataset.refresher.checked_at = None, 0.0   # NO SNAPSHOT OF THE SCRATCH DATA LEFT
+
+
+# Lake write + rollups + dashboard queries at each size in `sizes` (rows), on a scratch lake
+def bench_aggregate(sizes, n_days=30, repeat=3):
+    results = []
+    coarsest = max(grid_levels, key=grid_levels.get)
+    for n_rows in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            print(f"🧪 {n_rows:,} synthetic rows over {n_days} days...")
+            df = synthetic_metrics(n_rows, n_days)
+            runs = []
+
+            started = time.perf_counter()
+            for (filename, date), part in df.groupby(["filename", "date"], sort=False, observed=True):
+                lake.write_partition(part, default_region, "PACE_OCI_L3M_CHL", "chlor_a", date, filename, directory)
+            runs.append({"query": "lake_write", "seconds": time.perf_counter() - started, "rows_out": n_rows})
+
+            started = time.perf_counter()
+            lake.rebuild_rollups(directory)
+            runs.append({"query": "rollups_rebuild", "seconds": time.perf_counter() - started, "rows_out": n_days})
+
+            last_day = df["date"].max()
+            started = time.perf_counter()
+            lake.update_rollups(default_region, "chlor_a", last_day, directory)      # ONE INGESTED DAY (INCREMENTAL PATH)
+            runs.append({"query": "rollups_update_day", "seconds": time.perf_counter() - started, "rows_out": 1})
+            del df
+
+            with scratch_lake(directory):                                      # THE DASHBOARD QUERY LAYER ON THE SCRATCH LAKE
+                checks = {
+                    "heatmap_period_native": lambda: aggregation.aggregate_for_heatmap(["chlor_a"], period="before", resolution=native_grid),
+                    f"heatmap_period_{coarsest}": lambda: aggregation.aggregate_for_heatmap(["chlor_a"], period="before", resolution=coarsest),
+                    "heatmap_day_native": lambda: aggregation.aggregate_for_heatmap(["chlor_a"], date=last_day, resolution=native_grid),
+                    "daily_totals": lambda: aggregation.daily_totals(["chlor_a"]),
+                    "period_stats": lambda: pd.DataFrame(aggregation.period_stats(["chlor_a"], pd.Timestamp(regions.event_date()))),
+                }
+                for name, fn in checks.items():
+                    seconds, rows_out = time_query(fn, repeat)
+                    runs.append({"query": name, "seconds": seconds, "rows_out": rows_out})
+                checks["heatmap_period_native"]()                                   # PRIME THE CACHE
+                seconds, _ = time_query(checks["heatmap_period_native"], repeat, cold=False)
+                runs.append({"query": "heatmap_period_native_cached", "seconds": seconds, "rows_out": None})
+
+        for run in runs:
+            print(f"⏱️ {n_rows:>11,} rows  {run['query']:<28} {run['seconds'] * 1000:10.1f} ms")
+        results.append({"rows": n_rows, "days": n_days, "results": runs})
+    return {"benchmark": "aggregate", "repeat": repeat, "results": results}
+
+
+# Same synthetic data in the lake (long rows + rollups) and in a dense cube: bytes on disk, write time, and the
+# dashboard aggregates computed cold from each (lake: the rollup/raw queries, cube: reductions over the memmap)
+def bench_cube(sizes, n_days=30, repeat=3):
+    results = []
+    step = grid_levels[native_grid]
+    for n_rows in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            print(f"🧪 {n_rows:,} synthetic rows over {n_days} days...")
+            df = synthetic_metrics(n_rows, n_days)
+            lake_root, cube_root = Path(directory) / "lake", Path(directory) / "cube"
+            extent = (float(df["longitude"].min()) - step / 2, float(df["latitude"].min()) - step / 2,
+                      float(df["longitude"].max()) + step / 2, float(df["latitude"].max()) + step / 2)
+            frame_bytes = int(df.memory_usage(index=False, deep=True).sum())
+            runs = []
+
+            started = time.perf_counter()
+            for (filename, date), part in df.groupby(["filename", "date"], sort=False, observed=True):
+                lake.write_partition(part, default_region, "PACE_OCI_L3M_CHL", "chlor_a", date, filename, lake_root)
+            lake.rebuild_rollups(lake_root)
+            runs.append({"query": "lake_write", "seconds": time.perf_counter() - started, "rows_out": n_rows})
+
+            started = time.perf_counter()
+            c = cube.Cube(default_region, "chlor_a", cube_root, extent=extent)
+            for date, part in df.groupby("date", sort=False):
+                c.write_day(date, part["latitude"].to_numpy(), part["longitude"].to_numpy(), part["value"].to_numpy())
+            runs.append({"query": "cube_write", "seconds": time.perf_counter() - started, "rows_out": n_rows})
+            last_day, split = df["date"].max(), pd.Timestamp(regions.event_date())
+            del df
+
+            def disk_bytes(path):
+                return sum(f.stat().st_blocks * 512 for f in Path(path).rglob("*") if f.is_file())
+            storage = {"frame_bytes": frame_bytes, "lake_bytes": disk_bytes(lake_root / f"region={default_region}"),
+                       "rollup_bytes": disk_bytes(lake_root / "_rollups"), "cube_bytes": c.nbytes()}
+
+            c = cube.Cube(default_region, "chlor_a", cube_root)                 # A READER: FRESH INDEX, NO MAPS OPEN
+            with scratch_lake(lake_root):
+                checks = {
+                    "lake_daily_totals": lambda: queries.daily_totals(["chlor_a"]),
+                    "cube_daily_totals": lambda: c.daily_stats(),
+                    "lake_period_cells_native": lambda: queries.cell_means(["chlor_a"], None, split, native_grid),
+                    "cube_period_cells_native": lambda: c.cell_sums(None, split, native_grid),
+                    "lake_day_cells_native": lambda: queries.day_cell_means(["chlor_a"], last_day, native_grid),
+                    "cube_day_cells_native": lambda: c.cell_sums(last_day, last_day + pd.Timedelta(days=1), native_grid),
+                    "lake_day_pixels": lambda: pd.concat(queries.raw_row_chunks(["chlor_a"], last_day, last_day + pd.Timedelta(days=1))),
+                    "cube_day_pixels": lambda: c.day(last_day),
+                }
+                for name, fn in checks.items():
+                    seconds, rows_out = time_query(fn, repeat)
+                    runs.append({"query": name, "seconds": seconds, "rows_out": rows_out})
+
+        for name, value in storage.items():
+            print(f"💾 {n_rows:>11,} rows  {name:<28} {value / 1024 ** 2:10.2f} MB")
+        for run in runs:
+            print(f"⏱️ {n_rows:>11,} rows  {run['query']:<28} {run['seconds'] * 1000:10.1f} ms")
+        results.append({"rows": n_rows, "days": n_days, **storage, "results": runs})
+    return {"benchmark": "cube", "repeat": repeat, "results": results}
+
+
+# Where/when a result was produced, so JSON files from different commits can be told apart
+def run_info():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=Path(__file__).parent).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"commit": commit, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": sys.version.split()[0],
+            "platform": platform.platform(), "cpus": os.cpu_count()}
+
+
+# ---------- comparing two result files ----------
+
+LOWER_IS_BETTER = {"seconds", "seconds_per_granule", "peak_bytes", "frame_bytes", "bytes_read", "peak_rss_bytes",
+                   "lake_bytes", "rollup_bytes", "cube_bytes"}
+HIGHER_IS_BETTER = {"rows_per_s", "bytes_per_s", "granules_per_s"}
+NAME_KEYS = ["benchmark", "method", "query", "stage", "rows"]
+
+
+# {"aggregate/rows=10000/query=daily_totals/seconds": 0.01, ...} for every comparable number in a result
+def flatten(result, prefix=""):
+    flat = {}
+    if isinstance(result, dict):
+        for key, value in result.items():
+            if key in ("runs", "info"):                    # RAW PER-GRANULE RUNS / MACHINE INFO: NOT COMPARED
+                continue
+            if isinstance(value, (dict, list)):
+                flat.update(flatten(value, f"{prefix}{key}/"))
+            elif key in LOWER_IS_BETTER | HIGHER_IS_BETTER and isinstance(value, (int, float)):
+                flat[f"{prefix}{key}"] = float(value)
+    elif isinstance(result, list):
+        for i, item in enumerate(result):
+            name = next((f"{k}={item[k]}" for k in NAME_KEYS if isinstance(item, dict) and k in item), str(i))
+            flat.update(flatten(item, f"{prefix}{name}/"))
+    return flat
+
+
+# Prints every metric that moved by more than `threshold` percent; returns the number of regressions
+def compare(old_path, new_path, threshold=10.0):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"🔬 {old_path} ({old.get('info', {}).get('commit')}) -> {new_path} ({new.get('info', {}).get('commit')})")
+    old_flat, new_flat = flatten(old), flatten(new)
+    regressions = 0
+    for key in sorted(set(old_flat) & set(new_flat)):
+        before, after = old_flat[key], new_flat[key]
+        if before == 0:
+            continue
+        change = 100 * (after - before) / before
+        worse = change > threshold if key.rsplit("/", 1)[-1] in LOWER_IS_BETTER else change < -threshold
+        better = change < -threshold if key.rsplit("/", 1)[-1] in LOWER_IS_BETTER else change > threshold
+        if worse or better:
+            regressions += worse
+            print(f"{'🔴' if worse else '🟢'} {key}: {before:.4g} -> {after:.4g} ({change:+.1f}%)")
+    missing = sorted(set(old_flat) ^ set(new_flat))
+    if missing:
+        print(f"⚠️ {len(missing)} metrics only in one of the files (different sizes/options?)")
+    print(f"📊 {regressions} regressions over {threshold:.0f}% ({len(set(old_flat) & set(new_flat))} metrics compared)")
+    return regressions
+
+
+# Every offline benchmark (plus the DB one when the bench database answers) in one result
+def bench_all(args):
+    results = [bench_extract(args.granules, "fixture"), bench_read("global"),
+               bench_pipeline(args.days, "fixture"), bench_aggregate(args.rows, args.agg_days, args.repeat),
+               bench_cube(args.rows, args.agg_days, args.repeat)]
+    try:
+        pymysql.connect(**bench_db_config).close()
+        results.append(bench_insert(args.insert_rows, database.db_batch_rows))
+        results.append(bench_pool(200))
+    except pymysql.err.MySQLError as e:
+        print(f"⚠️ Skipping insert benchmark (no bench database: {e})")
+    return {"benchmark": "all", "results": results}
+
+
+def sizes(value):
+    return [int(float(v)) for v in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OceanX pipeline benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    insert = sub.add_parser("insert", help="DB load: executemany vs multi-row INSERT vs LOAD DATA vs MetricsSink")
+    insert.add_argument("--rows", type=int, default=200_000)
+    insert.add_argument("--batch-rows", type=int, default=database.db_batch_rows)
+    insert.add_argument("--json", help="write results to this JSON file")
+
+    extract = sub.add_parser("extract", help="granule extraction: to_dataframe vs vectorized NumPy")
+    extract.add_argument("--granules", type=int, default=5)
+    extract.add_argument("--extent", choices=["bbox", "fixture", "global"], default="fixture")
+    extract.add_argument("--json", help="write results to this JSON file")
+
+    read = sub.add_parser("read", help="NetCDF I/O: legacy .sel(bbox).values vs the bbox hyperslab read")
+    read.add_argument("--extent", choices=["fixture", "global"], default="global")
+    read.add_argument("--json", help="write results to this JSON file")
+
+    pipeline = sub.add_parser("pipeline", help="fetch_and_process end to end on fixture granules (no network)")
+    pipeline.add_argument("--days", type=int, default=10)
+    pipeline.add_argument("--extent", choices=["bbox", "fixture", "global"], default="fixture")
+    pipeline.add_argument("--workers", type=int, default=2)
+    pipeline.add_argument("--download-workers", type=int, default=2)
+    pipeline.add_argument("--read-mode", choices=["download", "remote"], default="download")
+    pipeline.add_argument("--sink", choices=["lake", "none"], default="lake")
+    pipeline.add_argument("--json", help="write results to this JSON file")
+
+    aggregate = sub.add_parser("aggregate", help="lake rollups + dashboard aggregation queries at several sizes")
+    aggregate.add_argument("--rows", type=sizes, default=[10_000, 1_000_000, 10_000_000], help="comma separated, e.g. 1e4,1e6")
+    aggregate.add_argument("--days", type=int, default=30)
+    aggregate.add_argument("--repeat", type=int, default=3)
+    aggregate.add_argument("--json", help="write results to this JSON file")
+
+    cubes = sub.add_parser("cube", help="dense cube vs lake: storage and the dashboard aggregates at several sizes")
+    cubes.add_argument("--rows", type=sizes, default=[10_000, 1_000_000, 10_000_000], help="comma separated, e.g. 1e4,1e6")
+    cubes.add_argument("--days", type=int, default=30)
+    cubes.add_argument("--repeat", type=int, default=3)
+    cubes.add_argument("--json", help="write results to this JSON file")
+
+    everything = sub.add_parser("all", help="extract + read + pipeline + aggregate + cube (+ insert if the bench DB is up)")
+    everything.add_argument("--granules", type=int, default=5)
+    everything.add_argument("--days", type=int, default=10)
+    everything.add_argument("--rows", type=sizes, default=[10_000, 1_000_000, 10_000_000])
+    everything.add_argument("--agg-days", type=int, default=30)
+    everything.add_argument("--repeat", type=int, default=3)
+    everything.add_argument("--insert-rows", type=int, default=200_000)
+    everything.add_argument("--json", help="write results to this JSON file")
+
+    pooling = sub.add_parser("pool", help="query latency: connection per query vs the db_pool connection pool")
+    pooling.add_argument("--queries", type=int, default=200)
+    pooling.add_argument("--json", help="write results to this JSON file")
+
+    diff = sub.add_parser("compare", help="compare two --json result files (exit code 1 on regressions)")
+    diff.add_argument("old")
+    diff.add_argument("new")
+    diff.add_argument("--threshold", type=float, default=10.0, help="percent change reported / failing")
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        sys.exit(1 if compare(args.old, args.new, args.threshold) else 0)
+    elif args.command == "insert":
+        result = bench_insert(args.rows, args.batch_rows)
+    elif args.command == "extract":
+        result = bench_extract(args.granules, args.extent)
+    elif args.command == "read":
+        result = bench_read(args.extent)
+    elif args.command == "pool":
+        result = bench_pool(args.queries)
+    elif args.command == "pipeline":
+        result = bench_pipeline(args.days, args.extent, args.workers, args.download_workers, args.read_mode, args.sink)
+    elif args.command == "aggregate":
+        result = bench_aggregate(args.rows, args.days, args.repeat)
+    elif args.command == "cube":
+        result = bench_cube(args.rows, args.days, args.repeat)
+    elif args.command == "all":
+        result = bench_all(args)
+    result["info"] = run_info()
+
+    if args.json:
+        Path(args.json).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2, default=str)
+        print(f"💾 Results saved to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,46 +1,28 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import duckdb
-from config import iron_release_date
+from config import default_region
 import os
 from PIL import Image
 import plotly.graph_objects as go
 import io
+import queries
+import aggregation
+import grids
+import regions
+import telemetry
+import export
+import raster
+
+CHL_VARIABLES = queries.variables_matching('CHL')
+
+# Heatmap zoom (the pyramid level is picked per region so the figure stays under HEATMAP_MAX_POINTS)
+HEATMAP_ZOOM = 6
  
-def aggregate_for_heatmap(df):    # AVG CHL + FHL PER LOCATION - TABLE
-    query = """
-    SELECT
-        Latitude AS lat_bin,
-        Longitude AS lon_bin,
-        AVG(value) AS avg_value
-    FROM df
-    GROUP BY lat_bin, lon_bin
-    """
-    return duckdb.query(query).to_df()
- 
-def plotly_heatmap(df, title="Heatmap"):       # AVERAGE CHL+ FLH PER LOC - HEATMAP
-    if df.empty:
+def plotly_heatmap(image, title="Heatmap"):       # AVERAGE CHL+ FLH PER LOC - HEATMAP
+    if image is None:
         st.warning("No data available for this selection.")
         return
-    px.set_mapbox_access_token("pk.eyJ1Ijoid2lsbHBlcmVpcmExMDgtIiwiYSI6ImNtYWRxeGloOTBhcWwybG9meWMybWQ0bG0ifQ.1PqKU69HpvY4u3LfqkthQw")  # User's real token
-    fig = px.density_mapbox(
-        df,
-        lat='lat_bin',
-        lon='lon_bin',
-        z='avg_value',
-        radius=10,
-        center=dict(lat=df['lat_bin'].mean(), lon=df['lon_bin'].mean()),
-        zoom=6,
-        mapbox_style='carto-darkmatter',
-        color_continuous_scale=[
-            [0, "#B2EBF2"],
-            [0.5, "#00bcd4"],
-            [1, "#003366"]
-        ],
-        title=title,
-        labels={'avg_value': 'Average Chlorophyll-a (mg/m³)'}
-    )
+    fig = raster.figure(image, title=title, colorbar_title='Average Chlorophyll-a (mg/m³)', zoom=HEATMAP_ZOOM)   # ONE SERVER-RENDERED IMAGE, NOT ONE POINT PER CELL
     fig.update_layout(
         margin={"r":0,"t":40,"l":0,"b":0},
         plot_bgcolor='rgba(0,0,0,0)',
@@ -48,7 +30,8 @@ def plotly_heatmap(df, title="Heatmap"):       # AVERAGE CHL+ FLH PER LOC - HEAT
     )
     st.plotly_chart(fig, use_container_width=True)
  
-def render_chlorophyll_analysis(df):    
+@telemetry.timed("render_chl")
+def render_chlorophyll_analysis(region=default_region):    
     # UI + TRANSAPRENCY
     st.markdown("""
     <style>
@@ -107,23 +90,24 @@ def render_chlorophyll_analysis(df):
     </style>
     """, unsafe_allow_html=True)
  
-    chl_df = df[df['Measurement'].str.contains('CHL', case=False, na=False)].copy() # FITLERS DF WHERE = CHL
-               
-    chl_df['date'] = pd.to_datetime(chl_df['date'])                                           # CONVERT TO DATE
- 
-    before_data = chl_df[chl_df['date'] < pd.to_datetime(iron_release_date)]                   # CHL DF PRE INSTALL
- 
-    after_data = chl_df[chl_df['date'] >= pd.to_datetime(iron_release_date)]                   # CHL DF POST INSTALL
+    dates = aggregation.available_dates(CHL_VARIABLES, region) # unique values for date in the store
+    if not dates:                                              # REGION WITHOUT CHL ROWS (YET)
+        st.info("No data for this region yet")
+        return
+    release = pd.to_datetime(regions.event_date(region))
+    grid = grids.pick_grid(HEATMAP_ZOOM, regions.bbox_of(region))                      # PYRAMID LEVEL FOR THIS REGION'S SIZE
+    stats = aggregation.period_stats(CHL_VARIABLES, release, region)                            # MEAN/TOTAL BEFORE + AFTER (COMPUTED IN THE DB)
+    before, after = stats['before'], stats['after']
    
    
    
     # ----- TOTAL CHL OVER REGION OVER TIME -----
     st.subheader("Total Chlorophyll-a in Region Over Time")
-    daily_totals = chl_df.groupby('date')['value'].sum().reset_index() # TOTAL CHL PER DATE - WHOLE REGION
+    daily_totals = aggregation.daily_totals(CHL_VARIABLES, region) # TOTAL CHL PER DATE - WHOLE REGION
     fig = go.Figure()
     fig.add_trace(go.Scatter(            
         x=daily_totals['date'],
-        y=daily_totals['value'],
+        y=daily_totals['total'],
         mode='lines',
         line=dict(width=3, color='#4FC3F7'),
         fill='tozeroy',
@@ -142,30 +126,30 @@ def render_chlorophyll_analysis(df):
     col1, col2 = st.columns(2)
     with col1:
         st.subheader("Before Iron Release")
-        agg_before = aggregate_for_heatmap(before_data)   #  HEATMAP BEFORE
+        agg_before = aggregation.heatmap_image(CHL_VARIABLES, period='before', resolution=grid, region=region)   #  HEATMAP BEFORE
         plotly_heatmap(agg_before, title="Heat map")
         st.metric(
             "Average Concentration",                    # AVERAGE CHL BEFORE
-            f"{before_data['value'].mean():.2f} mg/m³"
+            f"{before['mean']:.2f} mg/m³"
         )
         st.metric(
             "Total Concentration",                       # TOTAL CHL BEFORE
-            f"{before_data['value'].sum():.2f} mg/m³"
+            f"{before['total']:.2f} mg/m³"
         )
     with col2:
         st.subheader("After Iron Release")
-        agg_after = aggregate_for_heatmap(after_data)     # HEATMAP AFTER
+        agg_after = aggregation.heatmap_image(CHL_VARIABLES, period='after', resolution=grid, region=region)     # HEATMAP AFTER
         plotly_heatmap(agg_after, title="Heat map")
         st.metric(
             "Average Concentration",                   # AVERAGE CHL AFTER
-            f"{after_data['value'].mean():.2f} mg/m³"
+            f"{after['mean']:.2f} mg/m³"
         )
         st.metric(
             "Total Concentration",                   # TOTAL CHL AFTER
-            f"{after_data['value'].sum():.2f} mg/m³"
+            f"{after['total']:.2f} mg/m³"
         )
     # GROWTH % (moved below heatmaps)
-    st.metric("Growth Percentage", f"{((after_data['value'].mean() - before_data['value'].mean()) / before_data['value'].mean() * 100) if before_data['value'].mean() != 0 else 0:.1f}%")
+    st.metric("Growth Percentage", f"{((after['mean'] - before['mean']) / before['mean'] * 100) if before['mean'] != 0 else 0:.1f}%")
     st.markdown("<br>", unsafe_allow_html=True)
    
    
@@ -176,33 +160,29 @@ def render_chlorophyll_analysis(df):
  
  
     # SLIDER
-    dates = sorted(chl_df['date'].unique()) # unique values for date in df
-   
+    render_chl_day_heatmap(region, grid, dates)                # FRAGMENT: THE SLIDER RERUNS ONLY THIS HEATMAP
+ 
+    export.download_panel(region, CHL_VARIABLES, dates, key=f"download_chl_{region}")   # FILE IS BUILT ONLY ON CLICK
+
+
+# Single-day heatmap + its date slider. A fragment: moving the slider reruns this function only,
+# not the line chart / period heatmaps / metrics above it.
+@st.fragment
+@telemetry.timed("render_chl_day")
+def render_chl_day_heatmap(region, grid, dates):
+    if not dates:
+        st.info("No data for this region yet")
+        return
     selected_date = st.slider(                                        # SLIDER
         "Select Date",
         min_value=pd.to_datetime(min(dates)).to_pydatetime(),  # sets earlierst/ latest values for slider    
         max_value=pd.to_datetime(max(dates)).to_pydatetime(),
         value=pd.to_datetime(max(dates)).to_pydatetime(),      #set default value to latest date
         format="YYYY-MM-DD",
-        key="chl_date_slider"
+        key=f"chl_date_slider_{region}"
     )
  
-    time_data = chl_df[chl_df['date'] == selected_date]    # When the user moves the slider, this line filters the chlorophyll data to only include rows for the selected date
-   
- 
- 
-   
-    agg_time = aggregate_for_heatmap(time_data)    # ALLOWS SLIDER TO AFFECT CHL DF & AGGREGATE FOR HEATMAP
+    agg_time = aggregation.heatmap_image(CHL_VARIABLES, date=selected_date, resolution=grid, region=region)    # When the user moves the slider, only the selected date is aggregated (and only this fragment reruns)
    
    
     plotly_heatmap(agg_time, title=f"{selected_date.strftime('%Y-%m-%d')}")  # HEATMAP ????????
- 
-   
-    csv = df.to_csv(index=False)              # CSV DOWNLOAD
-    st.download_button(
-        label="Download raw data as CSV",
-        data=csv,
-        file_name='raw_data.csv',
-        mime='text/csv',
-        key='download_chl_csv'
-    )
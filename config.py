@@ -1,5 +1,6 @@
 import pathlib  # To handle folder paths
 import os
+import json
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
@@ -18,9 +19,14 @@ EARTHDATA_PASSWORD = os.getenv('EARTHDATA_PASSWORD')
 # Product list to search for
 product_list = ["PACE_OCI_L3M_CHL", "PACE_OCI_L3M_FLH"]  # Removed PFT since it's not available
 
+# Variables extracted from each granule (must match the ENUM in the database schema)
+variable_list = ["chlor_a", "nflh", "flh"]
+
 # Create download directory if it doesn't exist
 download_dir = os.getenv('DOWNLOAD_DIR', 'downloads')
 os.makedirs(download_dir, exist_ok=True)
+# Downloaded granules are kept in download_dir as a persistent cache (granule_cache.py), bounded to this size
+granule_cache_max_bytes = int(float(os.getenv('GRANULE_CACHE_MAX_GB', '20')) * 1024 ** 3)
 
 # Date range for satellite data search
 start_date = os.getenv('START_DATE', '2024-12-15')
@@ -33,6 +39,17 @@ iron_release_date = "2024-12-28"
 # Format: (min_lon, min_lat, max_lon, max_lat)
 bbox = (-61.5, -53.2, -57.5, -50.9)
 
+# Region registry: name -> bbox + event date (+ a label for the dashboard). Every region is extracted
+# from the same granule pass and its rows are tagged with the name (lowercase letters, digits, _).
+# The default region is the Falklands site above; more sites go in REGIONS_FILE, e.g.
+#   {"south_georgia": {"bbox": [-39.0, -55.5, -34.5, -53.0], "event_date": "2025-02-10", "label": "South Georgia"}}
+default_region = "falklands"
+regions = {default_region: {"bbox": bbox, "event_date": iron_release_date, "label": "Falkland Islands"}}
+regions_file = os.getenv("REGIONS_FILE", "regions.json")
+if os.path.exists(regions_file):
+    with open(regions_file) as f:
+        regions.update({name: {**r, "bbox": tuple(r["bbox"])} for name, r in json.load(f).items()})
+
 
 
 
@@ -46,3 +63,82 @@ db_config = {
     "port": int(os.getenv("DB_PORT", "25060")),  # Convert port to integer with default value
     "ssl": {"ssl": {}}
 }
+
+# Bulk loading: rows per INSERT/LOAD DATA batch, and whether to try LOAD DATA LOCAL INFILE first
+db_batch_rows = int(os.getenv("DB_BATCH_ROWS", "5000"))
+db_local_infile = os.getenv("DB_LOCAL_INFILE", "true").lower() == "true"
+
+# Connection pool (db_pool.py): connections kept per process, max age, idle time before a health-check ping,
+# max wait for a free connection; retries on transient errors (with exponential backoff); rows per streamed chunk
+db_pool_size = int(os.getenv("DB_POOL_SIZE", "4"))
+db_pool_recycle_seconds = float(os.getenv("DB_POOL_RECYCLE_SECONDS", "3600"))
+db_pool_ping_seconds = float(os.getenv("DB_POOL_PING_SECONDS", "30"))
+db_pool_timeout = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+db_retry_attempts = int(os.getenv("DB_RETRY_ATTEMPTS", "3"))
+db_retry_backoff = float(os.getenv("DB_RETRY_BACKOFF", "0.5"))
+db_stream_rows = int(os.getenv("DB_STREAM_ROWS", "50000"))
+
+# Ingest concurrency: download threads, processing processes (0 = process in a thread, no pool)
+# and the max number of granules downloaded-but-not-yet-processed at once (backpressure)
+download_workers = int(os.getenv("DOWNLOAD_WORKERS", "4"))
+process_workers = int(os.getenv("PROCESS_WORKERS", str(os.cpu_count() or 1)))
+max_in_flight = int(os.getenv("MAX_IN_FLIGHT", "8"))
+
+# Granule reader: READ_MODE=download copies each granule locally first, READ_MODE=remote reads only the
+# byte ranges of the chunks covering bbox straight from the source (no local copy).
+# READER_ENGINE is the xarray backend for local files - netcdf4 (the C library) is the faster one there;
+# remote reads always use h5netcdf, the engine that can read from a file object.
+read_mode = os.getenv("READ_MODE", "download")
+reader_engine = os.getenv("READER_ENGINE", "netcdf4")
+reader_block_size = int(os.getenv("READER_BLOCK_SIZE", str(1024 * 1024)))   # BYTES PER RANGE REQUEST
+reader_chunks = {"lat": 512, "lon": 1024}                                    # DASK CHUNKS (~ THE ON-DISK CHUNKS)
+
+# Ingest CLI (main.py): checkpoint file, how many days "--since last" re-checks (late/reprocessed
+# granules), days searched per backfill window and how often the daemon polls for new granules
+state_file = os.getenv("STATE_FILE", "ingest_state.json")
+since_last_overlap_days = int(os.getenv("SINCE_LAST_OVERLAP_DAYS", "2"))
+backfill_window_days = int(os.getenv("BACKFILL_WINDOW_DAYS", "30"))
+daemon_interval_minutes = int(os.getenv("DAEMON_INTERVAL_MINUTES", "360"))
+
+# Optional single-file Parquet copy of every ingested row (e.g. OUTPUT_FILE=satellite_data.parquet)
+output_file = os.getenv("OUTPUT_FILE", "")
+
+# Partitioned Parquet data lake (product/variable/date folders) read through DuckDB
+lake_dir = os.getenv("LAKE_DIR", "lake")
+
+# Dense time x lat x lon cube per region/variable (cube.py, memory-mapped .npy chunks): where it lives, how many
+# daily slices one chunk file holds, and whether the dashboard computes its aggregates from it instead of the rollups
+cube_dir = os.getenv("CUBE_DIR", "cube")
+cube_chunk_days = int(os.getenv("CUBE_CHUNK_DAYS", "32"))
+cube_reads = os.getenv("CUBE_READS", "false").lower() == "true"
+
+# Where ingest writes ("mysql", "lake", "cube" - any combination) and where the dashboard reads from ("mysql" or "lake")
+ingest_sinks = [s.strip() for s in os.getenv("INGEST_SINKS", "mysql,lake").split(",") if s.strip()]
+data_source = os.getenv("DATA_SOURCE", "mysql")
+
+# Dashboard aggregation cache: max entries, max age, and how often to check the ingest data version
+cache_max_entries = int(os.getenv("CACHE_MAX_ENTRIES", "256"))
+cache_ttl_seconds = float(os.getenv("CACHE_TTL_SECONDS", "3600"))
+version_poll_seconds = float(os.getenv("VERSION_POLL_SECONDS", "5"))
+
+# Heatmap grid pyramid: level name -> cell size in degrees (rollups are precomputed for every level)
+# and the max number of points a heatmap may send to the browser
+grid_levels = {"4km": 1 / 24, "9km": 1 / 12, "0.1deg": 0.1, "0.25deg": 0.25}
+native_grid = "4km"
+heatmap_max_points = int(os.getenv("HEATMAP_MAX_POINTS", "20000"))
+
+# CHL vs FLH match-up table (matchups.py): how many native cells away an FLH value may be taken from when the
+# CHL cell itself has none (0 = same cell only), and the max number of points the scatter plot draws
+matchup_tolerance_cells = int(os.getenv("MATCHUP_TOLERANCE_CELLS", "0"))
+scatter_max_points = int(os.getenv("SCATTER_MAX_POINTS", "5000"))
+
+# Pipeline/dashboard instrumentation (telemetry.py): JSON lines log (one line per granule, timed call and run -
+# opt-in, e.g. TELEMETRY_FILE=telemetry.jsonl), Prometheus textfile, Prometheus HTTP port (0 = off)
+telemetry_file = os.getenv("TELEMETRY_FILE", "")
+prometheus_file = os.getenv("PROMETHEUS_FILE", "")
+prometheus_port = int(os.getenv("PROMETHEUS_PORT", "0"))
+
+# Raw-data exports (export.py): where finished files are cached, max folder size, rows per streamed chunk
+export_dir = os.getenv("EXPORT_DIR", "exports")
+export_max_bytes = int(float(os.getenv("EXPORT_MAX_GB", "2")) * 1024 ** 3)
+export_chunk_rows = int(os.getenv("EXPORT_CHUNK_ROWS", "100000"))
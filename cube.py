@@ -0,0 +1,304 @@
+# 📁 cube.py
+# Dense cube store next to the long-format table: one time x lat x lon float32 array per region and
+# variable on the native grid, NaN where a granule has no valid pixel. The long rows repeat latitude,
+# longitude, product, filename, date, period, variable and units for every pixel; here a pixel is its
+# 4 bytes and the coordinates live once in a small index.
+#
+#   cube/region=falklands/variable=chlor_a/index.json            grid (top row, left col, shape) + date -> slot
+#   cube/region=falklands/variable=chlor_a/chunk-000000.npy      CUBE_CHUNK_DAYS daily slices, memory-mapped
+#   cube/region=falklands/variable=chlor_a/chunk-g001-000000.npy  the same after a compaction (generation 1)
+#
+# Ingest (CubeSink) writes one time slice per granule into the next free slot - a re-ingested day too, so
+# a reader never sees a slot being overwritten (the old slot is just no longer listed) - and bumps
+# cube/_VERSION when it closes (the dashboard's refresher watches it with CUBE_READS=true).
+# Those dead slots are reclaimed by compaction: when a cube's dead slots reach COMPACT_DEAD_FRACTION of
+# its live ones, CubeSink.close() rewrites the live days, date-sorted, into a new generation of chunk
+# files and switches the index to it. The previous generation is kept for readers still on the old
+# index and deleted by the next compaction (Cube.compact() can also be run by hand).
+# Reads memory-map the chunk files: a day, or a run of days stored next to each other, cut to a bbox
+# is a view into the page cache - no copy, no parse, no query.
+#
+#   c = Cube("falklands", "chlor_a")
+#   dates, values = c.read("2024-12-01", "2025-01-01", bbox=(-61, -53, -58, -51))   # values[t, lat, lon]
+#   c.daily_stats()                  # same columns as the daily rollup
+#   c.cell_sums(start, stop, "9km")  # same columns as the daily cells rollup, summed over the days
+import json
+import math
+import os
+import re
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from config import cube_dir, cube_chunk_days, grid_levels, native_grid, default_region
+import grids
+import regions
+import version_marker
+
+INDEX_FILE = "index.json"
+CHUNK_FILE = re.compile(r"chunk-(?:g(\d+)-)?(\d+)\.npy$")
+COMPACT_DEAD_FRACTION = 0.25            # DEAD SLOTS (RE-INGESTED DAYS) PER LIVE SLOT THAT TRIGGER A COMPACTION
+
+
+def cube_path(region, variable, root=None):
+    return Path(root or cube_dir) / f"region={region}" / f"variable={variable}"
+
+
+def exists(region, variable, root=None):
+    return (cube_path(region, variable, root) / INDEX_FILE).exists()
+
+
+# Marker (version_marker.py) bumped by CubeSink after an ingest run wrote slices (None if no cube was written yet)
+def version_path(root=None):
+    return version_marker.path(root or cube_dir)
+
+
+def bump_version(root=None):
+    version_marker.bump(root or cube_dir)
+
+
+def data_version(root=None):
+    return version_marker.read(root or cube_dir)
+
+
+def _day(date):
+    return str(pd.Timestamp(date).date())
+
+
+class Cube:
+    # extent = (west, south, east, north) of a new cube (default: the region's bbox); an existing cube keeps its own
+    def __init__(self, region=None, variable="chlor_a", root=None, extent=None):
+        self.region = region or default_region
+        self.variable = variable
+        self.path = cube_path(self.region, variable, root)
+        self.index = self._read_index(extent)
+        self.step = self.index["step"]
+        self.maps = {}                                  # CHUNK NUMBER -> READ-ONLY MEMMAP (OPENED ONCE)
+
+    # Index of an existing cube, or a new one covering the extent snapped to native cells (row 0 = north)
+    def _read_index(self, extent=None):
+        index_file = self.path / INDEX_FILE
+        if index_file.exists():
+            return json.loads(index_file.read_text())
+        step = grid_levels[native_grid]
+        west, south, east, north = extent or regions.bbox_of(self.region)
+        top, bottom = math.ceil((north + 90.0) / step) - 1, math.floor((south + 90.0) / step)
+        left, right = math.floor((west + 180.0) / step), math.ceil((east + 180.0) / step) - 1
+        return {"region": self.region, "variable": self.variable, "step": step, "top_row": top, "left_col": left,
+                "shape": [top - bottom + 1, right - left + 1], "chunk_days": cube_chunk_days, "slots": 0, "dates": {}}
+
+    def _write_index(self):
+        tmp = self.path / (INDEX_FILE + ".tmp")
+        tmp.write_text(json.dumps(self.index, indent=1, sort_keys=True))
+        os.replace(tmp, self.path / INDEX_FILE)         # READERS SEE THE OLD INDEX OR THE NEW ONE, NEVER HALF OF IT
+
+    # Chunk file of the index's generation (generation 0: the original names, no prefix)
+    def _chunk_file(self, chunk, generation=None):
+        generation = self.index.get("generation", 0) if generation is None else generation
+        prefix = f"g{generation:03d}-" if generation else ""
+        return self.path / f"chunk-{prefix}{chunk:06d}.npy"
+
+    def _chunk(self, chunk):
+        if chunk not in self.maps:
+            self.maps[chunk] = np.load(self._chunk_file(chunk), mmap_mode="r")
+        return self.maps[chunk]
+
+    @property
+    def shape(self):
+        return tuple(self.index["shape"])
+
+    # Cell centres of the rows (north to south) and columns (west to east)
+    def latitudes(self):
+        return grids.cell_centre(self.index["top_row"] - np.arange(self.shape[0]), 0, self.step)[0]
+
+    def longitudes(self):
+        return grids.cell_centre(0, self.index["left_col"] + np.arange(self.shape[1]), self.step)[1]
+
+    # Row/column slices of the cube inside bbox = (west, south, east, north) (None = everything)
+    def window(self, bbox=None):
+        if bbox is None:
+            return slice(0, self.shape[0]), slice(0, self.shape[1])
+        west, south, east, north = bbox
+        top = self.index["top_row"] - (math.ceil((north + 90.0) / self.step) - 1)
+        bottom = self.index["top_row"] - math.floor((south + 90.0) / self.step)
+        left = math.floor((west + 180.0) / self.step) - self.index["left_col"]
+        right = math.ceil((east + 180.0) / self.step) - 1 - self.index["left_col"]
+        return (slice(max(top, 0), max(min(bottom + 1, self.shape[0]), 0)),
+                slice(max(left, 0), max(min(right + 1, self.shape[1]), 0)))
+
+    def dates(self):
+        return sorted(pd.Timestamp(d) for d in self.index["dates"])
+
+    # ---------- writing (ingest) ----------
+
+    # Stores one day of pixels (the granule's valid latitude/longitude/value) as a time slice
+    def write_day(self, date, latitude, longitude, value):
+        self.path.mkdir(parents=True, exist_ok=True)
+        day = _day(date)
+        cell_row, cell_col = grids.cell_index(latitude, longitude, self.step)
+        rows = self.index["top_row"] - cell_row
+        cols = cell_col - self.index["left_col"]
+        inside = (rows >= 0) & (rows < self.shape[0]) & (cols >= 0) & (cols < self.shape[1])   # HYPERSLAB EDGES BEYOND THE BBOX
+        grid = np.full(self.shape, np.nan, dtype="float32")
+        grid[rows[inside], cols[inside]] = np.asarray(value, dtype="float32")[inside]
+
+        slot = self.index["slots"]                      # ALWAYS A FRESH SLOT: READERS MAY BE ON THE DAY'S OLD ONE
+        chunk, offset = divmod(slot, self.index["chunk_days"])
+        chunk_file = self._chunk_file(chunk)
+        if chunk_file.exists():
+            data = np.lib.format.open_memmap(chunk_file, mode="r+")
+        else:
+            data = np.lib.format.open_memmap(chunk_file, mode="w+", dtype="float32", shape=(self.index["chunk_days"],) + self.shape)
+                                                        # UNUSED SLOTS STAY UNWRITTEN (SPARSE) - ONLY INDEXED SLOTS ARE READ
+        data[offset] = grid
+        data.flush()
+        del data
+
+        self.index["dates"][day] = slot                 # INDEX WRITTEN AFTER THE DATA: A LISTED SLOT IS ALWAYS COMPLETE
+        self.index["slots"] = slot + 1
+        self._write_index()
+        return int(inside.sum())
+
+    # ---------- reading ----------
+
+    # (dates, values[t, lat, lon]) per run of days in [start, stop) stored in consecutive slots of one chunk -
+    # each values array is a view of the memory-mapped file
+    def blocks(self, start=None, stop=None, bbox=None):
+        first = None if start is None else _day(start)
+        last = None if stop is None else _day(stop)
+        slots = sorted((slot, day) for day, slot in self.index["dates"].items()
+                       if (first is None or day >= first) and (last is None or day < last))
+        rows, cols = self.window(bbox)
+        size = self.index["chunk_days"]
+        run = []
+        for slot, day in slots + [(None, None)]:
+            if run and (slot is None or slot != run[-1][0] + 1 or slot // size != run[0][0] // size):
+                chunk, offset = divmod(run[0][0], size)
+                values = self._chunk(chunk)[offset:offset + len(run), rows, cols]
+                yield pd.to_datetime([d for _, d in run]), values
+                run = []
+            if slot is not None:
+                run.append((slot, day))
+
+    # Every day in [start, stop) cut to bbox, sorted by date: a view when the days sit in one run, else one copy
+    def read(self, start=None, stop=None, bbox=None):
+        blocks = list(self.blocks(start, stop, bbox))
+        if not blocks:
+            rows, cols = self.window(bbox)
+            return pd.DatetimeIndex([]), np.empty((0, rows.stop - rows.start, cols.stop - cols.start), dtype="float32")
+        if len(blocks) == 1 and blocks[0][0].is_monotonic_increasing:
+            return blocks[0]
+        dates = pd.DatetimeIndex(np.concatenate([d.values for d, _ in blocks]))
+        order = np.argsort(dates.values, kind="stable")
+        return dates[order], np.concatenate([v for _, v in blocks])[order]
+
+    def day(self, date, bbox=None):
+        dates, values = self.read(date, pd.Timestamp(date) + pd.Timedelta(days=1), bbox)
+        return values[0] if len(dates) else None
+
+    # ---------- the dashboard aggregates ----------
+
+    # date, value_total, value_count, value_max per day with data (the daily rollup)
+    def daily_stats(self, start=None, stop=None, bbox=None):
+        frames = []
+        for dates, values in self.blocks(start, stop, bbox):
+            flat = values.reshape(len(dates), -1)
+            frames.append(pd.DataFrame({
+                "date": dates,
+                "value_total": np.nansum(flat, axis=1, dtype="float64"),
+                "value_count": np.count_nonzero(~np.isnan(flat), axis=1).astype("int64"),
+                "value_max": np.fmax.reduce(flat, axis=1),            # NaN FOR AN EMPTY DAY, NO WARNING
+            }))
+        if not frames:
+            return pd.DataFrame(columns=["date", "value_total", "value_count", "value_max"])
+        daily = pd.concat(frames, ignore_index=True)
+        return daily[daily["value_count"] > 0].sort_values("date", ignore_index=True)
+
+    # latitude, longitude, value_sum, value_count per cell of `grid` over the days in [start, stop)
+    def cell_sums(self, start=None, stop=None, grid=native_grid, bbox=None):
+        rows, cols = self.window(bbox)
+        sums = np.zeros((rows.stop - rows.start, cols.stop - cols.start), dtype="float64")
+        counts = np.zeros(sums.shape, dtype="int64")
+        for _, values in self.blocks(start, stop, bbox):
+            sums += np.nansum(values, axis=0, dtype="float64")
+            counts += np.count_nonzero(~np.isnan(values), axis=0)
+        filled_rows, filled_cols = np.nonzero(counts)
+        cells = pd.DataFrame({
+            "latitude": self.latitudes()[rows][filled_rows],
+            "longitude": self.longitudes()[cols][filled_cols],
+            "value_sum": sums[filled_rows, filled_cols],
+            "value_count": counts[filled_rows, filled_cols],
+        })
+        if grid != native_grid:                         # COARSER PYRAMID LEVEL: NATIVE CELLS BINNED LIKE THE ROLLUPS
+            step = grid_levels[grid]
+            cells["latitude"] = grids.bin_coord(cells["latitude"], step)
+            cells["longitude"] = grids.bin_coord(cells["longitude"], step)
+            cells = cells.groupby(["latitude", "longitude"], as_index=False)[["value_sum", "value_count"]].sum()
+        return cells.astype({"latitude": "float32", "longitude": "float32"})
+
+    # ---------- compaction ----------
+
+    # Slots written but no longer listed (the old slices of re-ingested days)
+    def dead_slots(self):
+        return self.index["slots"] - len(self.index["dates"])
+
+    # Rewrites the live days, date-sorted, into a new generation of chunk files; deletes the generations
+    # before the current one (the current one stays for readers still on the old index). Returns the slots freed.
+    def compact(self):
+        dead, size = self.dead_slots(), self.index["chunk_days"]
+        old, new = self.index.get("generation", 0), self.index.get("generation", 0) + 1
+        days = sorted(self.index["dates"])
+        for first in range(0, len(days), size):
+            data = np.lib.format.open_memmap(self._chunk_file(first // size, new), mode="w+", dtype="float32",
+                                             shape=(size,) + self.shape)
+            for offset, day in enumerate(days[first:first + size]):
+                chunk, slot_offset = divmod(self.index["dates"][day], size)
+                data[offset] = self._chunk(chunk)[slot_offset]
+            data.flush()
+            del data
+
+        self.index.update(generation=new, slots=len(days), dates={day: slot for slot, day in enumerate(days)})
+        self._write_index()                             # NEW READERS MOVE TO THE NEW GENERATION HERE
+        self.maps = {}
+        for f in self.path.glob("chunk-*.npy"):
+            match = CHUNK_FILE.match(f.name)
+            if match and int(match.group(1) or 0) < old:
+                f.unlink()
+        return dead
+
+    # Bytes on disk (chunk slots never written take no space)
+    def nbytes(self):
+        return sum(f.stat().st_blocks * 512 for f in self.path.iterdir() if f.is_file())
+
+
+# Ingest sink: one time slice per (region, variable, day) of every granule
+class CubeSink:
+    name = "cube"
+
+    def __init__(self, root=None):
+        self.root = root or cube_dir
+        self.store = f"cube:{Path(self.root).resolve()}"    # WHERE THE SLICES END UP (granule_cache manifest)
+        self.cubes = {}
+        self.slices, self.cells = 0, 0
+
+    def open(self):
+        os.makedirs(self.root, exist_ok=True)
+        return self
+
+    def write(self, df):
+        if df.empty:
+            return
+        for (region, variable, date), part in df.groupby(["region", "variable", "date"], sort=False, observed=True):
+            key = (str(region), str(variable))
+            if key not in self.cubes:
+                self.cubes[key] = Cube(key[0], key[1], self.root)
+            self.cells += self.cubes[key].write_day(date, part["latitude"].to_numpy(), part["longitude"].to_numpy(), part["value"].to_numpy())
+            self.slices += 1
+
+    def close(self):
+        for c in self.cubes.values():                  # RECLAIM THE SLOTS RE-INGESTED DAYS LEFT BEHIND
+            if c.dead_slots() and c.dead_slots() >= COMPACT_DEAD_FRACTION * len(c.index["dates"]):
+                freed = c.compact()
+                print(f"🧹 Compacted cube {c.region}/{c.variable}: {freed} dead slots freed")
+        if self.slices:
+            bump_version(self.root)                     # AFTER EVERY SLICE OF THE RUN IS IN ITS INDEX
+        print(f"🧊 {self.cells} cells written as {self.slices} time slices to the cubes under {self.root}")
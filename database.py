@@ -1,54 +1,706 @@
 # 📁 database.py
+import hashlib
+import os
+import tempfile
+import time
 import pymysql
-from config import db_config
+import pandas as pd
+from config import db_config, db_batch_rows, db_local_infile, default_region, native_grid
+import grids
+import regions
+import telemetry
+import db_pool
+import matchups
+
+METRICS_TABLE = "satellite_metrics_simple"
+LOAD_LOG_TABLE = "satellite_load_log"       # ONE ROW PER GRANULE (filename/date/variable) ALREADY IN METRICS_TABLE
+UNITS_TABLE = "satellite_units"             # LOOKUP: VARIABLE -> UNITS (UNITS ARE THE SAME FOR EVERY ROW OF A VARIABLE)
+SCHEMA_VERSION_TABLE = "schema_version"
+
+# Rollups maintained at ingest time (see rollups.py)
+DAILY_TABLE = "satellite_daily"                 # (region, variable, date) -> total / mean / count / max
+DAILY_CELLS_TABLE = "satellite_daily_cells"     # (region, variable, date, grid, lat, lon) -> sum / count
+PERIOD_CELLS_TABLE = "satellite_period_cells"   # (region, variable, period, grid, lat, lon) -> sum / count
+MATCHUPS_TABLE = "satellite_matchups"           # (region, date, chl/flh variable, cell row/col) -> chl / flh (matchups.py)
+
+# Single-row counter bumped in the same transaction as every data change (readers use it to invalidate caches)
+DATA_VERSION_TABLE = "satellite_data_version"
+BUMP_VERSION_SQL = f"UPDATE {DATA_VERSION_TABLE} SET version = version + 1 WHERE id = 1"
+
+# Columns written to METRICS_TABLE, in insert order
+METRIC_COLUMNS = ["region", "product", "filename", "date", "period", "variable", "latitude", "longitude", "value"]
+
+
+# ===============================
+# SCHEMA MIGRATIONS (VERSIONED)
+# ===============================
+# Each migration runs once, in order, and its version is recorded in SCHEMA_VERSION_TABLE.
+# To change the schema add a new (version, description, function) entry - never edit an old one.
+# A migration that changes the rollup tables returns True; the rollups are then rebuilt once,
+# after the last migration, with the current rollup SQL.
+
+def _column_type(cur, table, column):
+    cur.execute(f"SHOW COLUMNS FROM {table} LIKE %s", (column,))
+    row = cur.fetchone()
+    return row[1].lower() if row else None
+
+
+def _table_exists(cur, table):
+    cur.execute("SHOW TABLES LIKE %s", (table,))
+    return cur.fetchone() is not None
+
+
+# v1: typed columns, lookup table for units and composite indexes for the dashboard queries
+def _migration_1(cur):
+    legacy = _table_exists(cur, METRICS_TABLE) and _column_type(cur, METRICS_TABLE, "date") == "text"
+    if legacy:                                                   # OLD ALL-TEXT TABLE - KEEP ITS DATA, CONVERT BELOW
+        cur.execute(f"RENAME TABLE {METRICS_TABLE} TO {METRICS_TABLE}_legacy")
+
+    cur.execute(f"""
+    CREATE TABLE IF NOT EXISTS {METRICS_TABLE} (
+        id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+        product ENUM('PACE_OCI_L3M_CHL', 'PACE_OCI_L3M_FLH') NOT NULL,
+        filename VARCHAR(255) NOT NULL,
+        date DATE NOT NULL,
+        period ENUM('before', 'after') NOT NULL,
+        variable ENUM('chlor_a', 'nflh', 'flh') NOT NULL,
+        latitude FLOAT NOT NULL,
+        longitude FLOAT NOT NULL,
+        value FLOAT NOT NULL,
+        KEY idx_variable_date (variable, date),
+        KEY idx_date_lat_lon (date, latitude, longitude),
+        KEY idx_granule (filename, variable)
+    ) ENGINE=InnoDB;
+    """)
+    cur.execute(f"""
+    CREATE TABLE IF NOT EXISTS {UNITS_TABLE} (
+        variable ENUM('chlor_a', 'nflh', 'flh') NOT NULL PRIMARY KEY,
+        units VARCHAR(64)
+    ) ENGINE=InnoDB;
+    """)
+    cur.execute(f"""
+    CREATE TABLE IF NOT EXISTS {LOAD_LOG_TABLE} (
+        filename VARCHAR(255) NOT NULL,
+        date DATE NOT NULL,
+        variable VARCHAR(64) NOT NULL,
+        checksum CHAR(64) NOT NULL,
+        row_count INT NOT NULL,
+        loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (filename, date, variable)
+    ) ENGINE=InnoDB;
+    """)
+
+    if legacy:                                                   # COPY TEXT ROWS INTO THE TYPED TABLE
+        cur.execute(f"""
+        INSERT INTO {METRICS_TABLE} (product, filename, date, period, variable, latitude, longitude, value)
+        SELECT product, filename, DATE(date), period, variable, latitude + 0, longitude + 0, value + 0
+        FROM {METRICS_TABLE}_legacy
+        WHERE date IS NOT NULL AND value IS NOT NULL
+        """)
+        cur.execute(f"""
+        INSERT IGNORE INTO {UNITS_TABLE} (variable, units)
+        SELECT DISTINCT variable, units FROM {METRICS_TABLE}_legacy WHERE units IS NOT NULL
+        """)
+        cur.execute(f"DROP TABLE {METRICS_TABLE}_legacy")
 
-# Function to insert the processed satellite data into MySQL
-def insert_metrics(df):
-    drop_table_sql = """DROP TABLE IF EXISTS satellite_metrics_simple;"""          # DELETE EXISTING DATA IN DB IF ALREADY EXISTING - AVOID DUPLICATION/ SCHMEA CONFLICTS
 
-    columns_with_types = ", ".join([f"{col} TEXT" for col in df.columns])
+# v2: rollup tables for the dashboard, backfilled from the metrics already loaded
+def _migration_2(cur):
+    cur.execute(f"""
+    CREATE TABLE IF NOT EXISTS {DAILY_TABLE} (
+        variable ENUM('chlor_a', 'nflh', 'flh') NOT NULL,
+        date DATE NOT NULL,
+        value_total DOUBLE NOT NULL,
+        value_mean DOUBLE NOT NULL,
+        value_count INT NOT NULL,
+        value_max FLOAT NOT NULL,
+        PRIMARY KEY (variable, date)
+    ) ENGINE=InnoDB;
+    """)
+    cur.execute(f"""
+    CREATE TABLE IF NOT EXISTS {DAILY_CELLS_TABLE} (
+        variable ENUM('chlor_a', 'nflh', 'flh') NOT NULL,
+        date DATE NOT NULL,
+        latitude FLOAT NOT NULL,
+        longitude FLOAT NOT NULL,
+        value_sum DOUBLE NOT NULL,
+        value_count INT NOT NULL,
+        PRIMARY KEY (variable, date, latitude, longitude)
+    ) ENGINE=InnoDB;
+    """)
+    cur.execute(f"""
+    CREATE TABLE IF NOT EXISTS {PERIOD_CELLS_TABLE} (
+        variable ENUM('chlor_a', 'nflh', 'flh') NOT NULL,
+        period ENUM('before', 'after') NOT NULL,
+        latitude FLOAT NOT NULL,
+        longitude FLOAT NOT NULL,
+        value_sum DOUBLE NOT NULL,
+        value_count INT NOT NULL,
+        PRIMARY KEY (variable, period, latitude, longitude)
+    ) ENGINE=InnoDB;
+    """)
+    return True
 
-                                                                                # CREATE TABLE WITH PK AS DATATYPE TO TEXT 
-    create_table_sql = f"""
-    CREATE TABLE IF NOT EXISTS satellite_metrics_simple (         
-        id INT AUTO_INCREMENT PRIMARY KEY,
-        {columns_with_types}                                    
-    );
-    """
 
-    column_list = ", ".join(df.columns)                          #??
-    placeholder_list = ", ".join(["%s"] * len(df.columns))   #placeholder values for each columns , these will be filled with actual values later 
+# v3: data version marker
+def _migration_3(cur):
+    cur.execute(f"""
+    CREATE TABLE IF NOT EXISTS {DATA_VERSION_TABLE} (
+        id TINYINT NOT NULL PRIMARY KEY,
+        version BIGINT NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    ) ENGINE=InnoDB;
+    """)
+    cur.execute(f"INSERT IGNORE INTO {DATA_VERSION_TABLE} (id, version) VALUES (1, 1)")
 
-    insert_sql = f"""
-    INSERT INTO satellite_metrics_simple ({column_list})     #??????
-    VALUES ({placeholder_list});
-    """
 
-    conn, cur = None, None
+# v4: heatmap pyramid - the cell rollups hold one copy per grid level (grids.py)
+def _migration_4(cur):
+    cur.execute(f"""
+    ALTER TABLE {DAILY_CELLS_TABLE}
+        ADD COLUMN grid VARCHAR(8) NOT NULL DEFAULT '{native_grid}' AFTER date,
+        DROP PRIMARY KEY,
+        ADD PRIMARY KEY (variable, date, grid, latitude, longitude)
+    """)
+    cur.execute(f"""
+    ALTER TABLE {PERIOD_CELLS_TABLE}
+        ADD COLUMN grid VARCHAR(8) NOT NULL DEFAULT '{native_grid}' AFTER period,
+        DROP PRIMARY KEY,
+        ADD PRIMARY KEY (variable, period, grid, latitude, longitude)
+    """)
+    return True
 
+
+# v5: region registry - every table gets the region the rows were extracted for
+def _migration_5(cur):
+    region = f"region VARCHAR(32) NOT NULL DEFAULT '{default_region}'"
+    cur.execute(f"""
+    ALTER TABLE {METRICS_TABLE}
+        ADD COLUMN {region} AFTER id,
+        DROP INDEX idx_variable_date,
+        ADD INDEX idx_region_variable_date (region, variable, date)
+    """)
+    cur.execute(f"ALTER TABLE {DAILY_TABLE} ADD COLUMN {region} FIRST, DROP PRIMARY KEY, ADD PRIMARY KEY (region, variable, date)")
+    cur.execute(f"""
+    ALTER TABLE {DAILY_CELLS_TABLE} ADD COLUMN {region} FIRST, DROP PRIMARY KEY,
+        ADD PRIMARY KEY (region, variable, date, grid, latitude, longitude)
+    """)
+    cur.execute(f"""
+    ALTER TABLE {PERIOD_CELLS_TABLE} ADD COLUMN {region} FIRST, DROP PRIMARY KEY,
+        ADD PRIMARY KEY (region, variable, period, grid, latitude, longitude)
+    """)
+    return True
+
+
+# v6: CHL vs FLH match-up table keyed by integer native grid cell (backfilled by the rollup rebuild)
+def _migration_6(cur):
+    cur.execute(f"""
+    CREATE TABLE IF NOT EXISTS {MATCHUPS_TABLE} (
+        region VARCHAR(32) NOT NULL,
+        date DATE NOT NULL,
+        chl_variable ENUM('chlor_a', 'nflh', 'flh') NOT NULL,
+        flh_variable ENUM('chlor_a', 'nflh', 'flh') NOT NULL,
+        cell_row SMALLINT UNSIGNED NOT NULL,
+        cell_col SMALLINT UNSIGNED NOT NULL,
+        latitude FLOAT NOT NULL,
+        longitude FLOAT NOT NULL,
+        chl FLOAT NOT NULL,
+        flh FLOAT NOT NULL,
+        distance FLOAT NOT NULL,
+        sample FLOAT NOT NULL,
+        PRIMARY KEY (region, date, chl_variable, flh_variable, cell_row, cell_col),
+        KEY idx_region_sample (region, sample)
+    ) ENGINE=InnoDB;
+    """)
+    return True
+
+
+# v7: metrics filename as wide as the load log's - a 129-255 character granule name was logged as
+# loaded while its rows failed (strict mode) or were truncated. Same length-byte count: an in-place ALTER.
+def _migration_7(cur):
+    if _column_type(cur, METRICS_TABLE, "filename") != "varchar(255)":
+        cur.execute(f"ALTER TABLE {METRICS_TABLE} MODIFY filename VARCHAR(255) NOT NULL")
+    return True
+
+
+MIGRATIONS = [
+    (1, "typed metrics table, units lookup and indexes", _migration_1),
+    (2, "daily / daily-cell / period-cell rollup tables", _migration_2),
+    (3, "data version marker", _migration_3),
+    (4, "grid level in the cell rollups", _migration_4),
+    (5, "region column in metrics and rollups", _migration_5),
+    (6, "CHL vs FLH match-up table", _migration_6),
+    (7, "metrics filename VARCHAR(255) like the load log", _migration_7),
+]
+
+
+# Brings the database schema up to the latest version
+def migrate(conn):
+    cur = conn.cursor()
     try:
-        conn = pymysql.connect(**db_config)    # CONNECTS TO MYSQL DB WITH CONFIG SETTINGS
-        cur = conn.cursor()
+        cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SCHEMA_VERSION_TABLE} (
+            version INT NOT NULL PRIMARY KEY,
+            description VARCHAR(255),
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB;
+        """)
+        cur.execute(f"SELECT COALESCE(MAX(version), 0) FROM {SCHEMA_VERSION_TABLE}")
+        current = cur.fetchone()[0]
+        rebuild = False
+
+        for version, description, migration in MIGRATIONS:
+            if version <= current:
+                continue
+            print(f"🛠️ Applying schema migration {version}: {description}")
+            rebuild = migration(cur) or rebuild
+            cur.execute(f"INSERT INTO {SCHEMA_VERSION_TABLE} (version, description) VALUES (%s, %s)",
+                        (version, description))
+            conn.commit()
+
+        if rebuild:
+            print("🛠️ Rebuilding rollups for the new schema")
+            _rebuild_rollups(cur)
+            cur.execute(BUMP_VERSION_SQL)
+            conn.commit()
+    finally:
+        cur.close()
+
 
-        cur.execute(drop_table_sql)      #DELETES EXISTING TABLE
+# ===============================
+# ROLLUPS
+# ===============================
+
+# Fills DAILY_CELLS_TABLE for every grid level from the metrics rows matching `where`
+def _insert_daily_cells(cur, where="1 = 1", params=()):
+    for grid, step in grids.LEVELS:
+        lat, lon = grids.bin_sql("latitude", step), grids.bin_sql("longitude", step)
+        cur.execute(f"""
+        INSERT INTO {DAILY_CELLS_TABLE} (region, variable, date, grid, latitude, longitude, value_sum, value_count)
+        SELECT region, variable, date, %s, {lat} AS lat_bin, {lon} AS lon_bin, SUM(value), COUNT(*)
+        FROM {METRICS_TABLE}
+        WHERE {where}
+        GROUP BY region, variable, date, lat_bin, lon_bin
+        """, (grid,) + tuple(params))
+
+
+# SQL for 'before'/'after' of a row, using its region's event date; returns (sql, params)
+def _period_case():
+    names = regions.names()
+    whens = " ".join(["WHEN %s THEN %s"] * len(names))
+    params = [v for name in names for v in (name, regions.event_date(name))] + [regions.event_date()]
+    return f"CASE WHEN date < (CASE region {whens} ELSE %s END) THEN 'before' ELSE 'after' END", params
+
+
+INSERT_MATCHUP_SQL = f"""
+INSERT INTO {MATCHUPS_TABLE} (region, date, {", ".join(matchups.COLUMNS)})
+VALUES ({", ".join(["%s"] * (len(matchups.COLUMNS) + 2))})
+"""
+
+
+# Recomputes the CHL/FLH match-ups of one (region, day) from that day's pixels (inside the caller's transaction)
+def update_matchups(cur, region, day):
+    placeholders = ", ".join(["%s"] * len(matchups.VARIABLES))
+    cur.execute(f"""
+    SELECT variable, latitude, longitude, value FROM {METRICS_TABLE}
+    WHERE region = %s AND date = %s AND variable IN ({placeholders})
+    """, [region, day] + matchups.VARIABLES)
+    rows = pd.DataFrame(list(cur.fetchall()), columns=["variable", "latitude", "longitude", "value"])
+    pairs = matchups.daily_matchups(rows, day)
+
+    cur.execute(f"DELETE FROM {MATCHUPS_TABLE} WHERE region = %s AND date = %s", (region, day))
+    if not pairs.empty:
+        cur.executemany(INSERT_MATCHUP_SQL, [(region, day) + tuple(row) for row in
+                                             pairs.astype(object).itertuples(index=False)])
+
+
+# Recomputes every rollup from the metrics table (after a full reload, or if a region's event date changes)
+def _rebuild_rollups(cur):
+    cur.execute(f"DELETE FROM {DAILY_TABLE}")
+    cur.execute(f"DELETE FROM {DAILY_CELLS_TABLE}")
+    cur.execute(f"DELETE FROM {PERIOD_CELLS_TABLE}")
+    cur.execute(f"""
+    INSERT INTO {DAILY_TABLE} (region, variable, date, value_total, value_mean, value_count, value_max)
+    SELECT region, variable, date, SUM(value), AVG(value), COUNT(*), MAX(value)
+    FROM {METRICS_TABLE}
+    GROUP BY region, variable, date
+    """)
+    _insert_daily_cells(cur)
+    period, params = _period_case()
+    cur.execute(f"""
+    INSERT INTO {PERIOD_CELLS_TABLE} (region, variable, period, grid, latitude, longitude, value_sum, value_count)
+    SELECT region, variable, {period}, grid, latitude, longitude, SUM(value_sum), SUM(value_count)
+    FROM {DAILY_CELLS_TABLE}
+    GROUP BY 1, 2, 3, 4, 5, 6
+    """, params)
+
+    cur.execute(f"DELETE FROM {MATCHUPS_TABLE}")
+    cur.execute(f"SELECT DISTINCT region, date FROM {DAILY_TABLE} WHERE variable IN ({', '.join(['%s'] * len(matchups.FLH_VARIABLES))})",
+                matchups.FLH_VARIABLES)
+    for region, day in cur.fetchall():
+        update_matchups(cur, region, str(day))
+
+
+def rebuild_rollups():
+    with pool().connection() as conn:
+        migrate(conn)
+        cur = conn.cursor()
+        _rebuild_rollups(cur)
+        cur.execute(BUMP_VERSION_SQL)
         conn.commit()
+        cur.close()
+        print("✅ Rollups rebuilt")
+
+
+# Refreshes the rollups of one (region, variable, day) after its granule rows changed.
+# Runs inside the granule's transaction, and only touches that day's rows:
+# the day's old cells are subtracted from its period, recomputed, then added back.
+def update_rollups(cur, region, variable, day):
+    period = regions.period_of(day, region)
+
+    cur.execute(f"""
+    UPDATE {PERIOD_CELLS_TABLE} p
+    JOIN {DAILY_CELLS_TABLE} d
+      ON p.region = d.region AND p.variable = d.variable AND p.grid = d.grid AND p.latitude = d.latitude AND p.longitude = d.longitude
+    SET p.value_sum = p.value_sum - d.value_sum, p.value_count = p.value_count - d.value_count
+    WHERE p.period = %s AND d.region = %s AND d.variable = %s AND d.date = %s
+    """, (period, region, variable, day))
+
+    cur.execute(f"DELETE FROM {DAILY_CELLS_TABLE} WHERE region = %s AND variable = %s AND date = %s", (region, variable, day))
+    _insert_daily_cells(cur, "region = %s AND variable = %s AND date = %s", (region, variable, day))
+
+    cur.execute(f"""
+    INSERT INTO {PERIOD_CELLS_TABLE} (region, variable, period, grid, latitude, longitude, value_sum, value_count)
+    SELECT d.region, d.variable, %s, d.grid, d.latitude, d.longitude, d.value_sum, d.value_count
+    FROM {DAILY_CELLS_TABLE} d
+    WHERE d.region = %s AND d.variable = %s AND d.date = %s
+    ON DUPLICATE KEY UPDATE
+        value_sum = {PERIOD_CELLS_TABLE}.value_sum + VALUES(value_sum),
+        value_count = {PERIOD_CELLS_TABLE}.value_count + VALUES(value_count)
+    """, (period, region, variable, day))
+    cur.execute(f"DELETE FROM {PERIOD_CELLS_TABLE} WHERE region = %s AND variable = %s AND period = %s AND value_count <= 0",
+                (region, variable, period))
+
+    cur.execute(f"DELETE FROM {DAILY_TABLE} WHERE region = %s AND variable = %s AND date = %s", (region, variable, day))
+    cur.execute(f"""
+    INSERT INTO {DAILY_TABLE} (region, variable, date, value_total, value_mean, value_count, value_max)
+    SELECT region, variable, date, SUM(value), AVG(value), COUNT(*), MAX(value)
+    FROM {METRICS_TABLE}
+    WHERE region = %s AND variable = %s AND date = %s
+    GROUP BY region, variable, date
+    """, (region, variable, day))
+
+
+# ===============================
+# LOADING
+# ===============================
+
+# Fingerprint of one granule's rows - if it matches the load log the granule is skipped
+def granule_checksum(df):
+    hashes = pd.util.hash_pandas_object(df, index=False)
+    return hashlib.sha256(hashes.values.tobytes()).hexdigest()
+
+
+# Converts a metrics DataFrame into rows of native Python types (date, float) in METRIC_COLUMNS order
+def native_rows(df):
+    columns = [
+        df["region"].astype(str).tolist(),
+        df["product"].astype(str).tolist(),
+        df["filename"].astype(str).tolist(),
+        pd.to_datetime(df["date"]).dt.date.tolist(),
+        df["period"].astype(str).tolist(),
+        df["variable"].astype(str).tolist(),
+        df["latitude"].astype(float).tolist(),
+        df["longitude"].astype(float).tolist(),
+        df["value"].astype(float).tolist(),
+    ]
+    return list(zip(*columns))
+
+
+# Keeps the units lookup table in sync with the variables in df
+def upsert_units(cur, df):
+    if "units" not in df.columns:
+        return
+    units = df[["variable", "units"]].dropna().drop_duplicates("variable")
+    cur.executemany(
+        f"INSERT INTO {UNITS_TABLE} (variable, units) VALUES (%s, %s) ON DUPLICATE KEY UPDATE units = VALUES(units)",
+        [(str(v), str(u)) for v, u in units.itertuples(index=False)]
+    )
 
-        cur.execute(create_table_sql)   # CREATE NEW TABLE WITH DATA
+
+INSERT_SQL = f"""
+INSERT INTO {METRICS_TABLE} ({", ".join(METRIC_COLUMNS)})
+VALUES ({", ".join(["%s"] * len(METRIC_COLUMNS))});
+"""
+
+# MySQL error codes meaning "LOAD DATA LOCAL INFILE is disabled" (server side or client side)
+LOCAL_INFILE_DISABLED_ERRORS = {1148, 2068, 3948}
+
+
+# Pooled connections allowed to send LOAD DATA LOCAL INFILE (when enabled in config), shared by every
+# ingest run of the process (the daemon keeps its connection between runs)
+def pool():
+    return db_pool.get_pool(local_infile=db_local_infile)
+
+
+# Yields the frame in fixed-size slices so only one batch is ever converted at a time
+def iter_batches(df, batch_rows=db_batch_rows):
+    for start in range(0, len(df), batch_rows):
+        yield df.iloc[start:start + batch_rows]
+
+
+# BULK PATH 1: write the batch to a temp CSV and let the server parse it (fastest)
+def load_batch_infile(cur, batch, table=METRICS_TABLE):
+    frame = batch[METRIC_COLUMNS].copy()
+    frame["date"] = pd.to_datetime(frame["date"]).dt.strftime("%Y-%m-%d")
+
+    tmp = tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False, newline="")
+    try:
+        frame.to_csv(tmp, header=False, index=False, lineterminator="\n")
+        tmp.close()
+        cur.execute(f"""
+        LOAD DATA LOCAL INFILE %s INTO TABLE {table}
+        FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"'
+        LINES TERMINATED BY '\\n'
+        ({", ".join(METRIC_COLUMNS)})
+        """, (tmp.name,))
+        return os.path.getsize(tmp.name)
+    finally:
+        tmp.close()
+        os.remove(tmp.name)
+
+
+# BULK PATH 2 (fallback): one multi-row INSERT ... VALUES (...), (...) statement per batch
+def load_batch_multirow(cur, batch, table=METRICS_TABLE):
+    row_placeholder = "(" + ", ".join(["%s"] * len(METRIC_COLUMNS)) + ")"
+    values = ",".join(cur.mogrify(row_placeholder, row) for row in native_rows(batch))
+    sql = f"INSERT INTO {table} ({', '.join(METRIC_COLUMNS)}) VALUES {values}"
+    cur.execute(sql)
+    return len(sql.encode("utf-8"))
+
+
+# Streams df into the table batch by batch and returns throughput stats.
+# method: "infile" tries LOAD DATA LOCAL INFILE and falls back to "multirow" if the server refuses it.
+# commit_each_batch=False leaves the commit to the caller (used for one-transaction-per-granule loads).
+def bulk_load(conn, cur, df, method="infile", commit_each_batch=True, table=METRICS_TABLE, batch_rows=db_batch_rows):
+    if method == "infile" and not db_local_infile:
+        method = "multirow"
+
+    rows, sent_bytes = 0, 0
+    started = time.perf_counter()
+
+    for batch in iter_batches(df, batch_rows):
+        if method == "infile":
+            try:
+                sent_bytes += load_batch_infile(cur, batch, table)
+            except (pymysql.err.OperationalError, pymysql.err.InternalError, pymysql.err.ProgrammingError) as e:
+                if e.args and e.args[0] in LOCAL_INFILE_DISABLED_ERRORS:
+                    print("⚠️ LOAD DATA LOCAL INFILE disabled on server, falling back to multi-row INSERT")
+                    method = "multirow"
+                    sent_bytes += load_batch_multirow(cur, batch, table)
+                else:
+                    raise
+        else:
+            sent_bytes += load_batch_multirow(cur, batch, table)
+
+        rows += len(batch)
+        if commit_each_batch:
+            conn.commit()
+
+    seconds = max(time.perf_counter() - started, 1e-9)
+    return {
+        "method": method,
+        "rows": rows,
+        "bytes": sent_bytes,
+        "seconds": seconds,
+        "rows_per_s": rows / seconds,
+        "bytes_per_s": sent_bytes / seconds,
+    }
+
+
+# Adds the stats of one bulk_load call to a running total
+def add_stats(total, stats):
+    for key in ("rows", "bytes", "seconds"):
+        total[key] = total.get(key, 0) + stats[key]
+    total["method"] = stats["method"]
+    return total
+
+
+def print_throughput(stats):
+    seconds = max(stats.get("seconds", 0), 1e-9)
+    print(f"⚡ {stats.get('rows', 0)} rows, {stats.get('bytes', 0) / 1e6:.1f} MB in {seconds:.2f}s "
+          f"({stats.get('rows', 0) / seconds:,.0f} rows/s, {stats.get('bytes', 0) / 1e6 / seconds:.2f} MB/s) "
+          f"via {stats.get('method', '-')}")
+
+
+# Function to insert the processed satellite data into MySQL
+# incremental=True  -> only new/changed granules are (re)loaded, one transaction per granule
+# incremental=False -> old behaviour: empty the table and reload everything (committed per batch)
+def insert_metrics(df, incremental=True):
+    if incremental:
+        return insert_metrics_incremental(df)
+
+    conn, cur, broken = None, None, False
+
+    try:
+        conn = db_pool.retry(pool().acquire)   # BORROWS A POOLED MYSQL CONNECTION (CONFIG SETTINGS)
+        migrate(conn)                          # MAKE SURE THE TYPED TABLES EXIST
+        cur = conn.cursor()
+
+        cur.execute(f"TRUNCATE TABLE {METRICS_TABLE}")      # DELETES EXISTING DATA - AVOID DUPLICATION
+        cur.execute(f"TRUNCATE TABLE {LOAD_LOG_TABLE}")     # LOAD LOG NO LONGER MATCHES THE TABLE
         conn.commit()
 
-        rows = [tuple(row) for row in df.values]   # CONVERT DF TO TUPLE SO MYSWL CAN INSERT DATA
+        upsert_units(cur, df)
+        stats = bulk_load(conn, cur, df)       # STREAMS THE FRAME IN BATCHES, COMMITS EACH ONE
 
-        cur.executemany(insert_sql, rows)     #ITNERS ROWS TO DB AND SAVES IT
+        _rebuild_rollups(cur)                  # ROLLUPS FROM SCRATCH AFTER A FULL RELOAD
+        cur.execute(BUMP_VERSION_SQL)
         conn.commit()
 
-        print(f"✅ Inserted {len(rows)} rows into MySQL")
+        print(f"✅ Inserted {stats['rows']} rows into MySQL")
+        print_throughput(stats)
+        return stats
 
     except Exception as e:
         print(f"❌ DB error: {e}")
+        broken = db_pool.is_transient(e)
 
     finally:
         if cur:
-            cur.close()                # CLSOES DB CONNECTION 
-        if conn:
-            conn.close()
+            cur.close()
+        pool().release(conn, broken)   # BACK TO THE POOL (CLOSED IF THE CONNECTION BROKE)
         print("🧹 DB cleanup complete")
+
+
+# Returns {(filename, date, variable): checksum} for every granule already in the table
+def loaded_granules(cur):
+    cur.execute(f"SELECT filename, date, variable, checksum FROM {LOAD_LOG_TABLE}")
+    return {(filename, str(date), variable): checksum for filename, date, variable, checksum in cur.fetchall()}
+
+
+DELETE_GRANULE_SQL = f"DELETE FROM {METRICS_TABLE} WHERE filename = %s AND variable = %s;"
+GRANULE_REGIONS_SQL = f"SELECT DISTINCT region FROM {METRICS_TABLE} WHERE filename = %s AND variable = %s;"
+LOG_GRANULE_SQL = f"""
+INSERT INTO {LOAD_LOG_TABLE} (filename, date, variable, checksum, row_count)
+VALUES (%s, %s, %s, %s, %s)
+ON DUPLICATE KEY UPDATE checksum = VALUES(checksum), row_count = VALUES(row_count);
+"""
+
+
+# Streaming DB sink: keeps one connection open and upserts granules as they arrive.
+# Each granule is swapped in its own transaction, so readers keep seeing the old rows
+# of a granule until its new rows are committed.
+#   sink = MetricsSink(); sink.open(); sink.write(df); ...; sink.close()
+class MetricsSink:
+    name = "mysql"
+
+    def __init__(self):
+        self.store = f"mysql:{db_config['host']}/{db_config['database']}"   # WHERE THE ROWS END UP (granule_cache manifest)
+        self.pool, self.conn, self.cur = None, None, None
+        self.existing = {}
+        self.loaded, self.skipped, self.failed = 0, 0, 0
+        self.totals = {}
+        self.method = "infile"
+
+    def open(self):
+        self.pool = pool()
+        self.conn = db_pool.retry(self.pool.acquire)
+        migrate(self.conn)
+        self.cur = self.conn.cursor()
+        self.existing = loaded_granules(self.cur)
+        return self
+
+    # Lost connection / deadlock: drop the connection (the server rolls its transaction back) and borrow another
+    def reconnect(self, error=None):
+        self.pool.release(self.conn, broken=True)
+        self.conn = db_pool.retry(self.pool.acquire)
+        self.cur = self.conn.cursor()
+
+    # One granule (filename, day, variable) in one transaction: old rows out, new rows in, rollups, load log
+    def load_granule(self, granule, filename, day, variable, checksum):
+        conn, cur = self.conn, self.cur
+        conn.begin()
+        cur.execute(GRANULE_REGIONS_SQL, (filename, variable))         # REGIONS THE OLD VERSION COVERED
+        touched = {row[0] for row in cur.fetchall()} | set(granule["region"].astype(str).unique())
+        cur.execute(DELETE_GRANULE_SQL, (filename, variable))          # REMOVE OLD VERSION OF THIS GRANULE (IF ANY)
+        with telemetry.stage("write_mysql.insert"):
+            stats = bulk_load(conn, cur, granule, method=self.method, commit_each_batch=False)
+        self.method = stats["method"]                                  # REMEMBER A FALLBACK FOR THE NEXT GRANULES
+        with telemetry.stage("write_mysql.rollups"):
+            for region in sorted(touched):                             # SAME TRANSACTION: ROLLUPS NEVER DRIFT FROM THE ROWS
+                update_rollups(cur, region, variable, day)
+        if variable in matchups.VARIABLES:
+            with telemetry.stage("write_mysql.matchups"):
+                for region in sorted(touched):
+                    update_matchups(cur, region, day)
+        cur.execute(LOG_GRANULE_SQL, (filename, day, variable, checksum, len(granule)))
+        cur.execute(BUMP_VERSION_SQL)
+        conn.commit()
+        return stats
+
+    # Loads every new/changed (filename, date, variable) granule contained in df
+    # Returns False if any of them failed (so the granule is not recorded as extracted)
+    def write(self, df):
+        if df.empty:
+            return
+        failed_before = self.failed
+
+        def units():
+            upsert_units(self.cur, df)
+            self.conn.commit()
+        db_pool.retry(units, on_retry=self.reconnect)
+
+        for (filename, date, variable), granule in df.groupby(["filename", "date", "variable"], dropna=False, sort=False, observed=True):
+            day = str(pd.to_datetime(date).date()) if pd.notna(date) else None
+            if day is None:
+                print(f"⚠️ Skipping {filename} ({variable}): no date")
+                self.failed += 1
+                continue
+
+            checksum = granule_checksum(granule)
+            if self.existing.get((filename, day, variable)) == checksum:      # ALREADY LOADED AND UNCHANGED
+                self.skipped += 1
+                continue
+
+            try:
+                stats = db_pool.retry(lambda: self.load_granule(granule, filename, day, variable, checksum),
+                                      on_retry=self.reconnect)                # TRANSIENT ERRORS: WHOLE GRANULE AGAIN, FRESH CONNECTION
+                self.existing[(filename, day, variable)] = checksum
+                self.loaded += 1
+                add_stats(self.totals, stats)
+            except Exception as e:
+                try:
+                    self.conn.rollback()
+                except Exception:
+                    self.reconnect()
+                self.failed += 1
+                print(f"❌ Failed to load {filename} ({variable}): {e}")
+        return self.failed == failed_before
+
+    def close(self):
+        try:
+            print(f"✅ Loaded {self.loaded} granules ({self.totals.get('rows', 0)} rows), {self.skipped} unchanged, {self.failed} failed")
+            if self.totals:
+                print_throughput(self.totals)
+        finally:
+            if self.cur:
+                self.cur.close()
+            if self.conn:
+                self.pool.release(self.conn)
+            self.conn, self.cur = None, None
+            print("🧹 DB cleanup complete")
+        return self.totals
+
+
+# Upserts only new or changed granules of an in-memory frame (see MetricsSink)
+def insert_metrics_incremental(df):
+    sink = MetricsSink()
+    try:
+        sink.open()
+        sink.write(df)
+    except Exception as e:
+        print(f"❌ DB error: {e}")
+    finally:
+        totals = sink.close()
+    return totals
@@ -0,0 +1,278 @@
+# 📁 dataset.py
+# Compact in-memory copy of what the dashboard draws, loaded once per data version and shared by
+# every session of the process (like aggregation.cache):
+#
+#   daily  (region, variable)        -> date, value_total, value_count, value_max       (satellite_daily)
+#   cells  (region, variable, grid)  -> date, latitude, longitude, value_sum, value_count (satellite_daily_cells)
+#
+# Each piece is pre-split per region/variable/grid (no string filtering on every rerun), holds
+# float32 values / int32 counts and datetime64 dates parsed once, and is sorted by date - so a day
+# or a before/after period is a binary search (np.searchsorted) and a slice, not a scan or a query.
+# Pieces are read from the store the first time a chart needs them - outside the snapshot's lock, which
+# is only held to publish a loaded piece, so one slow query does not block the other sessions.
+# With CUBE_READS=true, a region/variable that has a dense cube (cube.py) is computed from it instead:
+# daily totals and per-cell sums are reductions over memory-mapped time slices, no rollup query.
+#
+# A background thread (Refresher, started by app.py) polls the data version ingest bumps on every
+# load. When it changes it loads the new snapshot off the request path - every region's daily
+# rollup plus the pieces the old snapshot had loaded - and then swaps it in with one assignment:
+# a rerun sees either the old snapshot or the complete new one and never waits for a reload.
+#
+#   ds = dataset.snapshot()            # the shared snapshot (never blocks on a refresh)
+#   ds.day_cell_means(["chlor_a"], "2024-12-20", "4km", "falklands")
+#   dataset.refresher.status()         # version, load duration, rows in memory, last error
+import threading
+import time
+import numpy as np
+import pandas as pd
+from config import native_grid, default_region, variable_list, version_poll_seconds, cube_reads
+import cube
+import queries
+import regions
+import telemetry
+
+DAILY_DTYPES = {"value_total": "float64", "value_count": "int32", "value_max": "float32"}   # TOTALS SUM MILLIONS OF PIXELS
+CELL_DTYPES = {"latitude": "float32", "longitude": "float32", "value_sum": "float64", "value_count": "int32"}  # SUMS ADD UP OVER DAYS
+HEATMAP_COLUMNS = ["lat_bin", "lon_bin", "avg_value"]
+
+
+def _compact(df, dtypes):
+    df = df[["date"] + list(dtypes)].astype(dtypes)
+    df["date"] = df["date"].values.astype("datetime64[ns]")
+    return df.reset_index(drop=True)
+
+
+def _day(date):
+    return np.datetime64(pd.Timestamp(date).normalize(), "ns")
+
+
+# Per-cell mean of several (variable, day) slices of daily cells
+def _cell_means(parts):
+    parts = [p for p in parts if not p.empty]
+    if not parts:
+        return pd.DataFrame(columns=HEATMAP_COLUMNS)
+    cells = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+    sums = cells.groupby(["latitude", "longitude"], sort=False)[["value_sum", "value_count"]].sum()
+    return pd.DataFrame({
+        "lat_bin": sums.index.get_level_values(0),
+        "lon_bin": sums.index.get_level_values(1),
+        "avg_value": sums["value_sum"].to_numpy() / sums["value_count"].to_numpy(),
+    })
+
+
+class Dataset:
+    def __init__(self, version=None):
+        self.version = version
+        self.loaded_at = time.time()
+        self.lock = threading.Lock()
+        self.daily = {}
+        self.cells = {}
+        self.cubes = {}
+
+    # Dense cube of one region/variable when the dashboard reads cubes and ingest has written one, else None
+    def cube_of(self, variable, region=None):
+        key = (region or default_region, variable)
+        if key not in self.cubes:
+            self.cubes[key] = cube.Cube(*key) if cube_reads and cube.exists(*key) else None
+        return self.cubes[key]
+
+    # Daily rollup of one region/variable (all variables of the region are read in one query)
+    def daily_of(self, variable, region=None):
+        region = region or default_region
+        with self.lock:
+            if (region, variable) in self.daily:
+                return self.daily[(region, variable)]
+
+        pieces = {}
+        if self.cube_of(variable, region) is not None:
+            with telemetry.stage("dataset_load_cube"):
+                pieces[(region, variable)] = _compact(self.cube_of(variable, region).daily_stats(), DAILY_DTYPES)
+        else:
+            with telemetry.stage("dataset_load_daily"):
+                rows = queries.daily_rollup(region)
+            for name, part in rows.groupby("variable", sort=False):
+                if self.cube_of(str(name), region) is None:       # CUBE VARIABLES COME FROM THEIR CUBE
+                    pieces[(region, str(name))] = _compact(part, DAILY_DTYPES)
+            for name in [v for v in variable_list if self.cube_of(v, region) is None]:   # WITHOUT DATA: EMPTY, NOT RE-QUERIED
+                pieces.setdefault((region, name), _compact(pd.DataFrame(columns=["date", *DAILY_DTYPES]), DAILY_DTYPES))
+
+        with self.lock:                                           # PUBLISH (A CONCURRENT LOAD MAY HAVE WON - KEEP ITS PIECE)
+            for key, piece in pieces.items():
+                self.daily.setdefault(key, piece)
+            return self.daily[(region, variable)]
+
+    # Daily cells of one region/variable/grid level
+    def cells_of(self, variable, grid=native_grid, region=None):
+        key = (region or default_region, variable, grid)
+        with self.lock:
+            if key in self.cells:
+                return self.cells[key]
+        with telemetry.stage("dataset_load_cells"):
+            piece = _compact(queries.daily_cell_rows(variable, grid, key[0]), CELL_DTYPES)
+        with self.lock:
+            return self.cells.setdefault(key, piece)
+
+    # Rows of a date-sorted piece in [start, stop) - binary search on the date column
+    @staticmethod
+    def between(df, start=None, stop=None):
+        dates = df["date"].values
+        first = 0 if start is None else np.searchsorted(dates, _day(start), "left")
+        last = len(df) if stop is None else np.searchsorted(dates, _day(stop), "left")
+        return df.iloc[first:last]
+
+    # ---------- the aggregates the renderers draw (same results as the queries.py functions) ----------
+
+    def available_dates(self, variables, region=None):
+        dates = np.unique(np.concatenate([self.daily_of(v, region)["date"].values for v in variables]))
+        return list(pd.to_datetime(dates))
+
+    def daily_totals(self, variables, region=None):
+        daily = pd.concat([self.daily_of(v, region) for v in variables], ignore_index=True)
+        totals = daily.groupby("date").agg(total=("value_total", "sum"), n=("value_count", "sum"), max=("value_max", "max")).reset_index()
+        totals.insert(2, "mean", totals["total"] / totals["n"])
+        return totals[["date", "total", "mean", "n", "max"]]
+
+    def period_stats(self, variables, split_date, region=None):
+        stats = {"before": {"total": 0.0, "n": 0, "max": float("nan")}, "after": {"total": 0.0, "n": 0, "max": float("nan")}}
+        for variable in variables:
+            daily = self.daily_of(variable, region)
+            split = np.searchsorted(daily["date"].values, _day(split_date), "left")
+            for period, part in (("before", daily.iloc[:split]), ("after", daily.iloc[split:])):
+                if part.empty:
+                    continue
+                stats[period]["total"] += float(part["value_total"].sum())
+                stats[period]["n"] += int(part["value_count"].sum())
+                stats[period]["max"] = float(np.nanmax([stats[period]["max"], part["value_max"].max()]))
+        for period in ["before", "after"]:
+            n = stats[period]["n"]
+            stats[period]["mean"] = stats[period]["total"] / n if n else float("nan")
+        total, n = stats["before"]["total"] + stats["after"]["total"], stats["before"]["n"] + stats["after"]["n"]
+        stats["all"] = {"total": total, "n": n, "mean": total / n if n else float("nan"),
+                        "max": float(np.nanmax([stats["before"]["max"], stats["after"]["max"]])) if n else float("nan")}
+        return stats
+
+    # Per-cell mean over [start, stop) (None = open end)
+    def cell_means(self, variables, start=None, stop=None, grid=native_grid, region=None):
+        cubes = [self.cube_of(v, region) for v in variables]
+        if variables and all(c is not None for c in cubes):       # SUMS OVER THE MEMORY-MAPPED SLICES OF THE PERIOD/DAY
+            with telemetry.stage("dataset_cube_cells"):
+                return _cell_means([c.cell_sums(start, stop, grid) for c in cubes])
+        return _cell_means([self.between(self.cells_of(v, grid, region), start, stop) for v in variables])
+
+    def day_cell_means(self, variables, date, grid=native_grid, region=None):
+        day = pd.Timestamp(date).normalize()
+        return self.cell_means(variables, day, day + pd.Timedelta(days=1), grid, region)
+
+    # 'before' = the days before the region's event date, 'after' = from it on (the ingest period tag)
+    def period_cell_means(self, variables, period, grid=native_grid, region=None):
+        split = regions.event_date(region)
+        if period == "before":
+            return self.cell_means(variables, None, split, grid, region)
+        return self.cell_means(variables, split, None, grid, region)
+
+    # Loads every region's daily rollup and the same cell pieces as `previous` (the snapshot being replaced)
+    def warm(self, previous=None):
+        for region in regions.names():
+            self.daily_of(variable_list[0], region)
+        if previous is not None:
+            with previous.lock:
+                pieces = list(previous.cells)
+            for region, variable, grid in pieces:
+                self.cells_of(variable, grid, region)
+        return self
+
+    def stats(self):
+        with self.lock:
+            pieces = list(self.daily.values()) + list(self.cells.values())
+        return {"version": self.version, "pieces": len(pieces), "rows": int(sum(len(p) for p in pieces)),
+                "bytes": int(sum(p.memory_usage(index=False).sum() for p in pieces))}
+
+
+# ---------- the shared snapshot + its background refresh ----------
+
+class Refresher:
+    def __init__(self, poll=version_poll_seconds):
+        self.poll = poll
+        self.current = None                 # THE SNAPSHOT EVERY SESSION READS (REPLACED, NEVER MUTATED IN PLACE BY A REFRESH)
+        self.lock = threading.Lock()        # ONE REFRESH AT A TIME
+        self.thread = None
+        self.checked_at = 0.0
+        self.state = {"version": None, "loaded_at": None, "load_seconds": None, "rows": 0, "bytes": 0,
+                      "refreshes": 0, "checked_at": None, "error": None}
+
+    # Polls the data version once; loads and swaps in a new snapshot if it changed. Returns True on a swap.
+    def check(self):
+        with self.lock:
+            self.checked_at = time.monotonic()
+            self.state["checked_at"] = time.time()
+            try:
+                version = queries.data_version()
+            except Exception as e:
+                self.state["error"] = str(e)
+                print(f"⚠️ Data version check failed: {e}")
+                return False
+            previous = self.current
+            if previous is not None and version == previous.version:
+                return False
+
+            started = time.perf_counter()
+            try:
+                queries.reset_connections()                       # NEW LAKE PARTITIONS/ROLLUPS BECOME VISIBLE
+                with telemetry.stage("dataset_refresh", log=True):
+                    fresh = Dataset(version).warm(previous)
+            except Exception as e:
+                self.state["error"] = str(e)
+                print(f"⚠️ Data refresh to version {version} failed, keeping version {previous and previous.version}: {e}")
+                return False
+            seconds = time.perf_counter() - started
+
+            self.current = fresh                                  # THE SWAP: ONE REFERENCE ASSIGNMENT
+            stats = fresh.stats()
+            self.state.update({"version": version, "loaded_at": time.time(), "load_seconds": seconds, "rows": stats["rows"],
+                               "bytes": stats["bytes"], "refreshes": self.state["refreshes"] + 1, "error": None})
+            if previous is not None:
+                print(f"🔄 Data version {previous.version} -> {version}: new snapshot loaded in {seconds:.2f}s ({stats['rows']} rows)")
+            return True
+
+    def run(self):
+        while True:
+            self.check()
+            time.sleep(self.poll)
+
+    # Starts the polling thread (once per process)
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return self.thread
+            self.thread = threading.Thread(target=self.run, name="dataset-refresher", daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def snapshot(self):
+        if self.current is None:                                  # PROCESS START: THE ONLY TIME A SESSION WAITS
+            self.check()
+        elif self.thread is None and time.monotonic() - self.checked_at >= self.poll:
+            self.check()                                          # NO THREAD (CLI, BENCHMARK): POLLED BY THE CALLER
+        if self.current is None:
+            raise RuntimeError(f"No data snapshot loaded: {self.state['error']}")
+        return self.current
+
+    # Refresh state + what the current snapshot holds now (pieces loaded since the swap included)
+    def status(self):
+        state = dict(self.state)
+        if self.current is not None:
+            stats = self.current.stats()
+            state.update(rows=stats["rows"], bytes=stats["bytes"])
+        return state
+
+
+# One refresher (and so one snapshot) per process, shared by every dashboard session
+refresher = Refresher()
+
+
+def snapshot():
+    return refresher.snapshot()
+
+
+def start_refresher():
+    return refresher.start()
@@ -0,0 +1,231 @@
+# 📁 db_pool.py
+# Shared MySQL access for the dashboard and the ingest CLI: a thread-safe connection pool
+# (so the TLS handshake is paid once per connection, not once per query), retries with
+# backoff on transient errors, and server-side streaming reads for large results.
+#
+#   df = db_pool.read_df("SELECT ... WHERE variable = %s", ["chlor_a"])      # pooled + retried
+#   for chunk in db_pool.stream_df("SELECT * FROM satellite_metrics_simple"):  # SSCursor, chunk by chunk
+#       ...
+#   with db_pool.connection() as conn:                                         # borrow a connection
+#       ...
+#
+# Connections are recycled after DB_POOL_RECYCLE_SECONDS and pinged before reuse when they
+# sat idle for more than DB_POOL_PING_SECONDS (the server drops idle connections after
+# wait_timeout). Any pool can be pointed at another server (e.g. a local MariaDB, see benchmark.py).
+# The pool lock only guards the bookkeeping: pings, rollbacks, connects and closes (network round
+# trips) run outside it, so one slow or hung connection never blocks the other acquires/releases.
+import random
+import threading
+import time
+from contextlib import contextmanager
+import pandas as pd
+import pymysql
+import pymysql.cursors
+from config import db_config, db_pool_size, db_pool_recycle_seconds, db_pool_ping_seconds, db_pool_timeout
+from config import db_retry_attempts, db_retry_backoff, db_stream_rows
+
+# MySQL error codes worth retrying: server gone / lost connection / can't connect / lock wait timeout / deadlock
+TRANSIENT_ERRORS = {2003, 2006, 2013, 2055, 1205, 1213}
+
+
+def is_transient(error):
+    if isinstance(error, pymysql.err.InterfaceError):            # CONNECTION ALREADY CLOSED
+        return True
+    if isinstance(error, (pymysql.err.OperationalError, pymysql.err.InternalError)):
+        return bool(error.args) and error.args[0] in TRANSIENT_ERRORS
+    return False
+
+
+# Calls fn() up to `attempts` times, sleeping backoff * 2^n (+ jitter) between tries on transient errors.
+# on_retry(error) runs before each new try (e.g. to swap in a fresh connection).
+def retry(fn, attempts=db_retry_attempts, backoff=db_retry_backoff, on_retry=None):
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == attempts - 1 or not is_transient(e):
+                raise
+            delay = backoff * 2 ** attempt * (1 + random.random() / 2)
+            print(f"🔁 Transient DB error ({e}), retrying in {delay:.1f}s ({attempt + 1}/{attempts - 1})")
+            time.sleep(delay)
+            if on_retry is not None:
+                on_retry(e)
+
+
+class ConnectionPool:
+    def __init__(self, config=db_config, size=db_pool_size, recycle=db_pool_recycle_seconds,
+                 ping_after=db_pool_ping_seconds, timeout=db_pool_timeout, **connect_args):
+        self.config = dict(config, **connect_args)
+        self.size = size
+        self.recycle = recycle
+        self.ping_after = ping_after
+        self.timeout = timeout
+        self.idle = []                    # [(conn, created_at, returned_at)] - most recently returned last
+        self.created = {}                 # id(conn) -> created_at, for every open connection (idle or lent)
+        self.available = threading.Condition()
+        self.connects = 0                 # NEW CONNECTIONS MADE (HANDSHAKES) - SEE benchmark.py pool
+
+    def _connect(self):
+        return pymysql.connect(**self.config)
+
+    # Forgets a connection (frees its slot) and closes it - the close outside the lock
+    def _discard(self, conn):
+        with self.available:
+            self.created.pop(id(conn), None)
+            self.available.notify()
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    # Reusable idle connection, or None if it is too old / does not answer a ping
+    def _check(self, conn, created_at, returned_at):
+        now = time.monotonic()
+        if now - created_at > self.recycle:
+            return None
+        if now - returned_at > self.ping_after:
+            try:
+                conn.ping(reconnect=False)
+            except Exception:
+                return None
+        return conn
+
+    # Borrows a connection (waits up to `timeout` seconds when all `size` are lent out)
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self.available:
+                while not self.idle and len(self.created) >= self.size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"No free DB connection after {self.timeout}s (pool size {self.size})")
+                    self.available.wait(remaining)
+                if not self.idle:
+                    placeholder = object()                      # RESERVE THE SLOT WHILE CONNECTING (OUTSIDE THE LOCK)
+                    self.created[id(placeholder)] = time.monotonic()
+                    break
+                conn, created_at, returned_at = self.idle.pop() # LENT FROM HERE ON: NO OTHER THREAD GETS IT
+            if self._check(conn, created_at, returned_at) is not None:   # PING OUTSIDE THE LOCK
+                return conn
+            self._discard(conn)
+        try:
+            conn = self._connect()                              # NOT RETRIED HERE: CALLERS RETRY THE WHOLE OPERATION
+        except Exception:
+            with self.available:
+                self.created.pop(id(placeholder), None)
+                self.available.notify()
+            raise
+        with self.available:
+            self.created[id(conn)] = self.created.pop(id(placeholder))
+            self.connects += 1
+        return conn
+
+    # Returns a connection; broken=True (or an unusable one) closes it instead of pooling it
+    def release(self, conn, broken=False):
+        if conn is None:
+            return
+        usable = not broken and conn.open
+        if usable:
+            try:
+                conn.rollback()                                # NEVER HAND OUT A HALF-OPEN TRANSACTION (OUTSIDE THE LOCK)
+            except Exception:
+                usable = False
+        with self.available:
+            if usable and id(conn) in self.created:
+                self.idle.append((conn, self.created[id(conn)], time.monotonic()))
+                self.available.notify()
+                return
+        self._discard(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+        except Exception as e:
+            broken = is_transient(e)
+            raise
+        finally:
+            self.release(conn, broken)
+
+    def close(self):
+        with self.available:
+            idle, self.idle = self.idle, []
+        for conn, _, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self.available:
+            return {"size": self.size, "open": len(self.created), "idle": len(self.idle), "connects": self.connects}
+
+
+# ---------- shared pools (one per set of connect options, per process) ----------
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+# The process-wide pool for db_config (+ extra pymysql.connect options, e.g. local_infile=True for ingest)
+def get_pool(**connect_args):
+    key = tuple(sorted(connect_args.items()))
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(**connect_args)
+        return _pools[key]
+
+
+@contextmanager
+def connection(**connect_args):
+    with get_pool(**connect_args).connection() as conn:
+        yield conn
+
+
+def _frame(cur, rows):
+    columns = [d[0] for d in cur.description]
+    return pd.DataFrame.from_records(list(rows), columns=columns, coerce_float=True)   # DECIMAL SUMS -> FLOAT
+
+
+# Runs a read query on a pooled connection (retried on transient errors) and returns a DataFrame
+def read_df(sql, params=(), pool=None):
+    pool = pool or get_pool()
+
+    def attempt():
+        with pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql, list(params))
+                return _frame(cur, cur.fetchall())
+
+    return retry(attempt)
+
+
+# Streams a large result with a server-side cursor (SSCursor): yields DataFrames of `chunk_rows`
+# rows, so only one chunk is ever in memory. Starting the query is retried; a failure mid-stream is raised.
+def stream_df(sql, params=(), chunk_rows=db_stream_rows, pool=None):
+    pool = pool or get_pool()
+
+    def start():
+        conn = pool.acquire()
+        try:
+            cur = conn.cursor(pymysql.cursors.SSCursor)
+            cur.execute(sql, list(params))
+            return conn, cur
+        except Exception as e:
+            pool.release(conn, broken=is_transient(e))
+            raise
+
+    conn, cur = retry(start)
+    broken = False
+    try:
+        while True:
+            rows = cur.fetchmany(chunk_rows)
+            if not rows:
+                break
+            yield _frame(cur, rows)
+    except Exception as e:
+        broken = is_transient(e)
+        raise
+    finally:
+        if not broken:
+            cur.close()                                   # A STREAM ABANDONED HALFWAY IS DRAINED FIRST (CONNECTION STAYS USABLE)
+        pool.release(conn, broken)
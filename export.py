@@ -0,0 +1,256 @@
+# 📁 export.py
+# Raw-data exports (CSV / Parquet / NetCDF), built only when someone actually downloads.
+#
+# An export streams its rows from the store chunk by chunk (queries.raw_row_chunks: a server-side
+# cursor on MySQL, Arrow record batches on the lake) straight into the output file, so memory holds
+# one chunk whatever the size. Finished files are kept in EXPORT_DIR keyed by
+#     (format, region, variables, date range, data version)
+# so the second download of the same selection is just a file read, and new data makes a new file.
+# The folder is bounded to EXPORT_MAX_GB (least recently used files are deleted first).
+#
+#   python export.py --format parquet --variables chlor_a --start 2024-12-15 --end 2025-01-07
+import argparse
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import h5netcdf
+import streamlit as st
+from config import export_dir, export_max_bytes, export_chunk_rows, variable_list, default_region
+import queries
+import regions
+import row_schema
+import telemetry
+
+# format -> (file extension, MIME type)
+FORMATS = {
+    "csv": (".csv", "text/csv"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+    "netcdf": (".nc", "application/x-netcdf"),
+}
+
+COLUMNS = ["region", "product", "date", "period", "variable", "latitude", "longitude", "value"]
+
+PARQUET_SCHEMA = pa.schema([row_schema.PARQUET_SCHEMA.field(c) for c in COLUMNS])      # SAME TYPES AS THE INGESTED ROWS
+
+PERIODS = ["before", "after"]
+
+_locks = {}                     # export file -> [lock, sessions using it], so two sessions never build the same file at once
+_locks_lock = threading.Lock()
+
+
+# Holds the lock of one export file; the entry is dropped when the last session using it is done
+@contextmanager
+def _export_lock(name):
+    with _locks_lock:
+        entry = _locks.setdefault(name, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _locks_lock:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _locks[name]
+
+
+# Same dtypes whichever store the chunk came from (MySQL returns datetime.date objects, DuckDB datetime64)
+def _normalize(chunk):
+    chunk = chunk[COLUMNS].copy()
+    chunk["date"] = pd.to_datetime(chunk["date"])
+    for column in ["latitude", "longitude", "value"]:
+        chunk[column] = chunk[column].astype(np.float32)
+    return chunk
+
+
+# ---------- writers: open / write(chunk) / close ----------
+
+class CsvWriter:
+    def __init__(self, path, variables, region):
+        self.f = open(path, "w", newline="")
+        self.header = True
+
+    def write(self, chunk):
+        chunk.to_csv(self.f, header=self.header, index=False, date_format="%Y-%m-%d")
+        self.header = False
+
+    def close(self):
+        if self.header:                                  # NO ROWS: STILL A VALID CSV WITH ITS HEADER
+            self.f.write(",".join(COLUMNS) + "\n")
+        self.f.close()
+
+
+class ParquetWriter:
+    def __init__(self, path, variables, region):
+        self.writer = pq.ParquetWriter(path, PARQUET_SCHEMA, compression="zstd")
+
+    def write(self, chunk):
+        chunk = chunk.assign(date=chunk["date"].dt.date)
+        self.writer.write_table(pa.Table.from_pandas(chunk, schema=PARQUET_SCHEMA, preserve_index=False))
+
+    def close(self):
+        self.writer.close()
+
+
+# CF "point" layout: one unlimited obs dimension, the variable and period as flag-coded int8.
+# gzip-compressed; the variables are created on the first chunk so their HDF5 chunks are no bigger
+# than the export (a small selection is not padded out to EXPORT_CHUNK_ROWS rows)
+class NetcdfWriter:
+    def __init__(self, path, variables, region):
+        self.variables = list(variables)
+        self.f = h5netcdf.File(path, "w")
+        self.f.attrs.update({"Conventions": "CF-1.8", "featureType": "point", "region": region,
+                             "title": f"OceanX raw pixels - {regions.label(region)}"})
+        self.f.dimensions = {"obs": None}
+        self.specs = {
+            "time": ("i4", {"units": "days since 1970-01-01", "standard_name": "time"}),
+            "latitude": ("f4", {"units": "degrees_north", "standard_name": "latitude"}),
+            "longitude": ("f4", {"units": "degrees_east", "standard_name": "longitude"}),
+            "value": ("f4", {"coordinates": "time latitude longitude"}),
+            "variable": ("i1", {"flag_values": np.arange(len(self.variables), dtype=np.int8),
+                                "flag_meanings": " ".join(self.variables)}),
+            "period": ("i1", {"flag_values": np.arange(len(PERIODS), dtype=np.int8), "flag_meanings": " ".join(PERIODS)}),
+        }
+        self.rows = 0
+
+    def _create_variables(self, chunk_rows):
+        for name, (dtype, attrs) in self.specs.items():
+            var = self.f.create_variable(name, ("obs",), dtype, chunks=(max(1, min(chunk_rows, export_chunk_rows, 1 << 20)),),
+                                         compression="gzip", compression_opts=4, shuffle=True)
+            var.attrs.update(attrs)
+
+    def write(self, chunk):
+        n = len(chunk)
+        if "value" not in self.f.variables:
+            self._create_variables(n)                    # THE FIRST CHUNK IS THE WHOLE EXPORT WHEN IT IS SMALL
+        self.f.resize_dimension("obs", self.rows + n)
+        rows = slice(self.rows, self.rows + n)
+        self.f.variables["time"][rows] = (chunk["date"].values.astype("datetime64[D]").astype(np.int64)).astype(np.int32)
+        self.f.variables["latitude"][rows] = chunk["latitude"].values
+        self.f.variables["longitude"][rows] = chunk["longitude"].values
+        self.f.variables["value"][rows] = chunk["value"].values
+        self.f.variables["variable"][rows] = pd.Categorical(chunk["variable"], categories=self.variables).codes.astype(np.int8)
+        self.f.variables["period"][rows] = pd.Categorical(chunk["period"], categories=PERIODS).codes.astype(np.int8)
+        self.rows += n
+
+    def close(self):
+        if "value" not in self.f.variables:              # NO ROWS: STILL EVERY VARIABLE, JUST EMPTY
+            self._create_variables(1)
+        self.f.close()
+
+
+WRITERS = {"csv": CsvWriter, "parquet": ParquetWriter, "netcdf": NetcdfWriter}
+
+
+# ---------- building / caching ----------
+
+def _selection(variables, start, end, region):
+    variables = sorted(variables or variable_list)
+    start = pd.Timestamp(start).date() if start is not None else None
+    end = pd.Timestamp(end).date() if end is not None else None
+    return variables, start, end, region or default_region
+
+
+# Name the user sees (the cached file on disk also carries a hash of the selection + data version)
+def export_name(fmt, variables=None, start=None, end=None, region=None):
+    variables, start, end, region = _selection(variables, start, end, region)
+    span = f"_{start}_{end}" if start or end else ""
+    return f"oceanx_{region}_{'-'.join(variables)}{span}{FORMATS[fmt][0]}"
+
+
+def export_path(fmt, variables=None, start=None, end=None, region=None):
+    variables, start, end, region = _selection(variables, start, end, region)
+    key = repr((fmt, region, variables, str(start), str(end), queries.data_version()))
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    return Path(export_dir) / f"{Path(export_name(fmt, variables, start, end, region)).stem}.{digest}{FORMATS[fmt][0]}"
+
+
+# Builds (or reuses) the export file for the selection and returns its path
+def export(fmt, variables=None, start=None, end=None, region=None):
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown export format {fmt!r} (known: {', '.join(WRITERS)})")
+    variables, start, end, region = _selection(variables, start, end, region)
+    path = export_path(fmt, variables, start, end, region)
+    with _export_lock(path.name):
+        if path.exists():
+            os.utime(path)                               # MOST RECENTLY USED
+            telemetry.count("export_cache_hits")
+            return path
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        stop = end + timedelta(days=1) if end is not None else None
+        rows = 0
+        with telemetry.stage(f"export_{fmt}", log=True):
+            writer = WRITERS[fmt](tmp, variables, region)
+            try:
+                for chunk in queries.raw_row_chunks(variables, start, stop, region, export_chunk_rows):
+                    writer.write(_normalize(chunk))
+                    rows += len(chunk)
+            finally:
+                writer.close()
+        os.replace(tmp, path)                            # ATOMIC: NOBODY DOWNLOADS A HALF-WRITTEN FILE
+        print(f"📦 Exported {rows} rows to {path} ({path.stat().st_size / 1e6:.1f} MB)")
+        _evict(keep=path)
+        return path
+
+
+# Least recently used exports go first until the folder fits in export_max_bytes
+def _evict(keep=None):
+    files = sorted((p for p in Path(export_dir).glob("oceanx_*") if not p.name.endswith(".tmp")),
+                   key=lambda p: p.stat().st_mtime)
+    total = sum(p.stat().st_size for p in files)
+    for path in files:
+        if total <= export_max_bytes:
+            break
+        if path == keep:
+            continue
+        total -= path.stat().st_size
+        path.unlink(missing_ok=True)
+
+
+# ---------- dashboard ----------
+
+# Export picker + download button. Nothing is queried or serialized on a rerun: the file is built
+# (or taken from the cache) only when the button is clicked. A fragment, so changing the format,
+# variables or dates reruns only the panel.
+@st.fragment
+def download_panel(region, default_variables, dates, key):
+    if not dates:                                        # NOTHING TO EXPORT FOR THIS REGION (YET)
+        st.info("No data for this region yet")
+        return
+    with st.expander("Download raw data"):
+        col1, col2, col3 = st.columns(3)
+        fmt = col1.selectbox("Format", list(FORMATS), format_func=str.upper, key=f"{key}_format")
+        variables = col2.multiselect("Variables", variable_list, default=list(default_variables), key=f"{key}_variables")
+        first, last = pd.to_datetime(min(dates)).date(), pd.to_datetime(max(dates)).date()
+        span = col3.date_input("Dates", value=(first, last), min_value=first, max_value=last, key=f"{key}_dates")
+        start, end = (span[0], span[-1]) if span else (first, last)       # ONE DATE WHILE THE USER IS STILL PICKING
+
+        st.download_button(
+            label=f"Download {fmt.upper()}",
+            data=lambda: export(fmt, variables, start, end, region).read_bytes(),
+            file_name=export_name(fmt, variables, start, end, region),
+            mime=FORMATS[fmt][1],
+            on_click="ignore",                           # NO RERUN WHEN THE FILE IS DOWNLOADED
+            disabled=not variables,
+            key=key,
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export raw pixels from the configured store")
+    parser.add_argument("--format", choices=list(FORMATS), default="csv")
+    parser.add_argument("--variables", help="comma separated (default: every variable)")
+    parser.add_argument("--start")
+    parser.add_argument("--end")
+    parser.add_argument("--region", default=default_region)
+    args = parser.parse_args()
+    print(export(args.format, args.variables.split(",") if args.variables else None, args.start, args.end, args.region))
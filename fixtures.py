@@ -0,0 +1,105 @@
+# 📁 fixtures.py
+# Synthetic PACE OCI L3M granules + an offline stand-in for earthaccess, so the ingest
+# pipeline can run without NASA credentials or network access.
+#
+#   from fixtures import make_granules, LocalGranuleSource
+#   make_granules("fixtures_nc", "2024-12-15", "2025-01-07")
+#   fetch_and_process(source=LocalGranuleSource("fixtures_nc"))
+import os
+import shutil
+from pathlib import Path
+import fsspec
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+FILL_VALUE = -32767.0
+
+# product -> (file tag, variable, units, log-normal parameters for realistic values)
+PRODUCTS = {
+    "PACE_OCI_L3M_CHL": ("CHL", "chlor_a", "mg m^-3", (-1.0, 0.8)),
+    "PACE_OCI_L3M_FLH": ("FLH", "nflh", "W m^-2 um^-1 sr^-1", (-4.0, 0.6)),
+}
+
+RESOLUTIONS = {"4km": 1 / 24, "9km": 1 / 12}
+
+
+def granule_filename(product, date, resolution="4km"):
+    tag, var_name, _, _ = PRODUCTS[product]
+    return f"PACE_OCI.{pd.Timestamp(date):%Y%m%d}.L3m.DAY.{tag}.V3_0.{var_name}.{resolution}.nc"
+
+
+# Writes one L3M-like granule: lat descending, lon ascending, float32 values with _FillValue,
+# ~30% of pixels missing (cloud/land) and a `palette` variable like the real files.
+# extent=(west, south, east, north); None = the full global grid (4320 x 8640 at 4km)
+def write_granule(path, product, date, extent=(-66.0, -58.0, -52.0, -46.0), resolution="4km", seed=None):
+    _, var_name, units, (mu, sigma) = PRODUCTS[product]
+    step = RESOLUTIONS[resolution]
+    west, south, east, north = extent if extent else (-180.0, -90.0, 180.0, 90.0)
+
+    lat = np.arange(north - step / 2, south, -step, dtype=np.float32)
+    lon = np.arange(west + step / 2, east, step, dtype=np.float32)
+
+    rng = np.random.default_rng(seed if seed is not None else pd.Timestamp(date).dayofyear)
+    values = rng.lognormal(mu, sigma, (lat.size, lon.size)).astype(np.float32)
+    values[rng.random(values.shape) < 0.3] = np.nan
+
+    ds = xr.Dataset(
+        {
+            var_name: (("lat", "lon"), values, {"units": units, "long_name": var_name}),
+            "palette": (("rgb", "eightbitcolor"), np.zeros((3, 256), dtype=np.uint8)),
+        },
+        coords={
+            "lat": ("lat", lat, {"units": "degrees_north"}),
+            "lon": ("lon", lon, {"units": "degrees_east"}),
+        },
+        attrs={"product_name": Path(path).name, "time_coverage_start": f"{pd.Timestamp(date):%Y-%m-%d}T00:00:00Z"},
+    )
+    encoding = {var_name: {"_FillValue": FILL_VALUE, "dtype": "float32", "zlib": True, "chunksizes": (min(512, lat.size), min(1024, lon.size))}}
+    ds.to_netcdf(path, encoding=encoding)
+    return Path(path)
+
+
+# Writes one granule per product per day into directory and returns the paths
+def make_granules(directory, start, end, products=tuple(PRODUCTS), **kwargs):
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for date in pd.date_range(start, end, freq="D"):
+        for product in products:
+            path = Path(directory) / granule_filename(product, date, kwargs.get("resolution", "4km"))
+            if not path.exists():
+                write_granule(path, product, date, **kwargs)
+            paths.append(path)
+    return paths
+
+
+# Offline stand-in for the earthaccess module: search_data() lists fixture files and
+# download() copies them (so the pipeline can delete its copy without losing the fixture)
+class LocalGranuleSource:
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def search_data(self, short_name, temporal, bounding_box=None, granule_name="*", **kwargs):
+        tag = PRODUCTS[short_name][0]
+        start, end = pd.Timestamp(temporal[0]), pd.Timestamp(temporal[1])
+        results = []
+        for path in sorted(self.directory.glob(granule_name)):
+            parts = path.name.split(".")
+            if parts[4] != tag:
+                continue
+            if start <= pd.Timestamp(parts[1][:8]) <= end:
+                results.append(str(path))
+        return results
+
+    def download(self, granules, local_path, **kwargs):
+        os.makedirs(local_path, exist_ok=True)
+        paths = []
+        for granule in granules:
+            target = Path(local_path) / Path(granule).name
+            shutil.copyfile(granule, target)
+            paths.append(str(target))
+        return paths
+
+    # Filesystem for READ_MODE=remote (byte-range reads of the fixture files themselves)
+    def filesystem(self):
+        return fsspec.filesystem("file")
@@ -1,73 +1,65 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import duckdb
-from config import iron_release_date
+from config import default_region
 import plotly.graph_objects as go
+import queries
+import aggregation
+import grids
+import regions
+import telemetry
+import export
+import raster
+
+FLH_VARIABLES = queries.variables_matching('FLH')
+CHL_VARIABLES = queries.variables_matching('CHL')
+
+# Heatmap zoom (the pyramid level is picked per region so the figure stays under HEATMAP_MAX_POINTS)
+HEATMAP_ZOOM = 6
  
-def aggregate_for_heatmap(df):     # TABLE - AVG CHL/FHL PER LONG/ LAT   ?????????
-    query = """
-    SELECT
-        Latitude AS lat_bin,
-        Longitude AS lon_bin,
-        AVG(value) AS avg_value
-    FROM df
-    GROUP BY lat_bin, lon_bin
-    """
-    return duckdb.query(query).to_df()
  
  
  
- 
-def plotly_heatmap(df, title="Heatmap"):    # PLOTS AVERAGE FHL PER SPECIFIC LONG/LAT ON HEATMAP ????
-    if df.empty:
+def plotly_heatmap(image, title="Heatmap"):    # PLOTS AVERAGE FHL PER SPECIFIC LONG/LAT ON HEATMAP ????
+    if image is None:
         st.warning("No data available for this selection.")
         return
-    px.set_mapbox_access_token("pk.eyJ1Ijoid2lsbHBlcmVpcmExMDgtIiwiYSI6ImNtYWRxeGloOTBhcWwybG9meWMybWQ0bG0ifQ.1PqKU69HpvY4u3LfqkthQw")  # User's real token
-    fig = px.density_mapbox(
-        df,
-        lat='lat_bin',
-        lon='lon_bin',
-        z='avg_value',
-        radius=10,
-        center=dict(lat=df['lat_bin'].mean(), lon=df['lon_bin'].mean()),
-        zoom=6,
-        mapbox_style='carto-darkmatter',
-        color_continuous_scale=[
-            [0, "#B2EBF2"],
-            [0.5, "#00bcd4"],
-            [1, "#003366"]
-        ],
-        title=title,
-        labels={'avg_value': ' Average Fluorescence (W·m⁻²·µm⁻¹·sr⁻¹) '}
+    fig = raster.figure(image, title=title, colorbar_title=' Average Fluorescence (W·m⁻²·µm⁻¹·sr⁻¹) ', zoom=HEATMAP_ZOOM)   # ONE SERVER-RENDERED IMAGE, NOT ONE POINT PER CELL
+    fig.update_layout(
+        margin={"r":0,"t":40,"l":0,"b":0},
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)'
     )
-    fig.update_layout(margin={"r":0,"t":40,"l":0,"b":0})
     st.plotly_chart(fig, use_container_width=True)
  
  
  
  
  
-def render_flh_analysis(df):     # ????
+@telemetry.timed("render_flh")
+def render_flh_analysis(region=default_region):
     st.markdown("<br>", unsafe_allow_html=True)  # Add spacing
  
-    flh_df = df[df['Measurement'].str.contains('FLH', case=False, na=False)].copy() # FITLERS FOR FHL???
-    flh_df['date'] = pd.to_datetime(flh_df['date'])                                 # CHANGE TO DATE ???
-    before_data = flh_df[flh_df['date'] < pd.to_datetime(iron_release_date)]       # BEFORE IRON RELEASE???
-    after_data = flh_df[flh_df['date'] >= pd.to_datetime(iron_release_date)]     # AFTER IRON RELEASE???
+    dates = aggregation.available_dates(FLH_VARIABLES, region)    # unique values for date in the store
+    if not dates:                                                 # REGION WITHOUT FLH ROWS (YET)
+        st.info("No data for this region yet")
+        return
+    release = pd.to_datetime(regions.event_date(region))
+    grid = grids.pick_grid(HEATMAP_ZOOM, regions.bbox_of(region))                      # PYRAMID LEVEL FOR THIS REGION'S SIZE
+    stats = aggregation.period_stats(FLH_VARIABLES, release, region)  # BEFORE/AFTER/ALL STATS (COMPUTED IN THE DB)
  
-    flh_before = before_data['value'].mean()              #GROWTH %
-    flh_after = after_data['value'].mean()    
+    flh_before = stats['before']['mean']              #GROWTH %
+    flh_after = stats['after']['mean']    
     flh_change = flh_after - flh_before
     flh_change_pct = ((flh_after - flh_before) / flh_before) * 100 if flh_before != 0 else 0
  
     # ----- FLH OVER TIME LINE CHART (moved to top) -----
     st.subheader("Total FLH in Region Over Time")
-    daily_flh_totals = flh_df.groupby('date')['value'].sum().reset_index()
+    daily_flh_totals = aggregation.daily_totals(FLH_VARIABLES, region)
     fig = go.Figure()
     fig.add_trace(go.Scatter(
         x=daily_flh_totals['date'],
-        y=daily_flh_totals['value'],
+        y=daily_flh_totals['total'],
         mode='lines',
         line=dict(width=3, color='#4FC3F7'),
         fill='tozeroy',
@@ -85,11 +77,11 @@ def render_flh_analysis(df):     # ????
     col1, col2, col3, col4 = st.columns(4)
    
     with col1:
-        st.metric("Average FLH", f"{flh_df['value'].mean():.2f}")     # AVG FLH
+        st.metric("Average FLH", f"{stats['all']['mean']:.2f}")     # AVG FLH
    
    
     with col2:
-        st.metric("Max FLH", f"{flh_df['value'].max():.2f}")         # MAX FLH
+        st.metric("Max FLH", f"{stats['all']['max']:.2f}")         # MAX FLH
    
     with col3:
         st.metric("ΔFLH", f"{flh_change:.2f}")                     # ??? ABSOUTLE CHANGE IN AVERAGE FLH AFTER RELEASE COMAPRED TO BEFORE
@@ -105,13 +97,13 @@ def render_flh_analysis(df):     # ????
     col1, col2 = st.columns(2)
     with col1:
         st.subheader("Before Iron Release")                 # HEATMAP AVERAGE FHL EACH LOCATION - BEFORE
-        agg_before = aggregate_for_heatmap(before_data)
+        agg_before = aggregation.heatmap_image(FLH_VARIABLES, period='before', resolution=grid, region=region)
         plotly_heatmap(agg_before)
    
    
     with col2:
         st.subheader("After Iron Release")
-        agg_after = aggregate_for_heatmap(after_data)   # HEATMAP AFTER FLH EACH LOCATION - AFTER
+        agg_after = aggregation.heatmap_image(FLH_VARIABLES, period='after', resolution=grid, region=region)   # HEATMAP AFTER FLH EACH LOCATION - AFTER
         plotly_heatmap(agg_after)
  
     st.markdown("<br>", unsafe_allow_html=True)
@@ -120,32 +112,13 @@ def render_flh_analysis(df):     # ????
    
     # ----- SINGLE-DAY HEATMAP BY DATE SLIDER -----
  
-    dates = sorted(flh_df['date'].unique())    # unique values for date in df
-   
-    selected_date = st.slider(                                # SLIDER
-        "Select Date",
-        min_value=pd.to_datetime(min(dates)).to_pydatetime(), # sets earlierst/ latest values for slider
-        max_value=pd.to_datetime(max(dates)).to_pydatetime(),
-        value=pd.to_datetime(max(dates)).to_pydatetime(),    # set default value to latest date
-        format="YYYY-MM-DD",
-        key="flh_date_slider"
-    )
-   
-   
-    time_data = flh_df[flh_df['date'] == selected_date]    #????
-   
-    agg_time = aggregate_for_heatmap(time_data)           #????
-   
-    plotly_heatmap(agg_time, title=f"{selected_date.strftime('%Y-%m-%d')}")  #????
+    render_flh_day_heatmap(region, grid, dates)                   # FRAGMENT: THE SLIDER RERUNS ONLY THIS HEATMAP
  
     st.markdown("<br>", unsafe_allow_html=True)
    
    
     # ----- CHLOROPHYLL VS FLH SCATTER PLOT -----
-    chl_df = df[df['Measurement'].str.contains('CHL', case=False, na=False)].copy()      #???????
-    chl_df['date'] = pd.to_datetime(chl_df['date'])
-    flh_df['date'] = pd.to_datetime(flh_df['date'])
-    combined_data = pd.merge(chl_df, flh_df, on=['date', 'Latitude', 'Longitude'], suffixes=('_chl', '_flh'))
+    combined_data = aggregation.matchup(CHL_VARIABLES, FLH_VARIABLES, region)      # PREJOINED AT INGEST, DOWNSAMPLED TO SCATTER_MAX_POINTS
     st.subheader("Chlorophyll vs FLH Scatter Plot")
     fig = px.scatter(combined_data, x='value_chl', y='value_flh',
                     labels={'value_chl': 'Chlorophyll-a (mg/m³)', 'value_flh': 'FLH'},
@@ -176,12 +149,29 @@ def render_flh_analysis(df):     # ????
     </style>
     """, unsafe_allow_html=True)
  
-    # Download button for raw data (at the bottom)
-    csv = df.to_csv(index=False)
-    st.download_button(
-        label="Download raw data as CSV",
-        data=csv,
-        file_name='raw_data.csv',
-        mime='text/csv',
-        key='download_fhl_csv'
+    # Download raw data (at the bottom) - the file is built only when the button is clicked
+    export.download_panel(region, FLH_VARIABLES, dates, key=f"download_flh_{region}")
+
+
+
+# Single-day heatmap + its date slider. A fragment: moving the slider reruns this function only,
+# not the charts, metrics and scatter plot around it.
+@st.fragment
+@telemetry.timed("render_flh_day")
+def render_flh_day_heatmap(region, grid, dates):
+    if not dates:
+        st.info("No data for this region yet")
+        return
+    selected_date = st.slider(                                # SLIDER
+        "Select Date",
+        min_value=pd.to_datetime(min(dates)).to_pydatetime(), # sets earlierst/ latest values for slider
+        max_value=pd.to_datetime(max(dates)).to_pydatetime(),
+        value=pd.to_datetime(max(dates)).to_pydatetime(),    # set default value to latest date
+        format="YYYY-MM-DD",
+        key=f"flh_date_slider_{region}"
     )
+   
+   
+    agg_time = aggregation.heatmap_image(FLH_VARIABLES, date=selected_date, resolution=grid, region=region)           # ONLY THE SELECTED DAY IS AGGREGATED
+   
+    plotly_heatmap(agg_time, title=f"{selected_date.strftime('%Y-%m-%d')}")  #????
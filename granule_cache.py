@@ -0,0 +1,247 @@
+# 📁 granule_cache.py
+# Persistent on-disk cache of downloaded granules, so re-runs and backfills over an overlapping
+# date range only download what is missing.
+#
+#   downloads/
+#     manifest.json                        what is cached + what was already extracted into the stores
+#     objects/<sha256[:16]>/<granule>.nc   content-addressed (the folder is the file's SHA-256,
+#                                          the file keeps its granule name - ingest reads the date from it)
+#     incoming/                            downloads in progress
+#
+# Entries are keyed by granule ID (the file name) and checked against the checksum CMR publishes
+# for the granule when there is one, so a reprocessed granule is fetched again. The cache is
+# bounded to GRANULE_CACHE_MAX_GB: least recently used files are evicted first, never one that
+# is still being processed.
+#
+# The manifest is written when something changed, at most every SAVE_INTERVAL seconds, and by flush()
+# at the end of a run - not once per lookup/add/release. A crash loses at most the last few seconds:
+# an unlisted cached file is downloaded again, an unlisted extraction is loaded again.
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from config import download_dir, granule_cache_max_bytes
+
+SAVE_INTERVAL = 5.0           # SECONDS BETWEEN MANIFEST WRITES DURING A RUN
+
+
+# Granule ID of a search result (earthaccess DataGranule or a fixture path)
+def granule_id(result):
+    if hasattr(result, "data_links"):
+        return Path(result.data_links()[0]).name
+    return Path(str(result)).name
+
+
+# Checksum CMR publishes for the granule ("Algorithm:value"), or None if unknown
+def remote_checksum(result):
+    try:
+        name = granule_id(result)
+        for item in result["umm"]["DataGranule"]["ArchiveAndDistributionInformation"]:
+            if item.get("Name", name) == name and "Checksum" in item:
+                return f"{item['Checksum']['Algorithm']}:{item['Checksum']['Value']}"
+    except (KeyError, TypeError, IndexError):
+        pass
+    return None
+
+
+def file_sha256(path, block=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(block), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class GranuleCache:
+    def __init__(self, root=download_dir, max_bytes=granule_cache_max_bytes):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.pinned = set()           # GRANULE IDS CURRENTLY BEING PROCESSED - NEVER EVICTED
+        self.hits, self.misses = 0, 0
+        self.dirty, self.saved_at = False, 0.0
+        (self.root / "incoming").mkdir(parents=True, exist_ok=True)
+        self.manifest = self._load()
+
+    # ---------- manifest ----------
+
+    def _manifest_path(self):
+        return self.root / "manifest.json"
+
+    def _load(self):
+        path = self._manifest_path()
+        if path.exists():
+            with open(path) as f:
+                return json.load(f)
+        return {"granules": {}, "extracted": {}}
+
+    # Manifest changed: written now if the last write is SAVE_INTERVAL old (CALLED WITH self.lock HELD)
+    def _save(self, force=False):
+        self.dirty = True
+        if not force and time.monotonic() - self.saved_at < SAVE_INTERVAL:
+            return
+        self._write()
+
+    def _write(self):
+        path = self._manifest_path()
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(tmp, path)
+        self.dirty, self.saved_at = False, time.monotonic()
+
+    # Writes pending manifest changes (end of a run)
+    def flush(self):
+        with self.lock:
+            if self.dirty:
+                self._write()
+
+    # ---------- cached files ----------
+
+    # Local path of a cached granule (and marks it used), or None on a miss / stale checksum
+    def lookup(self, gid, checksum=None):
+        with self.lock:
+            entry = self.manifest["granules"].get(gid)
+            if entry is None:
+                return None
+            path = self.root / entry["path"]
+            stale = checksum is not None and entry.get("checksum") not in (None, checksum)
+            if stale or not path.exists():
+                self._drop(gid)
+                self._save()
+                return None
+            entry["last_used"] = time.time()
+            self.pinned.add(gid)
+            self._save()
+            return path
+
+    # Moves a freshly downloaded file into the cache and returns its cached path
+    def add(self, gid, downloaded, checksum=None):
+        downloaded = Path(downloaded)
+        sha256 = file_sha256(downloaded)
+        target = self.root / "objects" / sha256[:16] / gid
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(downloaded, target)
+
+        with self.lock:
+            self.manifest["granules"][gid] = {
+                "path": target.relative_to(self.root).as_posix(),
+                "sha256": sha256,
+                "checksum": checksum,
+                "bytes": target.stat().st_size,
+                "last_used": time.time(),
+            }
+            self.pinned.add(gid)
+            self._evict()
+            self._save()
+        return target
+
+    # Cached path for a search result, downloading it only on a miss
+    def fetch(self, source, result):
+        gid, checksum = granule_id(result), remote_checksum(result)
+        path = self.lookup(gid, checksum)
+        if path is not None:
+            self.hits += 1
+            print(f"♻️ Cache hit: {gid}")
+            return [str(path)]
+
+        self.misses += 1
+        incoming = self.root / "incoming" / f"{os.getpid()}-{threading.get_ident()}"
+        incoming.mkdir(parents=True, exist_ok=True)
+        try:
+            paths = source.download([result], str(incoming))
+            return [str(self.add(Path(p).name, p, checksum if Path(p).name == gid else None)) for p in paths]
+        finally:
+            shutil.rmtree(incoming, ignore_errors=True)
+
+    # Granule finished processing: it may be evicted again
+    def release(self, path):
+        with self.lock:
+            self.pinned.discard(Path(path).name)
+            if self._evict():
+                self._save()
+
+    # Removes a granule we never want to keep (e.g. wrong resolution)
+    def discard(self, path):
+        with self.lock:
+            self.pinned.discard(Path(path).name)
+            self._drop(Path(path).name)
+            self._save()
+
+    def _drop(self, gid):
+        entry = self.manifest["granules"].pop(gid, None)
+        if entry is None:
+            return
+        path = self.root / entry["path"]
+        try:
+            path.unlink()
+            path.parent.rmdir()
+        except OSError:
+            pass
+
+    # Least recently used first until the cache fits in max_bytes (pinned granules stay); returns the number evicted
+    def _evict(self):
+        granules = self.manifest["granules"]
+        total = sum(entry["bytes"] for entry in granules.values())
+        evicted = 0
+        for gid, entry in sorted(granules.items(), key=lambda item: item[1]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            if gid in self.pinned:
+                continue
+            total -= entry["bytes"]
+            self._drop(gid)
+            evicted += 1
+            print(f"🧹 Evicted {gid} from the granule cache")
+        return evicted
+
+    def size_bytes(self):
+        with self.lock:
+            return sum(entry["bytes"] for entry in self.manifest["granules"].values())
+
+    # ---------- extraction manifest ----------
+
+    # True if the granule (same checksum when known) was already written to every one of `stores`
+    def is_extracted(self, gid, stores, checksum=None):
+        if not stores:
+            return False
+        with self.lock:
+            entry = self.manifest["extracted"].get(gid)
+        if entry is None:
+            return False
+        if checksum is not None and entry.get("checksum") not in (None, checksum):
+            return False
+        return set(stores) <= set(entry["stores"])
+
+    # A different checksum/content than the entry's (granule reprocessed upstream) starts the store list
+    # over: stores that loaded the old version are not up to date with the new one
+    def mark_extracted(self, gid, stores, rows, checksum=None):
+        with self.lock:
+            entry = self.manifest["extracted"].get(gid, {"stores": []})
+            cached = self.manifest["granules"].get(gid, {})
+            checksum = checksum or cached.get("checksum") or entry.get("checksum")
+            sha256 = cached.get("sha256", entry.get("sha256"))
+            changed = (None not in (checksum, entry.get("checksum")) and checksum != entry.get("checksum")) or \
+                      (None not in (sha256, entry.get("sha256")) and sha256 != entry.get("sha256"))
+            previous = [] if changed else entry["stores"]
+            self.manifest["extracted"][gid] = {
+                "stores": sorted(set(previous) | set(stores)),
+                "rows": int(rows),
+                "checksum": checksum,
+                "sha256": sha256,
+                "extracted_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            }
+            self._save()
+
+    # Forget what was extracted (e.g. after wiping a store) so the next run loads everything again
+    def forget_extracted(self, stores=None):
+        with self.lock:
+            if stores is None:
+                self.manifest["extracted"] = {}
+            else:
+                for entry in self.manifest["extracted"].values():
+                    entry["stores"] = [s for s in entry["stores"] if s not in stores]
+            self._save(force=True)
@@ -0,0 +1,56 @@
+# 📁 grids.py
+# Spatial binning for the heatmap pyramid. Every level in config.grid_levels is a regular
+# lat/lon grid; a pixel belongs to the cell whose centre is (floor(x / step) + 0.5) * step.
+# Ingest precomputes the rollups for every level, and the renderer picks the finest level
+# that fits the point budget at the current zoom - so the figure size stays roughly constant
+# however large config.bbox gets.
+import numpy as np
+from config import grid_levels, heatmap_max_points, bbox
+
+# Levels from finest to coarsest
+LEVELS = sorted(grid_levels.items(), key=lambda item: item[1])
+
+
+# Cell centre for each coordinate (works on scalars, NumPy arrays and pandas Series)
+def bin_coord(values, step):
+    return (np.floor(np.asarray(values, dtype="float64") / step) + 0.5) * step
+
+
+# SQL expression doing the same binning inside MySQL/DuckDB
+def bin_sql(column, step):
+    return f"(FLOOR({column} / {step!r}) + 0.5) * {step!r}"
+
+
+# Degrees of longitude covered by one screen pixel at a web-map zoom level
+def degrees_per_pixel(zoom):
+    return 360.0 / (256 * 2 ** zoom)
+
+
+# Finest level whose cells are at least one screen pixel wide and whose cell count over
+# the visible part of `extent` (a region's bbox) stays under `max_points`
+def pick_grid(zoom=6, extent=bbox, max_points=heatmap_max_points, viewport_px=(900, 600)):
+    west, south, east, north = extent
+    deg_px = degrees_per_pixel(zoom)
+    view_w = min(east - west, viewport_px[0] * deg_px)
+    view_h = min(north - south, viewport_px[1] * deg_px)
+
+    for name, step in LEVELS:
+        if step < deg_px:                       # FINER THAN A SCREEN PIXEL - INVISIBLE DETAIL
+            continue
+        if (view_w / step) * (view_h / step) <= max_points:
+            return name
+    return LEVELS[-1][0]
+
+
+
+# Integer (row, col) of the cell holding each coordinate, counted from (-90, -180): an exact join key
+# for pixels of two products whose float coordinates differ by a rounding error
+def cell_index(lat, lon, step):
+    rows = np.floor((np.asarray(lat, dtype="float64") + 90.0) / step).astype("int32")
+    cols = np.floor((np.asarray(lon, dtype="float64") + 180.0) / step).astype("int32")
+    return rows, cols
+
+
+# Centre (lat, lon) of cells given by cell_index
+def cell_centre(rows, cols, step):
+    return (np.asarray(rows) + 0.5) * step - 90.0, (np.asarray(cols) + 0.5) * step - 180.0
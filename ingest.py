@@ -1,167 +1,445 @@
-import os  # For file operations like deleting files
 import xarray as xr  # For handling NetCDF files (scientific data format)
-import pandas as pd  
-import numpy as np  
-from config import product_list, download_dir, iron_release_date, start_date, end_date, bbox  # Import settings from config file
-import earthaccess  
+import pandas as pd
+import numpy as np
+from config import product_list, variable_list, start_date, end_date, bbox  # Import settings from config file
+from config import download_workers, process_workers, max_in_flight, output_file, ingest_sinks
+from config import read_mode, reader_engine, reader_block_size, reader_chunks
+import earthaccess
+import pyarrow as pa
+import pyarrow.parquet as pq
+import time
 from pathlib import Path  # Safer file path operations
-from database import insert_metrics  # Function to insert data into database
- 
+from contextlib import contextmanager, ExitStack
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from database import MetricsSink  # Streams granules into the database
+from lake import LakeSink  # Streams granules into the partitioned Parquet lake
+from cube import CubeSink  # Appends each granule as a time slice of the dense per-variable cubes
+from granule_cache import GranuleCache, granule_id, remote_checksum  # Persistent download cache + extraction manifest
+import regions  # Region registry (name -> bbox + event date)
+import telemetry  # Stage timings, counters and per-granule records (JSON lines / Prometheus)
+from row_schema import OUTPUT_COLUMNS, PARQUET_SCHEMA  # Columns (and types) every sink receives, in this order
+import dask  # Lazy chunked arrays behind xr.open_dataset(chunks=reader_chunks): only the bbox chunks are read
+
 # ===============================
 # ✅ PIPELINE SUMMARY (STEP-BY-STEP)
 # ===============================
 #
-# [Filter & download satellite data from Earthaccess API]
+# [Search Earthaccess API for every product (e.g. CHL, FLH)]
 #     ⬇
-# [Filter downloaded files for daily 4km resolution]
+# [Skip granules the extraction manifest says are already in every store]
 #     ⬇
-# [Open file as NetCDF (.nc)]
+# [Download pool (threads): fetch granules a few at a time]        <- DOWNLOAD_WORKERS, bounded by MAX_IN_FLIGHT
+#     (cache hits in download_dir are not downloaded again)
+#     (READ_MODE=remote skips this: the process pool reads byte ranges straight from the source)
 #     ⬇
-# [Load data as xarray.Dataset]
+# [Process pool (processes): each downloaded granule ...]          <- PROCESS_WORKERS
+#     [Filter for daily 4km resolution]
+#     [Open file lazily (h5netcdf, chunked) -> xarray.Dataset, nothing decoded yet]
+#     [For every registered region: find its lat/lon index range and read only that hyperslab of every variable]
+#     [Keep the valid pixels as NumPy lat/lon/value arrays + categorical metadata]
 #     ⬇
-# [Loop through variables (e.g. chlor_a, nflh)]
+# [Release the granule back to the cache (LRU eviction keeps download_dir under GRANULE_CACHE_MAX_GB)]
 #     ⬇
-# [Subset by bounding box (lat/lon) using .sel()]
-#     ⬇
-# [Convert xarray → pandas DataFrame (lat/lon/value)]
-#     ⬇
-# [Clean, label metadata, and stack rows]
-#     ⬇
-# [Save as CSV and insert into database]
+# [Hand each granule's rows straight to the sinks (database, Parquet lake, optional Parquet file)]
+#  -> nothing accumulates, memory stays flat whatever the date range
+#
+# Every stage is timed (telemetry.py): search, download, open, decode, subset, concat, write_<sink>;
+# one record per granule (bytes, rows, seconds per stage, worker RSS) goes to TELEMETRY_FILE
+# and the run ends with a stage table (see telemetry.report).
 #
 # ===============================
- 
- 
- 
-# Main function that handles the entire data processing pipeline
-def fetch_and_process():
-    all_metrics = []  # Empty list to store all processed data
- 
+
+
+
+# Opens a granule lazily: a local path with READER_ENGINE, or - when fs (an fsspec filesystem) is
+# given - a remote/mirrored file through h5netcdf, which fetches only the byte ranges it touches
+@contextmanager
+def open_granule(file_path, fs=None):
+    if fs is None:
+        with xr.open_dataset(file_path, engine=reader_engine, chunks=reader_chunks) as ds:
+            yield ds
+    else:
+        with fs.open(file_path, "rb", block_size=reader_block_size) as f:
+            with xr.open_dataset(f, engine="h5netcdf", chunks=reader_chunks) as ds:
+                yield ds
+
+
+# Index ranges of a bbox (default config.bbox) along lat/lon (works whichever way the coordinates are sorted)
+def bbox_slices(ds, extent=bbox):
+    west, south, east, north = extent
+    lat, lon = ds['lat'].values, ds['lon'].values
+    rows = np.nonzero((lat >= south) & (lat <= north))[0]
+    cols = np.nonzero((lon >= west) & (lon <= east))[0]
+    if rows.size == 0 or cols.size == 0:
+        return {'lat': slice(0, 0), 'lon': slice(0, 0)}
+    return {'lat': slice(rows[0], rows[-1] + 1), 'lon': slice(cols[0], cols[-1] + 1)}
+
+
+# Opens one downloaded granule and returns the subset of every registered region as a DataFrame
+# (one row per pixel per variable per region). Runs inside the process pool, so it only takes/returns
+# picklable things.
+#
+# Vectorized: the file is opened once and every requested variable is sliced for every region from
+# the same handle, lat/lon/value come straight from the NumPy arrays (values keep the source float32)
+# and the metadata (product, filename, region, period, variable, units) are categoricals - a few bytes
+# per row instead of one Python string object per row. Adding a region costs one more hyperslab
+# read per variable, not another download or decode of the granule.
+# timings: optional dict filled with seconds per stage (open / decode / subset / concat)
+def process_granule(file_path, product, fs=None, region_names=None, timings=None):
+    name = Path(file_path).name
+    region_names = list(region_names or regions.names())
+
+    # Extract date from filename
+    date_raw = name.split(".")[1][:8]
+    try:
+        date = pd.to_datetime(date_raw)
+    except Exception:
+        date = None
+
+    names, units = [], []
+    lat_parts, lon_parts, value_parts, codes, region_codes = [], [], [], [], []
+
+    # Open the NetCDF dataset (lazily - only the coordinates are read here)
+    with ExitStack() as stack:
+        with telemetry.timed_into(timings, "open"):
+            ds = stack.enter_context(open_granule(file_path, fs))
+            slabs = [bbox_slices(ds, regions.bbox_of(region)) for region in region_names]
+
+        # Process each variable in the dataset (skip palette and anything not requested)
+        for var_name, var_data in ds.data_vars.items():
+            if var_name.lower() == 'palette' or var_name.lower() not in variable_list:
+                continue
+
+            for region_code, bounds in enumerate(slabs):
+                subset = var_data.isel(bounds).transpose('lat', 'lon')
+                with telemetry.timed_into(timings, "decode"):
+                    values = np.asarray(subset.values)                      # READS ONLY THE BBOX CHUNKS, SOURCE DTYPE
+                with telemetry.timed_into(timings, "subset"):
+                    valid = ~np.isnan(values)                               # MISSING PIXELS (FILL VALUE / CLOUD / LAND)
+                    rows, cols = np.nonzero(valid)
+
+                    lat_parts.append(subset['lat'].values[rows])
+                    lon_parts.append(subset['lon'].values[cols])
+                    value_parts.append(values[valid])
+                    codes.append(np.full(rows.size, len(names), dtype=np.int8))
+                    region_codes.append(np.full(rows.size, region_code, dtype=np.int16))
+            names.append(var_name)
+            units.append(var_data.attrs.get('units', None))
+
+    if not names:
+        return pd.DataFrame()
+
+    with telemetry.timed_into(timings, "concat"):
+        return build_frame(name, product, date, region_names, names, units,
+                           lat_parts, lon_parts, value_parts, codes, region_codes)
+
+
+# One granule's NumPy pieces -> the output frame (categorical metadata, shared by every row)
+def build_frame(name, product, date, region_names, names, units, lat_parts, lon_parts, value_parts, codes, region_codes):
+    codes, region_codes = np.concatenate(codes), np.concatenate(region_codes)
+    n = codes.size
+    unit_categories = sorted({u for u in units if u is not None})
+    unit_codes = np.array([unit_categories.index(u) if u is not None else -1 for u in units], dtype=np.int8)
+    periods = [regions.period_of(date, region) if date is not None else "after" for region in region_names]
+    period_codes = np.array([["before", "after"].index(p) for p in periods], dtype=np.int8)
+
+    return pd.DataFrame({
+        'latitude': np.concatenate(lat_parts),
+        'longitude': np.concatenate(lon_parts),
+        'value': np.concatenate(value_parts),
+        'product': pd.Categorical.from_codes(np.zeros(n, dtype=np.int8), [product]),
+        'filename': pd.Categorical.from_codes(np.zeros(n, dtype=np.int8), [name]),
+        'date': np.full(n, np.datetime64(date) if date is not None else np.datetime64('NaT'), dtype='datetime64[ns]'),
+        'region': pd.Categorical.from_codes(region_codes, region_names),
+        'period': pd.Categorical.from_codes(period_codes[region_codes], ["before", "after"]),
+        'variable': pd.Categorical.from_codes(codes, names),
+        'units': pd.Categorical.from_codes(unit_codes[codes], unit_categories),
+    })
+
+
+# Process-pool entry point: the granule's frame, its stage timings and the worker's RSS once it is done
+# (current, not ru_maxrss - a reused worker's lifetime peak says nothing about this granule)
+def process_granule_timed(file_path, product, fs=None):
+    timings = {}
+    df = process_granule(file_path, product, fs, timings=timings)
+    return df, timings, telemetry.current_rss()
+
+
+# Where a search result can be read from without downloading it (READ_MODE=remote)
+def granule_url(result):
+    return result.data_links()[0] if hasattr(result, "data_links") else str(result)
+
+
+# fsspec filesystem for remote reads: the source's own (fixtures) or an authenticated Earthdata HTTPS session
+def remote_filesystem(source):
+    if hasattr(source, "filesystem"):
+        return source.filesystem()
+    return source.get_fsspec_https_session()
+
+
+# Pipelined executor: a thread pool downloads granules while a process pool decodes the ones
+# already on disk. At most `max_in_flight` granules are downloading/waiting/processing at once,
+# so a fast network cannot fill the disk faster than the CPUs drain it (backpressure).
+# Yields (file_path, DataFrame) as each granule finishes. Downloads go through the granule cache
+# (hits are not downloaded again) and are released back to it once processed.
+# With read_mode="remote" there is no download stage: granules are read in place, bbox chunks only.
+def run_pipeline(jobs, source, download_workers=download_workers, process_workers=process_workers, max_in_flight=max_in_flight,
+                 read_mode=read_mode, cache=None):
+    jobs = iter(jobs)   # (product, search result) pairs
+    active = {}         # future -> (stage, product, file_path)
+    fs = remote_filesystem(source) if read_mode == "remote" else None
+    cache = cache or GranuleCache()
+
+    process_pool = ProcessPoolExecutor(process_workers) if process_workers > 0 else ThreadPoolExecutor(1)
+    with ThreadPoolExecutor(max(1, download_workers)) as download_pool, process_pool:
+
+        def download(result):   # cache.fetch, timed per granule (cache hits included - they still cost a lookup)
+            started = time.perf_counter()
+            paths = cache.fetch(source, result)
+            seconds = time.perf_counter() - started
+            telemetry.current.add("download", seconds)
+            for path in paths:
+                telemetry.note_granule(Path(path).name, stages={"download": seconds}, bytes=Path(path).stat().st_size)
+            return paths
+
+        def fill():   # TOP UP THE DOWNLOAD QUEUE WHILE THERE IS ROOM
+            while len(active) < max(1, max_in_flight):
+                job = next(jobs, None)
+                if job is None:
+                    return
+                product, result = job
+                if fs is not None:
+                    url = granule_url(result)
+                    print(f"📡 Reading remotely: {Path(url).name}")
+                    telemetry.note_granule(Path(url).name, product=product, read_mode="remote")
+                    active[process_pool.submit(process_granule_timed, url, product, fs)] = ("remote", product, Path(url))
+                else:
+                    telemetry.note_granule(granule_id(result), product=product, read_mode="download")
+                    active[download_pool.submit(download, result)] = ("download", product, Path(granule_id(result)))
+
+        fill()
+        while active:
+            done, _ = wait(active, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, product, file_path = active.pop(future)
+
+                if stage == "download":
+                    try:
+                        paths = future.result()
+                    except Exception as e:
+                        print(f"❌ Download failed: {e}")
+                        telemetry.count("granules_failed")
+                        telemetry.finish_granule(file_path.name, ok=False, error=f"download: {e}")
+                        continue
+                    for path in paths:
+                        path = Path(path)
+                        # Only process daily 4km resolution files
+                        if not "4km.nc" in path.name:                               # Simplified check
+                            print(f"⏭️ Skipping non-4km file: {path.name}")
+                            cache.discard(path)
+                            telemetry.drop_granule(path.name)
+                            continue
+                        print(f"📂 Opening file: {path.name}")
+                        telemetry.note_granule(path.name, product=product)
+                        active[process_pool.submit(process_granule_timed, str(path), product)] = ("process", product, path)
+
+                else:
+                    try:
+                        df, timings, worker_rss = future.result()
+                    except Exception as e:
+                        print(f"⚠️ Failed to process {file_path.name}: {e}")
+                        telemetry.count("granules_failed")
+                        telemetry.finish_granule(file_path.name, ok=False, error=f"process: {e}")
+                    else:
+                        telemetry.current.merge(timings)
+                        telemetry.note_granule(file_path.name, stages=timings, worker_rss=worker_rss)
+                        yield file_path, df
+                    finally:
+                        # Hand the file back to the cache (it stays on disk until evicted)
+                        if stage == "process":
+                            cache.release(file_path)
+            fill()
+
+
+# Optional columnar file sink: appends granules to one Parquet file, flushing a row group
+# every `chunk_rows` rows so at most one chunk is buffered in memory
+class ParquetFileSink:
+    name = "parquet"
+
+    def __init__(self, path, chunk_rows=250_000):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.buffer, self.buffered = [], 0
+        self.writer = None
+        self.rows = 0
+
+    def open(self):
+        self.writer = pq.ParquetWriter(self.path, PARQUET_SCHEMA, compression="zstd")
+        return self
+
+    def write(self, df):
+        if df.empty:
+            return
+        frame = df[OUTPUT_COLUMNS].copy()
+        frame["date"] = pd.to_datetime(frame["date"]).dt.date
+        self.buffer.append(pa.Table.from_pandas(frame, schema=PARQUET_SCHEMA, preserve_index=False))
+        self.buffered += len(frame)
+        if self.buffered >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.writer.write_table(pa.concat_tables(self.buffer))
+            self.rows += self.buffered
+            self.buffer, self.buffered = [], 0
+
+    def close(self):
+        self.flush()
+        if self.writer:
+            self.writer.close()
+            print(f"💾 {self.rows} rows saved to {self.path}")
+
+
+# Searches every product over [start, end] and returns (product, search result) pairs
+# source: anything with earthaccess' search_data()/download() (fixtures.LocalGranuleSource offline)
+def search_jobs(source=None, products=product_list, start=start_date, end=end_date):
+    source = source or earthaccess
+    jobs = []
+
     # Loop through each satellite product we want to analyze
-    for product in product_list:
+    for product in products:
         print(f"🔍 Searching for granules for: {product}")
- 
+
         #SEARCH CRITERIA (PRODUCT/ DATE/ LOCATION)
-        results = earthaccess.search_data(                                  
-            short_name=product,                                            # Product name (e.g., chlorophyll data)
-            temporal=(start_date, end_date),                              # Date range to search
-            bounding_box=bbox,                                            # Geographic area to search
-            granule_name="*.DAY.*.4km.*"                                  # Filter for daily 4km resolution files
-        )
- 
+        with telemetry.stage("search"):
+            results = source.search_data(
+                short_name=product,                                        # Product name (e.g., chlorophyll data)
+                temporal=(start, end),                                     # Date range to search
+                bounding_box=regions.union_bbox(),                        # Geographic area to search (covers every region)
+                granule_name="*.DAY.*.4km.*"                              # Filter for daily 4km resolution files
+            )
+
         # Skip if no data found for this product
         if not results:
             print(f"⚠️ No granules found for {product}")
             continue
- 
-        print(f"📥 Attempting to download {len(results)} granules...")
- 
-        # Try to download the satellite data files
-        try:
-            paths = earthaccess.download(results, download_dir)  # Download files to our download directory      #DOWNLOAD DATA BASED OF CRITERIA  
-        except Exception as e:
-            print(f"❌ Download failed: {e}")
-            paths = []
- 
-        # Process each downloaded file
-        for file_path in paths:
-            file_path = Path(file_path)
-            print(f"📂 Opening file: {file_path.name}")
- 
-            # Only process daily 4km resolution files
-            if not "4km.nc" in file_path.name:                               # Simplified check
-                print(f"⏭️ Skipping non-4km file: {file_path.name}")
+
+        print(f"🔎 Found {len(results)} granules for {product}")
+        telemetry.count("granules_found", len(results))
+        jobs.extend((product, result) for result in results)
+    return jobs
+
+
+# Generator over the whole search (or the given jobs - a list or a lazy generator): yields (file_path, DataFrame)
+# one granule at a time. Granules the cache's extraction manifest lists as already written to every one of
+# `stores` are skipped.
+def iter_granules(source=None, download_workers=download_workers, process_workers=process_workers, max_in_flight=max_in_flight,
+                  read_mode=read_mode, cache=None, stores=(), jobs=None, redo=False):
+    source = source or earthaccess
+    cache = cache or GranuleCache()
+    jobs = search_jobs(source) if jobs is None else jobs
+
+    def pending():
+        for product, result in jobs:
+            if not redo and cache.is_extracted(granule_id(result), stores, remote_checksum(result)):
+                print(f"⏭️ Already extracted: {granule_id(result)}")
                 continue
- 
-            try:
-                # Open the NetCDF dataset
-                with xr.open_dataset(file_path) as ds:
-                    # Extract date from filename
-                    date_raw = file_path.name.split(".")[1][:8]
-                    try:
-                        date = pd.to_datetime(date_raw)
-                    except Exception:
-                        date = None
- 
-                    # Process each variable in the dataset
-                    for var_name, var_data in ds.data_vars.items():
-                        # Skip unnecessary variables
-                        if var_name.lower() == 'palette' or var_name.lower() not in ['chlor_a', 'nflh', 'flh']:
-                            continue
- 
-                        # Get units from variable attributes
-                        units = var_data.attrs.get('units', None)
- 
-                        # Use xarray's sel to subset the data to region of interest
-                        bounds = {
-                            'lon': slice(bbox[0], bbox[2]),      
-                            'lat': slice(bbox[3], bbox[1])  # Reversed order for decreasing latitude values
-                        }
-                       
-                        # Subset the data using xarray's sel
-                        subset = var_data.sel(bounds)            
-                       
-                        # Stack coordinates and convert to DataFrame
-                        df = subset.to_dataframe().reset_index()                    
-                       
-                        # Add metadata columns
-                        df['product'] = product
-                        df['filename'] = file_path.name
-                        df['date'] = date
-                        df['period'] = "before" if date and date.strftime("%Y%m%d") < iron_release_date.replace("-", "") else "after"
-                        df['variable'] = var_name
-                        df['units'] = units
-                       
-                        # Rename columns to match expected schema
-                        df = df.rename(columns={
-                            'lat': 'latitude',
-                            'lon': 'longitude',
-                            var_name: 'value'
-                        })
- 
-                        # Remove rows with missing values
-                        df = df.dropna(subset=['value'])      
-                       
-                        # Add DataFrame to list
-                        all_metrics.append(df)
- 
-            except Exception as e:
-                print(f"⚠️ Failed to process {file_path.name}: {e}")
- 
+            yield product, result
+
+    yield from run_pipeline(pending(), source, download_workers, process_workers, max_in_flight, read_mode, cache)
+
+
+# Default sinks from INGEST_SINKS (database, lake and/or cube), plus a single Parquet file when OUTPUT_FILE is set
+def default_sinks():
+    sinks = []
+    if "mysql" in ingest_sinks:
+        sinks.append(MetricsSink())
+    if "lake" in ingest_sinks:
+        sinks.append(LakeSink())
+    if "cube" in ingest_sinks:
+        sinks.append(CubeSink())
+    if output_file:
+        sinks.append(ParquetFileSink(output_file))
+    return sinks
+
+
+# Persistent stores the sinks write to, one entry per registered region ("<store>#<region>") -
+# granules already in all of them can be skipped; registering a new region makes every granule
+# pending again (re-extracted from the granule cache). A sink without a store (e.g. the single
+# Parquet file, rewritten every run) needs every granule: no stores.
+def sink_stores(sinks):
+    if not all(getattr(sink, "store", None) for sink in sinks):
+        return []
+    return [f"{sink.store}#{region}" for sink in sinks for region in regions.names()]
+
+
+# Main function that handles the entire data processing pipeline
+# Streams every granule into each sink as soon as it is processed and returns the total row count
+# jobs: (product, search result) pairs to run instead of searching config's start_date..end_date
+# on_granule(file_path, df, ok): called after each granule is written, ok=False if a sink failed or raised (checkpointing, see main.py)
+# A sink that raises is logged and left out of the granule's stores, like a MetricsSink load failure
+# run: name of the telemetry run (stage table + JSON lines summary printed/written at the end)
+# redo: load every job again, even granules the extraction manifest says are already in every store
+def fetch_and_process(source=None, sinks=None, download_workers=download_workers, process_workers=process_workers, max_in_flight=max_in_flight,
+                      read_mode=read_mode, cache=None, jobs=None, on_granule=None, run="ingest", redo=False):
+    telemetry.new_run(run)
+    sinks = default_sinks() if sinks is None else sinks
+    cache = cache or GranuleCache()
+    total_rows, granules = 0, 0
+
+    stores = sink_stores(sinks)
+
+    for sink in sinks:
+        sink.open()
+    try:
+        for file_path, df in iter_granules(source, download_workers, process_workers, max_in_flight, read_mode, cache, stores, jobs, redo):
+            stored, ok = [], True                            # STORES (PER REGION) THAT NOW HOLD THIS GRANULE
+            timings = {}
+            for sink in sinks:
+                name = getattr(sink, "name", type(sink).__name__)
+                try:
+                    with telemetry.timed_into(timings, f"write_{name}"):
+                        written = sink.write(df)
+                except Exception as e:                       # ONE SINK DOWN: THE OTHERS KEEP THE GRANULE, THE RUN GOES ON
+                    print(f"❌ {name} sink failed for {file_path.name}: {e}")
+                    written = False
+                if written is False:
+                    ok = False
+                elif getattr(sink, "store", None):
+                    stored += [f"{sink.store}#{region}" for region in regions.names()]
+            telemetry.current.merge(timings)
+            cache.mark_extracted(file_path.name, stored, len(df))
+            if on_granule is not None:
+                on_granule(file_path, df, ok)
+            total_rows += len(df)
+            granules += 1
+            telemetry.count("rows", len(df))
+            telemetry.count("granules")
+            record = telemetry.finish_granule(file_path.name, stages=timings, rows=len(df), ok=ok,
+                                              frame_bytes=int(df.memory_usage(deep=True).sum()))
+
             # Print progress information
-            print(f"\n📈 Metrics collected for {file_path.name}:")
-            total_rows = sum(len(df) for df in all_metrics)
+            print(f"\n📈 Metrics collected for {file_path.name}: {len(df)} rows in {record['seconds']:.2f} s")
             print(f"Total records: {total_rows}")
-            if all_metrics:
+            if not df.empty:
                 print("Sample of last 5 records:")
-                print(pd.concat(all_metrics[-1:]).tail())
+                print(df.tail())
             print("\n")
- 
-            # Clean up by deleting the downloaded file
-            try:
-                os.remove(file_path)
-            except Exception as e:
-                print(f"⚠️ Failed to delete {file_path.name}: {e}")
- 
-    # Combine all DataFrames
-    expected_columns = ["product", "filename", "date", "period", "variable", "latitude", "longitude", "value", "units"]
-    df = pd.concat(all_metrics, ignore_index=True)
-    df = df.where(pd.notna(df), None)  # Replace NaN with None for database compatibility
- 
-    # Save data to CSV file for inspection
-    df.to_csv('satellite_data.csv', index=False)
-    print(f"💾 Data saved to satellite_data.csv for viewing in Data Wrangler")
- 
-    print(f"📊 Total rows prepared: {len(df)}")
-    return df
- 
+    finally:
+        for sink in sinks:
+            sink.close()
+        cache.flush()                                        # MANIFEST CHANGES BATCHED DURING THE RUN
+        telemetry.count("cache_hits", cache.hits)
+        telemetry.count("cache_misses", cache.misses)
+
+    print(f"📊 Total rows processed: {total_rows} from {granules} granules")
+    telemetry.report()
+    return total_rows
+
 # This code runs when the script is executed directly (not imported)
-if __name__ == "__main__":   #????
-    df = fetch_and_process()
-    if df.empty:
+if __name__ == "__main__":
+    total_rows = fetch_and_process()
+    if total_rows == 0:
         print("⚠️ No data extracted.")
     else:
-        insert_metrics(df)  # Insert data into database
         print("✅ Pipeline complete")
- 
- 
@@ -0,0 +1,74 @@
+# 📁 ingest_state.py
+# Checkpoints for the ingest CLI (main.py): which (product#region, day) tasks are complete, which
+# granules of unfinished days are already loaded, and which failed. Saved (atomically) after
+# every granule, so a run that dies halfway resumes where it stopped.
+#
+#   {"products": {"PACE_OCI_L3M_CHL#falklands": {"done_days": ["2024-12-15", ...],
+#                                                "granules": {"2024-12-16": {"<granule>": rows}},
+#                                                "failed": {"2024-12-17": ["<granule>"]}}},
+#    "runs": [{"command": "backfill", "start": ..., "end": ..., "granules": ..., "rows": ..., ...}]}
+import json
+import os
+import threading
+from pathlib import Path
+from config import state_file
+
+MAX_RUNS = 50    # RUN HISTORY KEPT IN THE FILE
+
+
+class IngestState:
+    def __init__(self, path=state_file):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.data = {"products": {}, "runs": []}
+        if self.path.exists():
+            with open(self.path) as f:
+                self.data = json.load(f)
+
+    def save(self):
+        with self.lock:
+            tmp = self.path.with_suffix(".tmp")
+            with open(tmp, "w") as f:
+                json.dump(self.data, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+
+    def _product(self, product):
+        return self.data["products"].setdefault(product, {"done_days": [], "granules": {}, "failed": {}})
+
+    def is_day_done(self, product, day):
+        return day in self._product(product)["done_days"]
+
+    def mark_granule(self, product, day, granule, rows):
+        state = self._product(product)
+        state["granules"].setdefault(day, {})[granule] = int(rows)
+        if granule in state["failed"].get(day, []):           # RETRIED SUCCESSFULLY
+            state["failed"][day].remove(granule)
+            if not state["failed"][day]:
+                del state["failed"][day]
+        self.save()
+
+    # Every granule of the day is loaded: keep just the day, drop the per-granule detail
+    def finish_day(self, product, day):
+        state = self._product(product)
+        if day not in state["done_days"]:
+            state["done_days"] = sorted(state["done_days"] + [day])
+        state["granules"].pop(day, None)
+        state["failed"].pop(day, None)
+        self.save()
+
+    def mark_failed(self, product, day, granules):
+        failed = self._product(product)["failed"].setdefault(day, [])
+        failed.extend(g for g in granules if g not in failed)
+        self.save()
+
+    # Latest day completed for every one of `products` (None until each has at least one)
+    def last_done_day(self, products):
+        days = [self._product(p)["done_days"][-1] if self._product(p)["done_days"] else None for p in products]
+        return None if None in days or not days else min(days)
+
+    def failed(self):
+        return {p: s["failed"] for p, s in self.data["products"].items() if s["failed"]}
+
+    def record_run(self, run):
+        self.data["runs"] = (self.data["runs"] + [run])[-MAX_RUNS:]
+        self.save()
@@ -0,0 +1,304 @@
+# 📁 lake.py
+# Columnar data lake: the same rows as satellite_metrics_simple, stored as Parquet files
+# partitioned by region / product / variable / date (one file per granule per variable per region):
+#
+#   lake/region=falklands/product=PACE_OCI_L3M_CHL/variable=chlor_a/date=2024-12-15/part-<granule>.parquet
+#
+# Values are float32 and the repeated strings are dictionary-encoded, so a day of 4km pixels is a few KB.
+# DuckDB reads it with partition pruning (WHERE on region/product/variable/date skips whole folders)
+# and projection pushdown (only the selected columns are decoded).
+#
+# Rollups (see rollups.py) are kept next to it, updated every time a partition is written:
+#
+#   lake/_rollups/daily/region=falklands/variable=chlor_a/date=2024-12-15/part.parquet
+#   lake/_rollups/daily_cells/region=falklands/variable=chlor_a/date=2024-12-15/part.parquet
+#   lake/_rollups/period_cells/region=falklands/variable=chlor_a/period=before/part.parquet
+#
+# The cell rollups carry a `grid` column with one copy per heatmap pyramid level (grids.py).
+#
+# The CHL vs FLH match-up table (matchups.py) is kept the same way, one file per region and day:
+#
+#   lake/_matchups/region=falklands/date=2024-12-15/part.parquet
+import os
+import shutil
+from pathlib import Path
+import duckdb
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from config import lake_dir, default_region
+import rollups
+import matchups
+import regions
+import telemetry
+import version_marker
+
+PARTITION_COLUMNS = ["region", "product", "variable", "date"]
+
+# Columns stored inside each file (the partition columns live in the folder names)
+FILE_SCHEMA = pa.schema([
+    ("filename", pa.dictionary(pa.int8(), pa.string())),
+    ("period", pa.dictionary(pa.int8(), pa.string())),
+    ("latitude", pa.float32()),
+    ("longitude", pa.float32()),
+    ("value", pa.float32()),
+    ("units", pa.dictionary(pa.int8(), pa.string())),
+])
+
+
+def partition_path(region, product, variable, date, root=None):
+    return (Path(root or lake_dir) / f"region={region}" / f"product={product}" / f"variable={variable}"
+            / f"date={pd.Timestamp(date):%Y-%m-%d}")
+
+
+# Writes one granule/variable/region to its partition. The file name is derived from the granule,
+# so re-ingesting a granule replaces its file instead of duplicating rows.
+def write_partition(df, region, product, variable, date, filename, root=None):
+    folder = partition_path(region, product, variable, date, root)
+    folder.mkdir(parents=True, exist_ok=True)
+
+    frame = df[[c for c in FILE_SCHEMA.names]].copy()
+    frame["units"] = frame["units"].astype("string")
+    table = pa.Table.from_pandas(frame, schema=FILE_SCHEMA, preserve_index=False)
+
+    target = folder / f"part-{Path(filename).stem}.parquet"
+    tmp = target.with_suffix(".parquet.tmp")
+    pq.write_table(table, tmp, compression="zstd", use_dictionary=True)
+    os.replace(tmp, target)          # ATOMIC: READERS NEVER SEE A HALF-WRITTEN FILE
+    return target
+
+
+def rollup_path(kind, region, variable, key, value, root=None):
+    return Path(root or lake_dir) / "_rollups" / kind / f"region={region}" / f"variable={variable}" / f"{key}={value}" / "part.parquet"
+
+
+def _read_optional(path):
+    return pd.read_parquet(path) if path.exists() else None
+
+
+def _write_atomic(df, path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".parquet.tmp")
+    df.to_parquet(tmp, index=False, compression="zstd")
+    os.replace(tmp, path)
+
+
+# Recomputes the daily + daily-cell rollups of one (region, variable, date) from its partition(s)
+# and moves the day's contribution inside its before/after period sums
+def update_rollups(region, variable, date, root=None):
+    day = f"{pd.Timestamp(date):%Y-%m-%d}"
+    folders = Path(root or lake_dir).glob(f"region={region}/product=*/variable={variable}/date={day}")
+    rows = pd.concat([pq.read_table(folder, columns=["latitude", "longitude", "value"]).to_pandas() for folder in folders],
+                     ignore_index=True)
+
+    daily_file = rollup_path("daily", region, variable, "date", day, root)
+    cells_file = rollup_path("daily_cells", region, variable, "date", day, root)
+    period_file = rollup_path("period_cells", region, variable, "period", regions.period_of(date, region), root)
+
+    old_cells = _read_optional(cells_file)
+    new_cells = rollups.cell_rollup(rows)
+    period_cells = rollups.apply_cells(_read_optional(period_file), old_cells, -1)
+    period_cells = rollups.apply_cells(period_cells, new_cells, +1)
+
+    _write_atomic(rollups.daily_rollup(rows), daily_file)
+    _write_atomic(new_cells, cells_file)
+    _write_atomic(period_cells, period_file)
+
+
+def matchup_path(region, date, root=None):
+    return Path(root or lake_dir) / "_matchups" / f"region={region}" / f"date={pd.Timestamp(date):%Y-%m-%d}" / "part.parquet"
+
+
+# Recomputes the CHL/FLH match-ups of one (region, date) from that day's CHL and FLH partitions
+def update_matchups(region, date, root=None):
+    day = f"{pd.Timestamp(date):%Y-%m-%d}"
+    parts = []
+    for folder in Path(root or lake_dir).glob(f"region={region}/product=*/variable=*/date={day}"):
+        variable = folder.parent.name.split("=", 1)[1]
+        if variable in matchups.VARIABLES:
+            part = pq.read_table(folder, columns=["latitude", "longitude", "value"]).to_pandas()
+            parts.append(part.assign(variable=variable))
+    rows = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=["variable", "latitude", "longitude", "value"])
+
+    pairs = matchups.daily_matchups(rows, day)
+    path = matchup_path(region, day, root)
+    if pairs.empty:
+        path.unlink(missing_ok=True)             # E.G. ONLY ONE OF THE TWO PRODUCTS LEFT FOR THAT DAY
+    else:
+        _write_atomic(pairs, path)
+
+
+# Rebuilds the whole match-up table from the partitions (also builds it for lakes written before it existed)
+def rebuild_matchups(root=None):
+    root = Path(root or lake_dir)
+    shutil.rmtree(root / "_matchups", ignore_errors=True)
+    (root / "_matchups").mkdir(parents=True, exist_ok=True)
+    days = {(folder.parent.parent.parent.name.split("=", 1)[1], folder.name.split("=", 1)[1])
+            for folder in root.glob("region=*/product=*/variable=*/date=*")}
+    for region, day in sorted(days):
+        update_matchups(region, day, root)
+    print(f"✅ Rebuilt lake match-ups for {len(days)} region-days")
+
+
+# Rebuilds every rollup from the partitions (e.g. after changing a region's event date)
+def rebuild_rollups(root=None):
+    root = Path(root or lake_dir)
+    for path in (root / "_rollups").rglob("*.parquet"):
+        path.unlink()
+    days = {(folder.parent.parent.parent.name.split("=", 1)[1], folder.parent.name.split("=", 1)[1], folder.name.split("=", 1)[1])
+            for folder in root.glob("region=*/product=*/variable=*/date=*")}
+    for region, variable, day in sorted(days):
+        update_rollups(region, variable, day, root)
+    rebuild_matchups(root)
+    bump_version(root)
+    print(f"✅ Rebuilt lake rollups for {len(days)} region-variable-days")
+
+
+# Lakes written before regions existed (product=... at the top) belong to the default region:
+# moves them under region=<default_region>/ and rebuilds the rollups. Returns True if it moved anything.
+def migrate_layout(root=None):
+    root = Path(root or lake_dir)
+    legacy = list(root.glob("product=*"))
+    if not legacy:
+        return False
+    target = root / f"region={default_region}"
+    target.mkdir(parents=True, exist_ok=True)
+    for folder in legacy:
+        os.replace(folder, target / folder.name)
+    shutil.rmtree(root / "_rollups", ignore_errors=True)
+    print(f"🛠️ Moved {len(legacy)} lake product folders under region={default_region}/")
+    rebuild_rollups(root)
+    return True
+
+
+# Data version marker (version_marker.py): rewritten (atomically) after every change, read by the dashboard caches
+def version_path(root=None):
+    return version_marker.path(root or lake_dir)
+
+
+def bump_version(root=None):
+    version_marker.bump(root or lake_dir)
+
+
+def data_version(root=None):
+    return version_marker.read(root or lake_dir)
+
+
+# Ingest sink (same open/write/close interface as database.MetricsSink)
+class LakeSink:
+    name = "lake"
+
+    def __init__(self, root=None):
+        self.root = root or lake_dir
+        self.store = f"lake:{Path(self.root).resolve()}"    # WHERE THE ROWS END UP (granule_cache manifest)
+        self.files, self.rows = 0, 0
+
+    def open(self):
+        os.makedirs(self.root, exist_ok=True)
+        if not migrate_layout(self.root) and has_data(self.root) and not (Path(self.root) / "_matchups").exists():
+            rebuild_matchups(self.root)                      # LAKE WRITTEN BEFORE THE MATCH-UP TABLE EXISTED
+            bump_version(self.root)
+        return self
+
+    def write(self, df):
+        if df.empty:
+            return
+        groups = df.groupby(["region", "product", "variable", "date", "filename"], sort=False, observed=True)
+        for (region, product, variable, date, filename), part in groups:
+            with telemetry.stage("write_lake.parquet"):
+                write_partition(part, region, product, variable, date, filename, self.root)
+            with telemetry.stage("write_lake.rollups"):
+                update_rollups(region, variable, date, self.root)
+            if variable in matchups.VARIABLES:
+                with telemetry.stage("write_lake.matchups"):
+                    update_matchups(region, date, self.root)
+            bump_version(self.root)
+            self.files += 1
+            self.rows += len(part)
+
+    def close(self):
+        print(f"🗂️ {self.rows} rows written to {self.files} lake partitions under {self.root}")
+
+
+# SQL expression DuckDB scans (hive partition folders become region/product/variable/date columns)
+def scan_sql(root=None):
+    pattern = (Path(root or lake_dir) / "region=*" / "product=*" / "variable=*" / "date=*" / "*.parquet").as_posix()
+    return f"read_parquet('{pattern}', hive_partitioning = true, hive_types = {{'date': DATE}})"
+
+
+# Same for a rollup folder (kind = daily / daily_cells / period_cells)
+def rollup_scan_sql(kind, root=None):
+    pattern = (Path(root or lake_dir) / "_rollups" / kind / "*" / "*" / "*" / "*.parquet").as_posix()
+    types = "{'date': DATE}" if kind != "period_cells" else "{'period': VARCHAR}"
+    return f"read_parquet('{pattern}', hive_partitioning = true, hive_types = {types})"
+
+
+def matchup_scan_sql(root=None):
+    pattern = (Path(root or lake_dir) / "_matchups" / "*" / "*" / "*.parquet").as_posix()
+    return f"read_parquet('{pattern}', hive_partitioning = true, hive_types = {{'date': DATE}})"
+
+
+# Empty match-up table (no day with both products yet) so the scatter query still runs
+EMPTY_MATCHUPS_SQL = """
+CREATE TABLE satellite_matchups (region VARCHAR, date DATE, chl_variable VARCHAR, flh_variable VARCHAR,
+    cell_row INTEGER, cell_col INTEGER, latitude FLOAT, longitude FLOAT, chl FLOAT, flh FLOAT, distance FLOAT, sample FLOAT)
+"""
+
+
+ROLLUP_VIEWS = {"daily": "satellite_daily", "daily_cells": "satellite_daily_cells", "period_cells": "satellite_period_cells"}
+
+
+def has_data(root=None):
+    return any(Path(root or lake_dir).glob("region=*/product=*/variable=*/date=*/*.parquet"))
+
+
+# Opens a DuckDB connection with the lake (and its rollups) exposed as views named like the
+# MySQL tables, so the same SQL works against either store
+def connect(root=None):
+    con = duckdb.connect()
+    if has_data(root):
+        con.execute(f"CREATE VIEW satellite_metrics_simple AS SELECT * FROM {scan_sql(root)}")
+        for kind, view in ROLLUP_VIEWS.items():
+            if any((Path(root or lake_dir) / "_rollups" / kind).rglob("*.parquet")):
+                con.execute(f"CREATE VIEW {view} AS SELECT * FROM {rollup_scan_sql(kind, root)}")
+    if any((Path(root or lake_dir) / "_matchups").rglob("*.parquet")):
+        con.execute(f"CREATE VIEW satellite_matchups AS SELECT * FROM {matchup_scan_sql(root)}")
+    else:
+        con.execute(EMPTY_MATCHUPS_SQL)
+    return con
+
+
+# Reads rows from the lake. Filters on region/variable/product/date prune partitions before any file is opened;
+# `columns` limits which columns are decoded.
+def read(columns=None, variable=None, product=None, start=None, end=None, root=None, region=None):
+    if not has_data(root):
+        return pd.DataFrame(columns=columns or PARTITION_COLUMNS + FILE_SCHEMA.names)
+
+    where, params = [], []
+    if variable is not None:
+        variables = [variable] if isinstance(variable, str) else list(variable)
+        where.append(f"variable IN ({', '.join(['?'] * len(variables))})")
+        params += variables
+    if product is not None:
+        where.append("product = ?")
+        params.append(product)
+    if region is not None:
+        where.append("region = ?")
+        params.append(region)
+    if start is not None:
+        where.append("date >= ?")
+        params.append(pd.Timestamp(start).date())
+    if end is not None:
+        where.append("date <= ?")
+        params.append(pd.Timestamp(end).date())
+
+    select = ", ".join(columns) if columns else "*"
+    sql = f"SELECT {select} FROM {scan_sql(root)}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+
+    con = duckdb.connect()
+    try:
+        return con.execute(sql, params).df()
+    finally:
+        con.close()
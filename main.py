@@ -1,13 +1,229 @@
-from ingest import fetch_and_process  # Function to fetch data
-from database import insert_metrics  # Function to insert into DB
+import argparse
+import time
+from datetime import date, timedelta
+import pandas as pd
+from config import product_list, start_date, end_date, process_workers, download_workers, read_mode
+from config import since_last_overlap_days, backfill_window_days, daemon_interval_minutes
+from ingest import fetch_and_process, search_jobs, default_sinks, sink_stores  # Function to fetch data and stream it into the DB
+from granule_cache import GranuleCache, granule_id, remote_checksum
+from ingest_state import IngestState
+import telemetry
+import regions
+
+# ===============================
+# ✅ INGEST CLI
+# ===============================
+#
+#   python main.py                                        # config START_DATE..END_DATE (as before)
+#   python main.py ingest --since last --products CHL,FLH --workers 8
+#   python main.py backfill --start 2024-03-01 --end 2025-12-31
+#   python main.py daemon --every 360                     # poll for new granules every 6 hours
+#   python main.py status
+#
+# The date range is split into per-day tasks (one per product per day, covering every region), searched a window of
+# BACKFILL_WINDOW_DAYS at a time and fed to the download/process pools day by day, so every
+# worker always pulls the next granule and no worker is left with a long tail of days.
+# Each loaded granule and each completed day is checkpointed in STATE_FILE (ingest_state.py):
+# re-running the same command after a failure only does what is left.
+#
+# ===============================
+
+
+# "CHL,FLH" (or full product names) -> product names from config.product_list
+def resolve_products(value):
+    if not value:
+        return list(product_list)
+    products = []
+    for tag in value.split(","):
+        tag = tag.strip()
+        matches = [p for p in product_list if p == tag or p.upper().endswith("_" + tag.upper())]
+        if not matches:
+            raise SystemExit(f"❌ Unknown product {tag!r} (known: {', '.join(product_list)})")
+        products += matches
+    return products
+
+
+# Checkpoint keys: one per product and region, so registering a new region re-runs every day for it
+def task_keys(product):
+    return [f"{product}#{region}" for region in regions.names()]
+
+
+def granule_day(result):
+    return pd.Timestamp(granule_id(result).split(".")[1][:8]).strftime("%Y-%m-%d")
+
+
+# [start, end] split into windows of `days` days
+def windows(start, end, days=backfill_window_days):
+    start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+    while start <= end:
+        stop = min(start + timedelta(days=days - 1), end)
+        yield start, stop
+        start = stop + timedelta(days=1)
+
+
+# Loads every (product, day) task of [start, end] not already checkpointed; returns the run summary
+def run_range(start, end, products, workers=process_workers, download=download_workers, mode=read_mode,
+              redo=False, source=None, state=None, cache=None, sinks=None, command="ingest"):
+    state = state or IngestState()
+    cache = cache or GranuleCache()
+    sinks = default_sinks() if sinks is None else sinks
+    stores = sink_stores(sinks)
+    remaining = {}    # (product, day) -> granule IDs still to load
+    tasks = {}        # granule ID -> (product, day)
+    summary = {"command": command, "start": f"{pd.Timestamp(start):%Y-%m-%d}", "end": f"{pd.Timestamp(end):%Y-%m-%d}",
+               "products": products, "started": time.strftime("%Y-%m-%dT%H:%M:%S"), "granules": 0, "rows": 0}
+
+    # Lazily searches one window at a time and yields its granules ordered by day
+    def plan():
+        for window_start, window_end in windows(start, end):
+            jobs = search_jobs(source, products, f"{window_start:%Y-%m-%d}", f"{window_end:%Y-%m-%d}")
+            finished = set()
+            for product, result in sorted(jobs, key=lambda job: (granule_day(job[1]), job[0])):
+                day, gid = granule_day(result), granule_id(result)
+                if not redo and all(state.is_day_done(key, day) for key in task_keys(product)):
+                    continue
+                remaining.setdefault((product, day), set())
+                if not redo and cache.is_extracted(gid, stores, remote_checksum(result)):   # LOADED BY AN EARLIER RUN
+                    finished.add((product, day))
+                    continue
+                remaining[(product, day)].add(gid)
+                tasks[gid] = (product, day)
+                yield product, result
+            for product, day in finished:
+                if not remaining.get((product, day)):
+                    for key in task_keys(product):
+                        state.finish_day(key, day)
+
+    def checkpoint(file_path, df, ok):
+        product, day = tasks.get(file_path.name, (None, None))
+        if product is None:
+            return
+        keys = task_keys(product)
+        if not ok:
+            for key in keys:
+                state.mark_failed(key, day, [file_path.name])
+            return
+        for key in keys:
+            state.mark_granule(key, day, file_path.name, len(df))
+        remaining[(product, day)].discard(file_path.name)
+        if not remaining[(product, day)]:
+            for key in keys:
+                state.finish_day(key, day)
+            print(f"✅ Checkpoint: {product} {day} complete")
+        summary["granules"] += 1
+        summary["rows"] += len(df)
+
+    fetch_and_process(source, sinks, download_workers=download, process_workers=workers, read_mode=mode,
+                      cache=cache, jobs=plan(), on_granule=checkpoint, run=command, redo=redo)
+
+    # Granules that never came back (download/processing errors) - retried by the next run
+    for (product, day), gids in remaining.items():
+        if gids:
+            for key in task_keys(product):
+                state.mark_failed(key, day, sorted(gids))
+    summary["failed"] = sum(len(gids) for gids in remaining.values())
+    summary["stage_seconds"] = {name: round(s["seconds"], 3) for name, s in telemetry.current.summary()["stages"].items()}
+    summary["finished"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    state.record_run(summary)
+    print(f"📊 {summary['command']}: {summary['granules']} granules, {summary['rows']} rows, {summary['failed']} failed")
+    return summary
+
+
+# "--since last": the last day every product completed, minus a small overlap for late/reprocessed granules
+def since_last(state, products):
+    last = state.last_done_day([key for product in products for key in task_keys(product)])
+    if last is None:
+        return start_date
+    return f"{pd.Timestamp(last) - timedelta(days=since_last_overlap_days):%Y-%m-%d}"
+
+
+def cmd_ingest(args, command="ingest"):
+    state = IngestState()
+    products = resolve_products(args.products)
+    start = since_last(state, products) if args.since == "last" else (args.since or start_date)
+    end = args.until or (date.today().isoformat() if args.since == "last" else end_date)
+    print(f"🚀 Ingesting {', '.join(products)} from {start} to {end}")
+    return run_range(start, end, products, args.workers, args.download_workers, args.read_mode,
+                     redo=args.redo, state=state, command=command)
+
+
+def cmd_backfill(args):
+    products = resolve_products(args.products)
+    print(f"🚀 Backfilling {', '.join(products)} from {args.start} to {args.end}")
+    return run_range(args.start, args.end, products, args.workers, args.download_workers, args.read_mode,
+                     redo=args.redo, command="backfill")
+
+
+# Runs "ingest --since last" forever, every `every` minutes
+def cmd_daemon(args):
+    args.since, args.until, args.redo = "last", None, False
+    print(f"🛰️ Daemon started: checking for new granules every {args.every} minutes")
+    telemetry.serve()                              # PROMETHEUS_PORT: LAST RUN'S STAGE TIMINGS ON /metrics
+    while True:
+        try:
+            cmd_ingest(args, command="daemon")
+        except Exception as e:                     # KEEP POLLING - THE NEXT RUN RESUMES FROM THE CHECKPOINT
+            print(f"❌ Run failed: {e}")
+        print(f"😴 Next check in {args.every} minutes")
+        time.sleep(args.every * 60)
+
+
+def cmd_status(args):
+    state = IngestState()
+    for key in [key for product in resolve_products(args.products) for key in task_keys(product)]:
+        done = state.data["products"].get(key, {}).get("done_days", [])
+        span = f"{done[0]} .. {done[-1]}" if done else "-"
+        print(f"📅 {key}: {len(done)} days complete ({span})")
+    for product, days in state.failed().items():
+        print(f"⚠️ {product}: failed granules on {', '.join(sorted(days))}")
+    for run in state.data["runs"][-5:]:
+        print(f"🕒 {run['started']} {run['command']} {run['start']}..{run['end']}: "
+              f"{run['granules']} granules, {run['rows']} rows, {run.get('failed', '?')} failed")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="OceanX satellite ingest")
+    sub = parser.add_subparsers(dest="command")
+
+    def common(p):
+        p.add_argument("--products", help="comma separated, e.g. CHL,FLH (default: config.product_list)")
+        p.add_argument("--workers", type=int, default=process_workers, help="processing workers")
+        p.add_argument("--download-workers", type=int, default=download_workers)
+        p.add_argument("--read-mode", choices=["download", "remote"], default=read_mode)
+        p.add_argument("--redo", action="store_true", help="reload days/granules even if checkpointed")
+
+    ingest = sub.add_parser("ingest", help="load a date range (default: config START_DATE..END_DATE)")
+    common(ingest)
+    ingest.add_argument("--since", help="'last' (resume after the last completed day) or YYYY-MM-DD")
+    ingest.add_argument("--until", help="YYYY-MM-DD (default: today with --since last, else END_DATE)")
+
+    backfill = sub.add_parser("backfill", help="restartable load of a long date range")
+    common(backfill)
+    backfill.add_argument("--start", required=True)
+    backfill.add_argument("--end", required=True)
+
+    daemon = sub.add_parser("daemon", help="poll for new granules on a schedule")
+    common(daemon)
+    daemon.add_argument("--every", type=int, default=daemon_interval_minutes, help="minutes between checks")
+
+    status = sub.add_parser("status", help="show checkpointed days, failures and recent runs")
+    status.add_argument("--products")
+    return parser
+
 
 # Main script entry
 if __name__ == "__main__":
-    print("🚀 Starting satellite data pipeline...")
-    df = fetch_and_process()
-
-    if df.empty:
-        print("⚠️ No data extracted.")
-    else:
-        insert_metrics(df)
-        print("✅ Pipeline complete")
+    args = build_parser().parse_args()
+    if args.command is None:                       # PLAIN "python main.py": CONFIG WINDOW, AS BEFORE
+        args = build_parser().parse_args(["ingest"])
+
+    if args.command != "status":
+        print("🚀 Starting satellite data pipeline...")
+    commands = {"ingest": cmd_ingest, "backfill": cmd_backfill, "daemon": cmd_daemon, "status": cmd_status}
+    result = commands[args.command](args)
+
+    if args.command in ("ingest", "backfill"):
+        if result["rows"] == 0 and result["failed"] == 0:
+            print("⚠️ No data extracted.")
+        else:
+            print("✅ Pipeline complete")
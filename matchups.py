@@ -0,0 +1,93 @@
+# 📁 matchups.py
+# CHL vs FLH match-up table, maintained at ingest like the rollups: for every region and day, the CHL and
+# FLH values of the same native grid cell side by side, so the scatter plot reads a small prejoined table
+# instead of joining millions of pixels on every rerun.
+#
+#   (region, date, chl_variable, flh_variable, cell_row, cell_col) -> latitude, longitude, chl, flh, distance, sample
+#
+# Cells are keyed by their integer (row, col) on the native grid (grids.cell_index), not by float lat/lon,
+# so two products whose pixel centres differ by a rounding error still match. With MATCHUP_TOLERANCE_CELLS > 0
+# a CHL cell with no FLH value in the same cell takes the nearest FLH cell within that many cells
+# (`distance` = offset in cells, 0 for an exact match - readers can keep exact matches only).
+#
+# `sample` is a stable pseudo-random number in [0, 1) per cell and day: "ORDER BY sample LIMIT n" returns
+# the same evenly spread n points on every read (downsampling for the scatter plot).
+# database.py keeps the MySQL copy up to date, lake.py the Parquet one - both with daily_matchups() below.
+import numpy as np
+import pandas as pd
+from config import variable_list, grid_levels, native_grid, matchup_tolerance_cells
+import grids
+
+# Same rule as queries.variables_matching ('CHL' -> chlor_a, 'FLH' -> nflh/flh)
+CHL_VARIABLES = [v for v in variable_list if "chl" in v.lower()]
+FLH_VARIABLES = [v for v in variable_list if "flh" in v.lower()]
+VARIABLES = CHL_VARIABLES + FLH_VARIABLES
+
+KEYS = ["cell_row", "cell_col"]
+COLUMNS = ["chl_variable", "flh_variable", "cell_row", "cell_col", "latitude", "longitude", "chl", "flh", "distance", "sample"]
+
+
+# Mean value per native cell of one variable (several pixels in one cell when the grids differ slightly)
+def _cells(rows, variable, step):
+    part = rows[rows["variable"] == variable]
+    cell_row, cell_col = grids.cell_index(part["latitude"], part["longitude"], step)
+    cells = pd.DataFrame({"cell_row": cell_row, "cell_col": cell_col, "value": part["value"].to_numpy(dtype="float64")})
+    return cells.dropna().groupby(KEYS, as_index=False)["value"].mean()
+
+
+# (d_row, d_col) offsets within `tolerance` cells, nearest first
+def _offsets(tolerance):
+    offsets = [(dr, dc) for dr in range(-tolerance, tolerance + 1) for dc in range(-tolerance, tolerance + 1)]
+    return sorted(offsets, key=lambda o: (o[0] ** 2 + o[1] ** 2, o))
+
+
+# Pairs every CHL cell with the FLH value of the same cell or, failing that, of the nearest cell within `tolerance`
+def pair_cells(chl, flh, tolerance=0):
+    remaining = chl.rename(columns={"value": "chl"})
+    flh = flh.rename(columns={"value": "flh"})
+    matched = []
+    for dr, dc in _offsets(tolerance):
+        if remaining.empty:
+            break
+        shifted = flh.assign(cell_row=flh["cell_row"] - dr, cell_col=flh["cell_col"] - dc)    # FLH AT (r+dr, c+dc) -> KEY (r, c)
+        hit = remaining.merge(shifted, on=KEYS, how="left")
+        found = hit["flh"].notna()
+        matched.append(hit[found].assign(distance=np.float32(np.hypot(dr, dc))))
+        remaining = hit.loc[~found, KEYS + ["chl"]]
+    if not matched:
+        return pd.DataFrame(columns=KEYS + ["chl", "flh", "distance"])
+    return pd.concat(matched, ignore_index=True)
+
+
+# Stable pseudo-random [0, 1) per (day, cell): the downsampling order
+def sample_key(date, cell_row, cell_col):
+    day = np.int64(pd.Timestamp(date).normalize().value // 86_400_000_000_000)
+    key = ((day << 14 | np.asarray(cell_row, dtype="int64")) << 14) | np.asarray(cell_col, dtype="int64")
+    return (pd.util.hash_array(key.astype("uint64")) >> np.uint64(11)).astype("float64") / float(1 << 53)
+
+
+# Match-ups of one region and day from its pixel rows (variable, latitude, longitude, value)
+def daily_matchups(rows, date, tolerance=matchup_tolerance_cells):
+    step = grid_levels[native_grid]
+    present = set(rows["variable"].astype(str).unique()) if not rows.empty else set()
+    frames = []
+    for chl_variable in [v for v in CHL_VARIABLES if v in present]:
+        chl = _cells(rows, chl_variable, step)
+        for flh_variable in [v for v in FLH_VARIABLES if v in present]:
+            pairs = pair_cells(chl, _cells(rows, flh_variable, step), tolerance)
+            frames.append(pairs.assign(chl_variable=chl_variable, flh_variable=flh_variable))
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=COLUMNS)
+
+    df = pd.concat(frames, ignore_index=True)
+    df["cell_row"] = df["cell_row"].astype("int32")
+    df["cell_col"] = df["cell_col"].astype("int32")
+    latitude, longitude = grids.cell_centre(df["cell_row"], df["cell_col"], step)
+    df["latitude"] = latitude.astype("float32")
+    df["longitude"] = longitude.astype("float32")
+    df["chl"] = df["chl"].astype("float32")
+    df["flh"] = df["flh"].astype("float32")
+    df["distance"] = df["distance"].astype("float32")
+    df["sample"] = sample_key(date, df["cell_row"], df["cell_col"]).astype("float32")
+    return df[COLUMNS].sort_values(["chl_variable", "flh_variable"] + KEYS, ignore_index=True)
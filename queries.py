@@ -0,0 +1,220 @@
+# 📁 queries.py
+# Aggregate queries for the dashboard. Each function returns only what one chart/metric needs,
+# computed inside the store (MySQL or the DuckDB/Parquet lake, picked by DATA_SOURCE),
+# so the app never pulls raw pixels into pandas. Charts read the rollups maintained at
+# ingest (rollups.py, matchups.py) - only the raw export touches pixel rows.
+#
+# SQL is written once with %s placeholders and a table named satellite_metrics_simple;
+# lake.connect() exposes the Parquet lake under the same name.
+import threading
+from datetime import timedelta
+import pandas as pd
+from config import data_source, variable_list, native_grid, default_region, scatter_max_points, cube_reads
+import cube
+import lake
+import db_pool
+
+TABLE = "satellite_metrics_simple"
+DAILY_TABLE = "satellite_daily"
+DAILY_CELLS_TABLE = "satellite_daily_cells"
+PERIOD_CELLS_TABLE = "satellite_period_cells"
+MATCHUPS_TABLE = "satellite_matchups"
+DATA_VERSION_TABLE = "satellite_data_version"
+
+# One DuckDB connection per process with the lake views registered once; each query
+# runs on its own cursor (cursors are safe to use from different Streamlit threads)
+_lake_con = None
+_lake_lock = threading.Lock()
+
+
+def lake_cursor():
+    global _lake_con
+    with _lake_lock:
+        if _lake_con is None:
+            _lake_con = lake.connect()
+        return _lake_con.cursor()
+
+
+# Drops the persistent connection so the next query opens a new one that sees new views/partitions.
+# The old one is not closed: cursors other sessions already took keep working on it, and it is
+# garbage-collected once the last of them is done.
+def reset_connections():
+    global _lake_con
+    with _lake_lock:
+        _lake_con = None
+
+
+# Variables whose name contains the tag (same rule the renderers used: 'CHL' -> chlor_a, 'FLH' -> nflh/flh)
+def variables_matching(tag):
+    return [v for v in variable_list if tag.lower() in v.lower()]
+
+
+# Runs a query against the configured store and returns a DataFrame
+def run(sql, params=()):
+    if data_source == "lake":
+        cur = lake_cursor()
+        try:
+            return cur.execute(sql.replace("%s", "?"), list(params)).df()
+        finally:
+            cur.close()
+
+    return db_pool.read_df(sql, params)      # POOLED CONNECTION, RETRIED ON TRANSIENT ERRORS
+
+
+# Same as run(), but yields the result in DataFrames of `chunk_rows` rows (Arrow record batches on
+# the lake, a server-side cursor on MySQL) - for results too big to hold at once
+def run_chunks(sql, params=(), chunk_rows=50_000):
+    if data_source == "lake":
+        cur = lake_cursor()
+        try:
+            reader = cur.execute(sql.replace("%s", "?"), list(params)).to_arrow_reader(chunk_rows)
+            for batch in reader:
+                yield batch.to_pandas()
+        finally:
+            cur.close()
+        return
+
+    yield from db_pool.stream_df(sql, params, chunk_rows)
+
+
+# Builds "region = ... AND variable IN (...)" + optional [start, stop) date range; returns (sql, params)
+def where_clause(variables, start=None, stop=None, region=None):
+    where = ["region = %s", f"variable IN ({', '.join(['%s'] * len(variables))})"]
+    params = [region or default_region] + list(variables)
+    if start is not None:
+        where.append("date >= %s")
+        params.append(pd.Timestamp(start).date())
+    if stop is not None:
+        where.append("date < %s")
+        params.append(pd.Timestamp(stop).date())
+    return " AND ".join(where), params
+
+
+def _dates(df):
+    if "date" in df.columns:
+        df["date"] = pd.to_datetime(df["date"])
+    return df
+
+
+# Marker bumped by ingest on every change (None if the store has none yet); with CUBE_READS=true
+# paired with the cube store's own marker, so a cube written after (or without) the store counts too
+def data_version():
+    if cube_reads:
+        return f"{_store_version()}+cube:{cube.data_version()}"
+    return _store_version()
+
+
+def _store_version():
+    if data_source == "lake":
+        return lake.data_version()
+    try:
+        df = run(f"SELECT version FROM {DATA_VERSION_TABLE} WHERE id = 1")
+        return None if df.empty else int(df["version"].iloc[0])
+    except Exception:
+        return None
+
+
+def has_data():
+    try:
+        return not run(f"SELECT 1 AS found FROM {TABLE} LIMIT 1").empty
+    except Exception as e:
+        print(f"⚠️ Could not read {TABLE}: {e}")
+        return False
+
+
+# Distinct dates available for the variables (for the date slider)
+def available_dates(variables, region=None):
+    where, params = where_clause(variables, region=region)
+    df = _dates(run(f"SELECT DISTINCT date FROM {DAILY_TABLE} WHERE {where} ORDER BY date", params))
+    return list(df["date"])
+
+
+# One row per date: total, mean, count and max over the whole region
+def daily_totals(variables, start=None, stop=None, region=None):
+    where, params = where_clause(variables, start, stop, region)
+    return _dates(run(f"""
+    SELECT date, SUM(value_total) AS total, SUM(value_total) / SUM(value_count) AS mean,
+           SUM(value_count) AS n, MAX(value_max) AS max
+    FROM {DAILY_TABLE}
+    WHERE {where}
+    GROUP BY date
+    ORDER BY date
+    """, params))
+
+
+# Whole daily rollup of one region, sorted by variable and date (dataset.py keeps it in memory)
+def daily_rollup(region=None):
+    return _dates(run(f"""
+    SELECT variable, date, value_total, value_count, value_max
+    FROM {DAILY_TABLE}
+    WHERE region = %s
+    ORDER BY variable, date
+    """, [region or default_region]))
+
+
+# Every daily cell of one variable and grid level in one region, sorted by date (dataset.py)
+def daily_cell_rows(variable, grid=native_grid, region=None):
+    return _dates(run(f"""
+    SELECT date, latitude, longitude, value_sum, value_count
+    FROM {DAILY_CELLS_TABLE}
+    WHERE region = %s AND variable = %s AND grid = %s
+    ORDER BY date
+    """, [region or default_region, variable, grid]))
+
+
+# Average value per cell of one grid level (grids.py) over the whole 'before' or 'after' period
+# (the region's event date, tagged at ingest)
+def period_cell_means(variables, period, grid=native_grid, region=None):
+    where, params = where_clause(variables, region=region)
+    return run(f"""
+    SELECT latitude AS lat_bin, longitude AS lon_bin, SUM(value_sum) / SUM(value_count) AS avg_value
+    FROM {PERIOD_CELLS_TABLE}
+    WHERE {where} AND period = %s AND grid = %s
+    GROUP BY latitude, longitude
+    """, params + [period, grid])
+
+
+# Average value per cell of one grid level over [start, stop) - feeds the heatmaps
+def cell_means(variables, start=None, stop=None, grid=native_grid, region=None):
+    where, params = where_clause(variables, start, stop, region)
+    return run(f"""
+    SELECT latitude AS lat_bin, longitude AS lon_bin, SUM(value_sum) / SUM(value_count) AS avg_value
+    FROM {DAILY_CELLS_TABLE}
+    WHERE {where} AND grid = %s
+    GROUP BY latitude, longitude
+    """, params + [grid])
+
+
+# Average value per cell for a single day
+def day_cell_means(variables, date, grid=native_grid, region=None):
+    day = pd.Timestamp(date).normalize()
+    return cell_means(variables, day, day + timedelta(days=1), grid, region)
+
+
+# CHL vs FLH values of the same grid cell on the same day (for the scatter plot), read from the match-up
+# table built at ingest. At most `max_points` rows - always the same evenly spread subset (sample order);
+# max_distance=0 keeps exact-cell matches only (drops the nearest-neighbour ones, see MATCHUP_TOLERANCE_CELLS).
+def matchup(chl_variables, flh_variables, region=None, max_points=scatter_max_points, max_distance=None):
+    chl_where = ", ".join(["%s"] * len(chl_variables))
+    flh_where = ", ".join(["%s"] * len(flh_variables))
+    sql = f"""
+    SELECT chl AS value_chl, flh AS value_flh
+    FROM {MATCHUPS_TABLE}
+    WHERE region = %s AND chl_variable IN ({chl_where}) AND flh_variable IN ({flh_where})
+    """
+    params = [region or default_region] + list(chl_variables) + list(flh_variables)
+    if max_distance is not None:
+        sql += " AND distance <= %s"
+        params.append(max_distance)
+    return run(sql + " ORDER BY sample LIMIT %s", params + [int(max_points)])
+
+
+# Raw rows of a [start, stop) selection, streamed in chunks (export.py)
+def raw_row_chunks(variables=None, start=None, stop=None, region=None, chunk_rows=50_000):
+    where, params = where_clause(variables or variable_list, start, stop, region)
+    return run_chunks(f"""
+    SELECT region, product, date, period, variable, latitude, longitude, value
+    FROM {TABLE}
+    WHERE {where}
+    ORDER BY date, variable
+    """, params, chunk_rows)
@@ -0,0 +1,122 @@
+# 📁 raster.py
+# Server-side heatmap rendering. The gridded cell means of a view (aggregation.aggregate_for_heatmap)
+# are painted into one small PNG with NumPy + Pillow, and the map shows it as an image layer.
+# px.density_mapbox used to ship every (lat_bin, lon_bin, avg_value) point to the browser and let it
+# draw a kernel density. Now the payload is one image whose size is fixed by the region's bbox and
+# the grid level, however many pixels or days went into it.
+#
+#   image = rasterize(cells, "4km", regions.bbox_of(region))     # cached by aggregation.heatmap_image
+#   fig = figure(image, title="2024-12-20", colorbar_title="mg/m³")
+#
+# The image covers the bbox snapped to whole grid cells. Its rows are resampled to Web Mercator
+# spacing because the map stretches an image linearly in projected space, so cells land where they
+# belong at any latitude. Columns are upscaled (nearest) so the map does not blur one cell into the next.
+import base64
+import io
+import math
+import numpy as np
+import plotly.graph_objects as go
+from PIL import Image
+from config import grid_levels, native_grid
+
+COLORSCALE = [[0, "#B2EBF2"], [0.5, "#00bcd4"], [1, "#003366"]]    # SAME SCALE THE DENSITY MAPS USED
+MAX_WIDTH_PX = 640                                                   # CELLS ARE UPSCALED TO ABOUT THIS WIDTH
+OPACITY = 0.85
+
+
+# 256-entry RGB lookup table interpolated along a plotly-style colour scale
+def _lut(colorscale=COLORSCALE, n=256):
+    stops = np.array([s for s, _ in colorscale])
+    colours = np.array([[int(c[i:i + 2], 16) for i in (1, 3, 5)] for _, c in colorscale], dtype="float64")
+    x = np.linspace(0, 1, n)
+    return np.stack([np.interp(x, stops, colours[:, k]) for k in range(3)], axis=1).round().astype("uint8")
+
+
+LUT = _lut()
+
+
+def _mercator_y(lat):
+    return np.log(np.tan(np.pi / 4 + np.radians(lat) / 2))
+
+
+def _mercator_lat(y):
+    return np.degrees(2 * np.arctan(np.exp(y)) - np.pi / 2)
+
+
+# Renders per-cell means (lat_bin, lon_bin, avg_value on the `grid` level) over extent = (west, south, east, north).
+# Returns the PNG as a data URI + where it goes on the map + the value range of the colour bar (None if no cells).
+def rasterize(cells, grid=native_grid, extent=None):
+    if cells is None or cells.empty:
+        return None
+    step = grid_levels[grid]
+    lat_cells = np.floor(cells["lat_bin"].to_numpy(dtype="float64") / step).astype("int64")
+    lon_cells = np.floor(cells["lon_bin"].to_numpy(dtype="float64") / step).astype("int64")
+    if extent is None:
+        extent = (lon_cells.min() * step, lat_cells.min() * step, (lon_cells.max() + 1) * step, (lat_cells.max() + 1) * step)
+    west, south, east, north = extent
+
+    # Grid covering the extent, snapped to cell edges (row 0 = northernmost)
+    col0, col1 = math.floor(west / step), math.ceil(east / step)
+    row0, row1 = math.floor(south / step), math.ceil(north / step)
+    width, height = col1 - col0, row1 - row0
+    rows, cols = row1 - 1 - lat_cells, lon_cells - col0
+    inside = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+    if not inside.any():
+        return None
+    values = np.full((height, width), np.nan, dtype="float32")
+    values[rows[inside], cols[inside]] = cells["avg_value"].to_numpy(dtype="float32")[inside]
+
+    # Output pixels: nearest cell, rows evenly spaced in Web Mercator between the snapped edges
+    west, east, south, north = col0 * step, col1 * step, row0 * step, row1 * step
+    scale = max(1, MAX_WIDTH_PX // width)
+    out_w, out_h = width * scale, max(height, int(round(width * scale * (_mercator_y(north) - _mercator_y(south)) / np.radians(east - west))))
+    y = _mercator_y(north) - (np.arange(out_h) + 0.5) * (_mercator_y(north) - _mercator_y(south)) / out_h
+    src_rows = np.clip(np.floor((north - _mercator_lat(y)) / step).astype("int64"), 0, height - 1)
+    src_cols = np.arange(out_w) // scale
+    pixels = values[src_rows][:, src_cols]
+
+    # Colour: min..max of the view -> LUT; no data -> transparent
+    valid = ~np.isnan(pixels)
+    vmin, vmax = float(np.nanmin(values)), float(np.nanmax(values))
+    norm = (pixels - vmin) / (vmax - vmin) if vmax > vmin else np.full(pixels.shape, 0.5, dtype="float32")
+    index = np.clip(np.nan_to_num(norm, nan=0.0) * 255, 0, 255).round().astype("uint8")
+    rgba = np.zeros(pixels.shape + (4,), dtype="uint8")
+    rgba[..., :3] = LUT[index]
+    rgba[..., 3] = np.where(valid, int(OPACITY * 255), 0)
+
+    buffer = io.BytesIO()
+    Image.fromarray(rgba, "RGBA").save(buffer, format="PNG")
+    png = buffer.getvalue()
+    return {
+        "source": "data:image/png;base64," + base64.b64encode(png).decode("ascii"),
+        "coordinates": [[west, north], [east, north], [east, south], [west, south]],   # TOP-LEFT, CLOCKWISE
+        "extent": (west, south, east, north),
+        "center": {"lat": float(np.mean(cells["lat_bin"])), "lon": float(np.mean(cells["lon_bin"]))},
+        "vmin": vmin,
+        "vmax": vmax,
+        "cells": int(inside.sum()),
+        "png_bytes": len(png),
+    }
+
+
+# Map figure showing a rasterize() image; an invisible two-point trace carries the colour bar
+def figure(image, title="Heatmap", colorbar_title="", zoom=6, style="carto-darkmatter"):
+    west, south, east, north = image["extent"]
+    fig = go.Figure(go.Scattermapbox(
+        lat=[south, north],
+        lon=[west, east],
+        mode="markers",
+        hoverinfo="skip",
+        marker=dict(size=0, color=[image["vmin"], image["vmax"]], colorscale=COLORSCALE, showscale=True,
+                    colorbar=dict(title=colorbar_title)),
+    ))
+    fig.update_layout(
+        title=title,
+        mapbox=dict(
+            style=style,
+            zoom=zoom,
+            center=image["center"],
+            layers=[dict(sourcetype="image", source=image["source"], coordinates=image["coordinates"], below="traces")],
+        ),
+    )
+    return fig
@@ -0,0 +1,38 @@
+# 📁 regions.py
+# Region registry helpers (the registry itself is config.regions / REGIONS_FILE).
+# A region is a bbox plus the date of its event (e.g. an iron release): ingest extracts every
+# region from each granule in one pass, and rows/rollups/partitions carry the region name.
+import pandas as pd
+from config import regions as REGIONS, default_region
+
+
+def names():
+    return list(REGIONS)
+
+
+# Registry entry of a region (rows of a region since removed from the registry fall back to the default's)
+def get(name=None):
+    return REGIONS.get(name or default_region, REGIONS[default_region])
+
+
+def bbox_of(name=None):
+    return tuple(get(name)["bbox"])
+
+
+def event_date(name=None):
+    return get(name)["event_date"]
+
+
+def label(name=None):
+    return get(name).get("label", name or default_region)
+
+
+# 'before' / 'after' the region's event (the single definition used by ingest and the rollups)
+def period_of(date, name=None):
+    return "before" if pd.Timestamp(date) < pd.Timestamp(event_date(name)) else "after"
+
+
+# Smallest bbox covering every region - what the granule search asks for
+def union_bbox(region_names=None):
+    boxes = [bbox_of(n) for n in (region_names or names())]
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes))
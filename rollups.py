@@ -0,0 +1,62 @@
+# 📁 rollups.py
+# Materialized aggregates maintained at ingest time, so the dashboard reads a few thousand
+# rows instead of every pixel:
+#
+#   daily         one row per (region, variable, date): region total / mean / count / max
+#   daily_cells   per (region, variable, date, grid, latitude, longitude): sum + count  -> per-day gridded means
+#   period_cells  per (region, variable, period, grid, latitude, longitude): sum + count -> before/after means
+#
+# (region = regions.py registry name; 'before'/'after' is relative to that region's event date)
+#
+# The cell rollups hold one copy per level of the heatmap pyramid (grids.py / config.grid_levels):
+# `grid` names the level and latitude/longitude are that level's cell centres.
+#
+# Sums and counts (not means) are stored so a re-ingested day can be subtracted and re-added
+# without rescanning the other days. database.py keeps the MySQL copies up to date with SQL;
+# the pandas helpers below do the same for the Parquet lake.
+import pandas as pd
+import grids
+
+CELL_KEYS = ["grid", "latitude", "longitude"]
+
+
+# Region-wide stats for one day of one variable
+def daily_rollup(df):
+    values = df["value"].astype("float64")
+    return pd.DataFrame({
+        "value_total": [values.sum()],
+        "value_mean": [values.mean()],
+        "value_count": [int(values.count())],
+        "value_max": [values.max()],
+    })
+
+
+# Sum + count per cell for one day of one variable, for every pyramid level
+def cell_rollup(df):
+    levels = []
+    for grid, step in grids.LEVELS:
+        binned = pd.DataFrame({
+            "latitude": grids.bin_coord(df["latitude"], step).astype("float32"),
+            "longitude": grids.bin_coord(df["longitude"], step).astype("float32"),
+            "value": df["value"].to_numpy(dtype="float64"),
+        })
+        cells = binned.groupby(["latitude", "longitude"])["value"].agg(value_sum="sum", value_count="count").reset_index()
+        cells.insert(0, "grid", grid)
+        levels.append(cells)
+    cells = pd.concat(levels, ignore_index=True)
+    cells["value_count"] = cells["value_count"].astype("int64")
+    return cells
+
+
+# Adds (sign=+1) or removes (sign=-1) one day's cells from a period's running sums
+def apply_cells(period_cells, cells, sign=1):
+    if cells is None or cells.empty:
+        return period_cells
+    delta = cells[CELL_KEYS + ["value_sum", "value_count"]].copy()
+    delta[["value_sum", "value_count"]] *= sign
+    if period_cells is None or period_cells.empty:
+        merged = delta
+    else:
+        merged = pd.concat([period_cells[CELL_KEYS + ["value_sum", "value_count"]], delta], ignore_index=True)
+        merged = merged.groupby(CELL_KEYS, as_index=False)[["value_sum", "value_count"]].sum()
+    return merged[merged["value_count"] > 0].reset_index(drop=True)
@@ -0,0 +1,19 @@
+# 📁 row_schema.py
+# The pixel rows the pipeline produces: columns (and Arrow types) every ingest sink receives, in this order.
+# Kept apart from ingest.py so the dashboard (export.py) can share it without importing xarray/earthaccess.
+import pyarrow as pa
+
+OUTPUT_COLUMNS = ["region", "product", "filename", "date", "period", "variable", "latitude", "longitude", "value", "units"]
+
+PARQUET_SCHEMA = pa.schema([
+    ("region", pa.string()),
+    ("product", pa.string()),
+    ("filename", pa.string()),
+    ("date", pa.date32()),
+    ("period", pa.string()),
+    ("variable", pa.string()),
+    ("latitude", pa.float32()),
+    ("longitude", pa.float32()),
+    ("value", pa.float32()),
+    ("units", pa.string()),
+])
@@ -0,0 +1,291 @@
+# 📁 telemetry.py
+# Structured instrumentation for the pipeline and the dashboard: how long each stage takes,
+# how many rows/bytes went through it and how much memory it needed.
+#
+#   with telemetry.stage("download"):          # time a block (accumulated per stage name)
+#       ...
+#   telemetry.count("rows", len(df))           # counters
+#   @telemetry.timed("render_chl")              # time every call of a function (one JSONL line each)
+#   telemetry.finish_granule(gid, rows=...)     # one JSONL record per granule (bytes, rows, seconds, worker RSS)
+#   telemetry.report()                          # end-of-run table + JSONL summary + Prometheus file
+#
+# Exports:
+#   TELEMETRY_FILE   JSON lines (granule records, timed calls, run summaries)  - "" = off (default: unbounded, opt in)
+#   PROMETHEUS_FILE  Prometheus text format, rewritten by report() (node_exporter textfile collector) - "" = off
+#   PROMETHEUS_PORT  serves the same text on http://host:PORT/metrics (see serve())                    - 0 = off
+#
+# Stages run inside worker processes (decode/subset/concat) are timed into a plain dict there and
+# merged into the parent's recorder (see ingest.process_granule_timed).
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pandas as pd
+from config import telemetry_file, prometheus_file, prometheus_port
+
+try:
+    import resource    # Unix only
+except ImportError:
+    resource = None
+
+
+# Highest resident set size of this process so far, in bytes (None where unknown)
+def peak_rss():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024     # LINUX REPORTS KB, MACOS BYTES
+
+
+# Current resident set size in bytes (Linux /proc, None elsewhere)
+def current_rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+# Times a block into a plain dict (stage -> seconds): usable in worker processes, no lock, no export
+@contextmanager
+def timed_into(timings, name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - started
+
+
+class Recorder:
+    def __init__(self, run="run", path=telemetry_file):
+        self.run = run
+        self.path = path
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.stages = {}      # name -> {"calls", "seconds", "max"}
+        self.counters = {}    # name -> number
+        self.pending = {}     # granule ID -> fields collected so far
+        self.granules = []    # finished per-granule records
+
+    def add(self, name, seconds, calls=1):
+        with self.lock:
+            stats = self.stages.setdefault(name, {"calls": 0, "seconds": 0.0, "max": 0.0})
+            stats["calls"] += calls
+            stats["seconds"] += seconds
+            stats["max"] = max(stats["max"], seconds / max(calls, 1))
+
+    @contextmanager
+    def stage(self, name, log=False):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            self.add(name, seconds)
+            if log:
+                self.write({"kind": "call", "name": name, "seconds": round(seconds, 6), "rss_bytes": current_rss()})
+
+    # Runs fn(*args) as one call of stage `name` (handy for pool.submit)
+    def call(self, name, fn, *args, **kwargs):
+        with self.stage(name):
+            return fn(*args, **kwargs)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    # Stage timings measured elsewhere (a worker process): {stage: seconds}
+    def merge(self, timings):
+        for name, seconds in (timings or {}).items():
+            self.add(name, seconds)
+
+    # ---------- per-granule records ----------
+
+    def note_granule(self, gid, **fields):
+        with self.lock:
+            record = self.pending.setdefault(gid, {"granule": gid, "stages": {}})
+            record["stages"].update(fields.pop("stages", {}) or {})
+            record.update(fields)
+
+    def finish_granule(self, gid, **fields):
+        self.note_granule(gid, **fields)
+        with self.lock:
+            record = self.pending.pop(gid)
+        record["seconds"] = round(sum(record["stages"].values()), 6)
+        record["stages"] = {k: round(v, 6) for k, v in record["stages"].items()}
+        with self.lock:
+            self.granules.append(record)
+        self.write({"kind": "granule", **record})
+        return record
+
+    # Granule that will not be processed (e.g. skipped resolution): no record
+    def drop_granule(self, gid):
+        with self.lock:
+            self.pending.pop(gid, None)
+
+    # ---------- export ----------
+
+    def write(self, event):
+        if not self.path:
+            return
+        line = json.dumps({"ts": time.strftime("%Y-%m-%dT%H:%M:%S"), "run": self.run, **event}, default=str)
+        with self.lock:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+
+    def summary(self):
+        with self.lock:
+            stages = {name: dict(stats) for name, stats in self.stages.items()}
+            counters = dict(self.counters)
+            granules = list(self.granules)
+        return {
+            "kind": "summary",
+            "wall_seconds": round(time.time() - self.started, 3),
+            "stages": stages,
+            "counters": counters,
+            "granules": len(granules),
+            "peak_rss_bytes": peak_rss(),
+            "worker_rss_bytes": max((g.get("worker_rss") or 0 for g in granules), default=None),   # LARGEST WORKER RSS AFTER A GRANULE
+        }
+
+    # Stage table, slowest first ("share" = part of the summed top-level stage time; "a.b" names are
+    # sub-stages of "a", e.g. write_mysql.insert, and are left out of that sum)
+    def table(self):
+        with self.lock:
+            rows = [{"stage": name, "calls": s["calls"], "seconds": s["seconds"],
+                     "avg_ms": 1000 * s["seconds"] / max(s["calls"], 1), "max_ms": 1000 * s["max"]}
+                    for name, s in self.stages.items()]
+        df = pd.DataFrame(rows, columns=["stage", "calls", "seconds", "avg_ms", "max_ms"])
+        total = df.loc[~df["stage"].str.contains(".", regex=False), "seconds"].sum()
+        df["share"] = (100 * df["seconds"] / total).round(1).astype(str) + "%" if total else "-"
+        return df.sort_values("seconds", ascending=False).round(3)
+
+    def prometheus(self):
+        lines = [
+            "# HELP oceanx_stage_seconds_total Time spent per pipeline/dashboard stage",
+            "# TYPE oceanx_stage_seconds_total counter",
+        ]
+        with self.lock:
+            stages = {name: dict(stats) for name, stats in self.stages.items()}
+            counters = dict(self.counters)
+        for name, s in sorted(stages.items()):
+            lines.append(f'oceanx_stage_seconds_total{{run="{self.run}",stage="{name}"}} {s["seconds"]:.6f}')
+        lines += ["# HELP oceanx_stage_calls_total Calls per pipeline/dashboard stage", "# TYPE oceanx_stage_calls_total counter"]
+        for name, s in sorted(stages.items()):
+            lines.append(f'oceanx_stage_calls_total{{run="{self.run}",stage="{name}"}} {s["calls"]}')
+        lines += ["# HELP oceanx_count_total Pipeline counters (rows, bytes, granules, ...)", "# TYPE oceanx_count_total counter"]
+        for name, n in sorted(counters.items()):
+            lines.append(f'oceanx_count_total{{run="{self.run}",name="{name}"}} {n}')
+        rss = peak_rss()
+        if rss is not None:
+            lines += ["# HELP oceanx_peak_rss_bytes Peak resident memory of this process", "# TYPE oceanx_peak_rss_bytes gauge",
+                      f'oceanx_peak_rss_bytes{{run="{self.run}"}} {rss}']
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path=prometheus_file):
+        if not path:
+            return
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(self.prometheus())
+        os.replace(tmp, path)          # ATOMIC: THE COLLECTOR NEVER READS HALF A FILE
+
+
+# ---------- module-level recorder (the current run) ----------
+
+current = Recorder("app")
+
+
+# Starts a fresh recorder for a pipeline run (the previous one stays readable until then)
+def new_run(run):
+    global current
+    current = Recorder(run)
+    return current
+
+
+def stage(name, log=False):
+    return current.stage(name, log)
+
+
+def count(name, n=1):
+    current.count(name, n)
+
+
+def note_granule(gid, **fields):
+    current.note_granule(gid, **fields)
+
+
+def finish_granule(gid, **fields):
+    return current.finish_granule(gid, **fields)
+
+
+def drop_granule(gid):
+    current.drop_granule(gid)
+
+
+# Decorator: times every call of the function as stage `name` and logs it to TELEMETRY_FILE
+def timed(name):
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with current.stage(name, log=True):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# End of run: prints the stage table and exports the summary (JSONL + Prometheus file)
+def report(recorder=None):
+    recorder = recorder or current
+    summary = recorder.summary()
+    print(f"\n⏱️ Stage timings ({recorder.run}, {summary['wall_seconds']:.1f} s wall, {summary['granules']} granules):")
+    table = recorder.table()
+    print(table.to_string(index=False) if not table.empty else "(no stages recorded)")
+    for name, n in sorted(summary["counters"].items()):
+        print(f"🔢 {name}: {n}")
+    if summary["peak_rss_bytes"]:
+        print(f"🧠 Peak RSS: {summary['peak_rss_bytes'] / 1e6:.0f} MB (largest worker RSS after a granule: {(summary['worker_rss_bytes'] or 0) / 1e6:.0f} MB)")
+    recorder.write(summary)
+    recorder.write_prometheus()
+    return summary
+
+
+# ---------- Prometheus endpoint ----------
+
+_server = None
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        body = current.prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):      # NO ACCESS LOG ON STDOUT
+        pass
+
+
+# Serves the current recorder on http://0.0.0.0:port/metrics from a daemon thread (once per process)
+def serve(port=prometheus_port):
+    global _server
+    if not port or _server is not None:
+        return _server
+    try:
+        _server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    except OSError as e:               # E.G. ANOTHER STREAMLIT SESSION/PROCESS ALREADY SERVES IT
+        print(f"⚠️ Prometheus endpoint not started on port {port}: {e}")
+        return None
+    threading.Thread(target=_server.serve_forever, daemon=True).start()
+    print(f"📡 Prometheus metrics on http://0.0.0.0:{port}/metrics")
+    return _server
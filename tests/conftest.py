@@ -0,0 +1,108 @@
+# 📁 tests/conftest.py
+# Offline test setup: synthetic granules (fixtures.make_granules) are ingested through the real pipeline
+# (main.run_range with fixtures.LocalGranuleSource) into a Parquet lake + cube store in a temp folder.
+# No NASA credentials, network or MySQL server needed.
+#
+# config.py reads the environment once, at import - so it is set here, before any project module is imported.
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+SCRATCH = Path(tempfile.mkdtemp(prefix="oceanx-tests-"))
+os.environ.update({
+    "DATA_SOURCE": "lake",
+    "CUBE_READS": "false",
+    "INGEST_SINKS": "lake,cube",
+    "LAKE_DIR": str(SCRATCH / "lake"),
+    "CUBE_DIR": str(SCRATCH / "cube"),
+    "EXPORT_DIR": str(SCRATCH / "exports"),
+    "DOWNLOAD_DIR": str(SCRATCH / "downloads"),
+    "STATE_FILE": str(SCRATCH / "ingest_state.json"),
+    "REGIONS_FILE": str(SCRATCH / "regions.json"),      # NO FILE: JUST THE DEFAULT REGION (FALKLANDS)
+    "OUTPUT_FILE": "",
+    "TELEMETRY_FILE": "",
+    "PROMETHEUS_FILE": "",
+    "PROMETHEUS_PORT": "0",
+})
+
+import pytest
+import aggregation
+import cube
+import dataset
+import export
+import fixtures
+import lake
+import main
+import queries
+from config import default_region
+from granule_cache import GranuleCache
+from ingest_state import IngestState
+
+START, END = "2024-12-26", "2024-12-30"      # BOTH SIDES OF THE FALKLANDS EVENT DATE (2024-12-28)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(SCRATCH, ignore_errors=True)
+
+
+# One granule per product per day, written once per session
+@pytest.fixture(scope="session")
+def granule_dir(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("granules")
+    fixtures.make_granules(directory, START, END)
+    return directory
+
+
+# ingest(root, start, end, redo=False): runs the ingest CLI's run_range into root/lake + root/cube
+# (state and granule cache under root too); returns the run summary
+@pytest.fixture(scope="session")
+def ingest(granule_dir):
+    def run(root, start=START, end=END, redo=False):
+        root = Path(root)
+        return main.run_range(start, end, main.resolve_products(None), workers=1, download=1, redo=redo,
+                              source=fixtures.LocalGranuleSource(granule_dir), state=IngestState(root / "state.json"),
+                              cache=GranuleCache(root / "downloads"), sinks=[lake.LakeSink(root / "lake"), cube.CubeSink(root / "cube")])
+    return run
+
+
+# A store with every fixture day ingested once - shared, tests must not write to it
+@pytest.fixture(scope="session")
+def store(ingest, tmp_path_factory):
+    root = tmp_path_factory.mktemp("store")
+    summary = ingest(root)
+    assert summary["granules"] == 10 and summary["failed"] == 0
+    return root
+
+
+# raw_rows(root, **lake.read filters): raw pixel rows of a store's lake (default region)
+@pytest.fixture(scope="session")
+def raw_rows():
+    def read(root, **filters):
+        return lake.read(root=Path(root) / "lake", region=default_region, **filters)
+    return read
+
+
+# point_dashboard_at(root): points the dashboard modules (queries, the dataset snapshot, the aggregation
+# cache) at root's lake/cube and exports at a temp folder; undone when the test ends
+@pytest.fixture
+def point_dashboard_at(monkeypatch, tmp_path):
+    def point(root):
+        root = Path(root)
+        monkeypatch.setattr(lake, "lake_dir", str(root / "lake"))
+        monkeypatch.setattr(cube, "cube_dir", str(root / "cube"))
+        monkeypatch.setattr(queries, "data_source", "lake")
+        monkeypatch.setattr(export, "export_dir", str(tmp_path / "exports"))
+        monkeypatch.setattr(dataset, "refresher", dataset.Refresher(poll=0))
+        queries.reset_connections()
+        aggregation.cache.clear()
+    yield point
+    queries.reset_connections()
+    aggregation.cache.clear()
+
+
+# The dashboard on the shared store
+@pytest.fixture
+def dashboard(store, point_dashboard_at):
+    point_dashboard_at(store)
+    return store
@@ -0,0 +1,89 @@
+# 📁 tests/test_cube.py
+# Cube store: the same aggregates as the lake rollups, before and after a compaction
+import numpy as np
+import pandas as pd
+import pytest
+import cube
+import dataset
+import fixtures
+import lake
+import regions
+from config import default_region, grid_levels
+
+VARIABLES = [variable for _, variable, _, _ in fixtures.PRODUCTS.values()]     # chlor_a, nflh
+
+
+def lake_rollup(root, sql, params=()):
+    con = lake.connect(root / "lake")
+    try:
+        return con.execute(sql, list(params)).df()
+    finally:
+        con.close()
+
+
+def assert_same_daily(cube_daily, lake_daily):
+    assert list(pd.to_datetime(cube_daily["date"])) == list(pd.to_datetime(lake_daily["date"]))
+    np.testing.assert_allclose(cube_daily["value_total"], lake_daily["value_total"], rtol=1e-6)
+    np.testing.assert_array_equal(cube_daily["value_count"], lake_daily["value_count"])
+    np.testing.assert_allclose(cube_daily["value_max"], lake_daily["value_max"])
+
+
+@pytest.mark.parametrize("variable", VARIABLES)
+def test_daily_stats_match_lake_rollup(store, variable):
+    daily = lake_rollup(store, "SELECT date, value_total, value_count, value_max FROM satellite_daily "
+                               "WHERE region = ? AND variable = ? ORDER BY date", [default_region, variable])
+    assert_same_daily(cube.Cube(default_region, variable, store / "cube").daily_stats(), daily)
+
+
+@pytest.mark.parametrize("grid", list(grid_levels))
+def test_cell_sums_match_lake_rollup(store, grid):
+    split = pd.Timestamp(regions.event_date())
+    c = cube.Cube(default_region, "chlor_a", store / "cube")
+    cells = lake_rollup(store, "SELECT latitude, longitude, value_sum, value_count FROM satellite_period_cells "
+                               "WHERE region = ? AND variable = 'chlor_a' AND period = 'before' AND grid = ?", [default_region, grid])
+    merged = c.cell_sums(None, split, grid).merge(cells.astype({"latitude": "float32", "longitude": "float32"}),
+                                                 on=["latitude", "longitude"], how="outer", indicator=True)
+
+    assert len(merged) > 0 and (merged["_merge"] == "both").all()
+    np.testing.assert_allclose(merged["value_sum_x"], merged["value_sum_y"], rtol=1e-5)
+    np.testing.assert_array_equal(merged["value_count_x"], merged["value_count_y"])
+
+
+# What the dashboard draws from one snapshot: daily totals, before/after stats, period cell means per grid level
+def snapshot_answers(snapshot, split):
+    cells = {grid: snapshot.cell_means(["chlor_a"], split, None, grid).sort_values(["lat_bin", "lon_bin"], ignore_index=True)
+             for grid in grid_levels}
+    return snapshot.daily_totals(["chlor_a"]), snapshot.period_stats(["chlor_a"], split), cells
+
+
+# The dashboard's snapshot gives the same answers whether it reads the cubes or the lake rollups
+def test_dataset_cube_reads_match_lake_reads(dashboard, monkeypatch):
+    split = pd.Timestamp(regions.event_date())
+    from_lake = dataset.Dataset("lake")
+    assert from_lake.cube_of("chlor_a") is None
+    lake_totals, lake_stats, lake_cells = snapshot_answers(from_lake, split)
+
+    monkeypatch.setattr(dataset, "cube_reads", True)
+    from_cube = dataset.Dataset("cube")
+    assert from_cube.cube_of("chlor_a") is not None
+    cube_totals, cube_stats, cube_cells = snapshot_answers(from_cube, split)
+
+    pd.testing.assert_frame_equal(cube_totals, lake_totals, rtol=1e-6)
+    for period in ["before", "after", "all"]:
+        assert cube_stats[period]["n"] == lake_stats[period]["n"]
+        assert cube_stats[period]["total"] == pytest.approx(lake_stats[period]["total"], rel=1e-6)
+        assert cube_stats[period]["max"] == pytest.approx(lake_stats[period]["max"])
+    for grid in grid_levels:
+        pd.testing.assert_frame_equal(cube_cells[grid], lake_cells[grid], rtol=1e-5)
+
+
+def test_reingest_compacts_dead_slots(ingest, tmp_path):
+    ingest(tmp_path)
+    before = cube.Cube(default_region, "chlor_a", tmp_path / "cube").daily_stats()
+
+    ingest(tmp_path, redo=True)                                # EVERY DAY WRITTEN AGAIN: AS MANY DEAD SLOTS AS LIVE ONES
+    c = cube.Cube(default_region, "chlor_a", tmp_path / "cube")
+
+    assert c.index["generation"] == 1 and c.dead_slots() == 0
+    assert c.index["slots"] == len(c.dates()) == len(before)
+    pd.testing.assert_frame_equal(c.daily_stats(), before)
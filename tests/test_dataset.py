@@ -0,0 +1,53 @@
+# 📁 tests/test_dataset.py
+# The dashboard's shared snapshot: swapped (not mutated) when ingest bumps the data version, and the
+# aggregation cache that sits on top of it
+import pandas as pd
+import aggregation
+import dataset
+import lake
+
+
+def test_refresher_swaps_in_a_new_snapshot(ingest, point_dashboard_at, tmp_path):
+    ingest(tmp_path, "2024-12-26", "2024-12-27")
+    point_dashboard_at(tmp_path)
+    refresher = dataset.refresher
+
+    assert refresher.check() is True
+    first = refresher.current
+    assert first.version == lake.data_version(tmp_path / "lake")
+    assert len(first.available_dates(["chlor_a"])) == 2
+    assert refresher.check() is False                         # SAME VERSION: THE SNAPSHOT STAYS
+    assert refresher.current is first
+
+    ingest(tmp_path, "2024-12-28", "2024-12-30")
+    assert refresher.check() is True
+    assert refresher.current is not first
+    assert refresher.current.version != first.version
+    assert len(refresher.current.available_dates(["chlor_a"])) == 5
+    assert len(first.available_dates(["chlor_a"])) == 2       # SESSIONS STILL ON THE OLD SNAPSHOT SEE THE OLD DATA
+
+
+def test_aggregation_cache_hits_until_the_version_changes(ingest, point_dashboard_at, tmp_path):
+    ingest(tmp_path, "2024-12-26", "2024-12-27")
+    point_dashboard_at(tmp_path)
+    cache = aggregation.cache
+
+    totals = aggregation.daily_totals(["chlor_a"])
+    hits = cache.hits
+    assert aggregation.daily_totals(["chlor_a"]) is totals
+    assert cache.hits == hits + 1
+
+    ingest(tmp_path, "2024-12-28", "2024-12-28")
+    fresh = aggregation.daily_totals(["chlor_a"])
+    assert fresh is not totals
+    assert list(fresh["date"]) == list(pd.date_range("2024-12-26", "2024-12-28"))
+
+
+def test_heatmap_image_covers_the_cells(dashboard):
+    cells = aggregation.aggregate_for_heatmap(["chlor_a"], period="before", resolution="9km")
+    image = aggregation.heatmap_image(["chlor_a"], period="before", resolution="9km")
+
+    assert not cells.empty
+    assert image["cells"] == len(cells)
+    assert image["vmin"] <= cells["avg_value"].min() and image["vmax"] >= cells["avg_value"].max()
+    assert image["source"].startswith("data:image/png;base64,")
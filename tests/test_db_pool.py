@@ -0,0 +1,50 @@
+# 📁 tests/test_db_pool.py
+# Retry policy of the MySQL layer: transient errors are retried with a fresh connection, others raise at once.
+# (The pool itself, the migrations and MetricsSink need a MySQL server and are not covered here.)
+import pymysql
+import pytest
+import db_pool
+
+LOST_CONNECTION = pymysql.err.OperationalError(2013, "Lost connection to MySQL server during query")
+SYNTAX_ERROR = pymysql.err.ProgrammingError(1064, "You have an error in your SQL syntax")
+
+
+def flaky(errors, result="ok"):
+    errors = list(errors)
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if errors:
+            raise errors.pop(0)
+        return result
+    return fn, calls
+
+
+def test_transient_errors_are_retried():
+    fn, calls = flaky([LOST_CONNECTION, pymysql.err.OperationalError(1213, "Deadlock found")])
+    retried = []
+    assert db_pool.retry(fn, attempts=3, backoff=0, on_retry=retried.append) == "ok"
+    assert len(calls) == 3 and len(retried) == 2
+
+
+def test_other_errors_raise_at_once():
+    fn, calls = flaky([SYNTAX_ERROR])
+    with pytest.raises(pymysql.err.ProgrammingError):
+        db_pool.retry(fn, attempts=3, backoff=0)
+    assert len(calls) == 1
+
+
+def test_gives_up_after_the_last_attempt():
+    fn, calls = flaky([LOST_CONNECTION] * 3)
+    with pytest.raises(pymysql.err.OperationalError):
+        db_pool.retry(fn, attempts=3, backoff=0)
+    assert len(calls) == 3
+
+
+def test_transient_error_codes():
+    assert db_pool.is_transient(LOST_CONNECTION)
+    assert db_pool.is_transient(pymysql.err.InterfaceError(0, ""))
+    assert not db_pool.is_transient(SYNTAX_ERROR)
+    assert not db_pool.is_transient(pymysql.err.OperationalError(1045, "Access denied"))
+    assert not db_pool.is_transient(ValueError("not a database error"))
@@ -0,0 +1,40 @@
+# 📁 tests/test_export.py
+# Raw exports: every selected pixel row ends up in the file, in each format; a second request reuses the file
+import h5netcdf
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+import export
+
+START, END = "2024-12-27", "2024-12-29"
+
+
+def exported_rows(fmt, path):
+    if fmt == "csv":
+        return len(pd.read_csv(path))
+    if fmt == "parquet":
+        return pq.read_metadata(path).num_rows
+    with h5netcdf.File(path, "r") as f:
+        return f.dimensions["obs"].size
+
+
+@pytest.mark.parametrize("fmt", list(export.FORMATS))
+@pytest.mark.parametrize("variables", [["chlor_a"], ["chlor_a", "nflh"]])
+def test_export_row_count(dashboard, raw_rows, fmt, variables):
+    expected = len(raw_rows(dashboard, variable=variables, start=START, end=END))     # END IS INCLUSIVE IN BOTH
+    path = export.export(fmt, variables, START, END)
+    assert expected > 0
+    assert exported_rows(fmt, path) == expected
+
+
+def test_export_without_rows_is_still_a_valid_file(dashboard):
+    for fmt in export.FORMATS:
+        assert exported_rows(fmt, export.export(fmt, ["chlor_a"], "2030-01-01", "2030-01-02")) == 0
+
+
+def test_export_reuses_the_built_file(dashboard):
+    first = export.export("parquet", ["chlor_a"], START, END)
+    built = first.stat().st_ino
+    second = export.export("parquet", ["chlor_a"], START, END)
+    assert second == first
+    assert second.stat().st_ino == built                      # THE SAME FILE, NOT A REBUILT ONE SWAPPED IN
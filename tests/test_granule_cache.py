@@ -0,0 +1,72 @@
+# 📁 tests/test_granule_cache.py
+# Download cache (LRU eviction, pinned granules) and the extraction manifest
+from granule_cache import GranuleCache
+
+SIZE = 1000
+
+
+def add(cache, tmp_path, gid):
+    downloaded = tmp_path / "incoming" / gid
+    downloaded.parent.mkdir(exist_ok=True)
+    downloaded.write_bytes(gid.encode().ljust(SIZE, b"."))
+    return cache.add(gid, downloaded)
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = GranuleCache(tmp_path / "cache", max_bytes=int(2.5 * SIZE))
+    for gid in ["a.nc", "b.nc"]:
+        cache.release(add(cache, tmp_path, gid))
+    cache.release(cache.lookup("a.nc"))                       # a USED AFTER b
+
+    cache.release(add(cache, tmp_path, "c.nc"))
+
+    assert cache.lookup("b.nc") is None
+    assert cache.lookup("a.nc") is not None and cache.lookup("c.nc") is not None
+    assert cache.size_bytes() == 2 * SIZE
+
+
+def test_pinned_granules_are_not_evicted(tmp_path):
+    cache = GranuleCache(tmp_path / "cache", max_bytes=SIZE)
+    a = add(cache, tmp_path, "a.nc")                          # STILL BEING PROCESSED
+    b = add(cache, tmp_path, "b.nc")
+    assert a.exists() and b.exists()
+
+    cache.release(a)                                          # NOW a CAN GO
+    assert not a.exists() and b.exists()
+
+
+def test_stale_checksum_is_a_miss(tmp_path):
+    cache = GranuleCache(tmp_path / "cache")
+    downloaded = tmp_path / "a.nc"
+    downloaded.write_bytes(b"v1")
+    cache.release(cache.add("a.nc", downloaded, checksum="v1"))
+
+    assert cache.lookup("a.nc", "v1") is not None
+    assert cache.lookup("a.nc", "v2") is None                 # REPROCESSED UPSTREAM: DOWNLOAD AGAIN
+
+
+def test_extraction_manifest(tmp_path):
+    cache = GranuleCache(tmp_path / "cache")
+    cache.mark_extracted("a.nc", ["lake#falklands"], 10, checksum="v1")
+    cache.mark_extracted("a.nc", ["cube#falklands"], 10, checksum="v1")
+
+    assert cache.is_extracted("a.nc", ["lake#falklands", "cube#falklands"], "v1")
+    assert not cache.is_extracted("a.nc", ["lake#falklands", "lake#south_georgia"], "v1")   # NEW REGION: PENDING
+    assert not cache.is_extracted("a.nc", ["lake#falklands"], "v2")
+    assert not cache.is_extracted("a.nc", [])                                               # NO STORES: ALWAYS LOAD
+
+    cache.mark_extracted("a.nc", ["lake#falklands"], 10, checksum="v2")                    # NEW VERSION STARTS OVER
+    assert cache.is_extracted("a.nc", ["lake#falklands"], "v2")
+    assert not cache.is_extracted("a.nc", ["cube#falklands"], "v2")
+
+
+def test_manifest_survives_a_restart(tmp_path):
+    cache = GranuleCache(tmp_path / "cache")
+    path = add(cache, tmp_path, "a.nc")
+    cache.release(path)
+    cache.mark_extracted("a.nc", ["lake#falklands"], 10)
+    cache.flush()
+
+    reopened = GranuleCache(tmp_path / "cache")
+    assert reopened.lookup("a.nc") == path
+    assert reopened.is_extracted("a.nc", ["lake#falklands"])
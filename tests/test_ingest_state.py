@@ -0,0 +1,43 @@
+# 📁 tests/test_ingest_state.py
+# Ingest checkpoints: finished days, per-granule progress, failures and the run history, saved after every change
+from ingest_state import IngestState, MAX_RUNS
+
+CHL, FLH = "PACE_OCI_L3M_CHL#falklands", "PACE_OCI_L3M_FLH#falklands"
+
+
+def test_checkpoints_survive_a_restart(tmp_path):
+    state = IngestState(tmp_path / "state.json")
+    state.mark_granule(CHL, "2024-12-26", "a.nc", 10)
+    state.finish_day(CHL, "2024-12-26")
+    state.mark_granule(CHL, "2024-12-27", "b.nc", 5)
+    state.mark_failed(CHL, "2024-12-27", ["c.nc"])
+
+    reopened = IngestState(tmp_path / "state.json")
+    assert reopened.is_day_done(CHL, "2024-12-26")
+    assert not reopened.is_day_done(CHL, "2024-12-27")
+    assert reopened.data["products"][CHL]["granules"] == {"2024-12-27": {"b.nc": 5}}
+    assert reopened.failed() == {CHL: {"2024-12-27": ["c.nc"]}}
+
+
+def test_retried_granule_leaves_the_failed_list(tmp_path):
+    state = IngestState(tmp_path / "state.json")
+    state.mark_failed(CHL, "2024-12-27", ["c.nc", "c.nc"])
+    assert state.failed() == {CHL: {"2024-12-27": ["c.nc"]}}
+    state.mark_granule(CHL, "2024-12-27", "c.nc", 3)
+    assert state.failed() == {}
+
+
+def test_last_done_day_waits_for_every_product(tmp_path):
+    state = IngestState(tmp_path / "state.json")
+    state.finish_day(CHL, "2024-12-27")
+    assert state.last_done_day([CHL, FLH]) is None
+    state.finish_day(FLH, "2024-12-26")
+    assert state.last_done_day([CHL, FLH]) == "2024-12-26"
+
+
+def test_run_history_is_bounded(tmp_path):
+    state = IngestState(tmp_path / "state.json")
+    for n in range(MAX_RUNS + 5):
+        state.record_run({"command": "ingest", "granules": n})
+    assert len(state.data["runs"]) == MAX_RUNS
+    assert state.data["runs"][-1]["granules"] == MAX_RUNS + 4
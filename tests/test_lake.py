@@ -0,0 +1,75 @@
+# 📁 tests/test_lake.py
+# Parquet lake: re-ingesting replaces a day's rows, and every rollup adds up to the raw rows it came from
+import numpy as np
+import pandas as pd
+import lake
+from config import default_region, grid_levels
+
+
+def rollup(root, view):
+    con = lake.connect(root / "lake")
+    try:
+        return con.execute(f"SELECT * FROM {view} WHERE region = ?", [default_region]).df()
+    finally:
+        con.close()
+
+
+def test_reingest_replaces_rows(ingest, raw_rows, tmp_path):
+    ingest(tmp_path)
+    before = raw_rows(tmp_path)
+    daily_before = rollup(tmp_path, "satellite_daily").sort_values(["variable", "date"], ignore_index=True)
+
+    summary = ingest(tmp_path, redo=True)                      # EVERY GRANULE LOADED AGAIN
+    after = raw_rows(tmp_path)
+    daily_after = rollup(tmp_path, "satellite_daily").sort_values(["variable", "date"], ignore_index=True)
+
+    assert summary["granules"] == 10
+    assert len(after) == len(before) > 0
+    assert not after.duplicated(["variable", "date", "latitude", "longitude"]).any()
+    pd.testing.assert_frame_equal(daily_after, daily_before)
+
+
+def test_rerun_skips_checkpointed_days(ingest, tmp_path):
+    ingest(tmp_path)
+    assert ingest(tmp_path)["granules"] == 0
+
+
+def test_daily_rollup_matches_raw(store, raw_rows):
+    raw = raw_rows(store).groupby(["variable", "date"]).agg(total=("value", "sum"), n=("value", "count"), max=("value", "max"))
+    daily = rollup(store, "satellite_daily").set_index(["variable", "date"]).sort_index()
+    raw = raw.sort_index()
+
+    assert list(daily.index) == list(raw.index)
+    np.testing.assert_allclose(daily["value_total"], raw["total"], rtol=1e-6)
+    np.testing.assert_array_equal(daily["value_count"], raw["n"])
+    np.testing.assert_allclose(daily["value_max"], raw["max"])
+
+
+def test_cell_rollups_add_up_to_raw_sums(store, raw_rows):
+    raw = raw_rows(store)
+    by_day = raw.groupby(["variable", "date"])["value"].agg(["sum", "count"])
+    by_period = raw.groupby(["variable", "period"])["value"].agg(["sum", "count"])
+    assert set(raw["period"]) == {"before", "after"}
+
+    daily_cells = rollup(store, "satellite_daily_cells")
+    period_cells = rollup(store, "satellite_period_cells")
+    assert set(daily_cells["grid"]) == set(period_cells["grid"]) == set(grid_levels)
+    for grid in grid_levels:                                   # EVERY PYRAMID LEVEL HOLDS THE SAME TOTALS
+        day = daily_cells[daily_cells["grid"] == grid].groupby(["variable", "date"])[["value_sum", "value_count"]].sum()
+        period = period_cells[period_cells["grid"] == grid].groupby(["variable", "period"])[["value_sum", "value_count"]].sum()
+        np.testing.assert_allclose(day["value_sum"], by_day["sum"].loc[day.index], rtol=1e-6)
+        np.testing.assert_array_equal(day["value_count"], by_day["count"].loc[day.index])
+        np.testing.assert_allclose(period["value_sum"], by_period["sum"].loc[period.index], rtol=1e-6)
+        np.testing.assert_array_equal(period["value_count"], by_period["count"].loc[period.index])
+
+
+def test_matchups_pair_chl_and_flh_cells(store, raw_rows):
+    matchups = rollup(store, "satellite_matchups")
+    raw = raw_rows(store)
+    chl = raw[raw["variable"] == "chlor_a"].dropna(subset=["value"])
+    flh = raw[raw["variable"] == "nflh"].dropna(subset=["value"])
+    both = chl.merge(flh, on=["date", "latitude", "longitude"])
+
+    assert len(matchups) == len(both) > 0                      # SAME GRID: EVERY SHARED CELL IS AN EXACT MATCH
+    assert (matchups["distance"] == 0).all()
+    assert matchups["sample"].between(0, 1).all()
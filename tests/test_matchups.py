@@ -0,0 +1,50 @@
+# 📁 tests/test_matchups.py
+# CHL vs FLH pairing by native grid cell (exact, and within a tolerance) and the stable sampling key
+import numpy as np
+import pandas as pd
+import matchups
+from config import grid_levels, native_grid
+
+STEP = grid_levels[native_grid]
+
+
+def cells(rows):
+    return pd.DataFrame(rows, columns=["cell_row", "cell_col", "value"])
+
+
+def test_exact_matches_only_by_default():
+    chl = cells([(10, 10, 1.0), (10, 11, 2.0)])
+    flh = cells([(10, 10, 0.5), (11, 11, 0.7)])
+    pairs = matchups.pair_cells(chl, flh)
+    assert pairs[["cell_row", "cell_col", "chl", "flh", "distance"]].values.tolist() == [[10, 10, 1.0, 0.5, 0.0]]
+
+
+def test_tolerance_takes_the_nearest_cell():
+    chl = cells([(10, 10, 1.0), (10, 13, 2.0), (20, 20, 3.0)])
+    flh = cells([(10, 10, 0.5), (11, 13, 0.7), (11, 14, 0.8), (22, 20, 0.9)])
+    pairs = matchups.pair_cells(chl, flh, tolerance=1).sort_values("cell_col", ignore_index=True)
+    assert pairs["flh"].tolist() == [0.5, 0.7]                # (10, 13) -> (11, 13), NOT THE DIAGONAL (11, 14)
+    assert pairs["distance"].tolist() == [0.0, 1.0]           # (20, 20): NOTHING WITHIN ONE CELL
+
+
+def test_daily_matchups_pair_pixels_whose_coordinates_differ_by_rounding():
+    lat, lon = -51.0 - STEP / 2, -60.0 + STEP / 2
+    rows = pd.DataFrame({
+        "variable": ["chlor_a", "nflh", "chlor_a"],
+        "latitude": np.array([lat, lat + 1e-5, lat - STEP], dtype="float32"),
+        "longitude": np.array([lon, lon - 1e-5, lon], dtype="float32"),
+        "value": [1.0, 0.5, 2.0],
+    })
+    df = matchups.daily_matchups(rows, "2024-12-26", tolerance=0)
+    assert list(df.columns) == matchups.COLUMNS
+    assert len(df) == 1 and (df["chl"].iloc[0], df["flh"].iloc[0]) == (1.0, 0.5)
+    assert df["chl_variable"].iloc[0] == "chlor_a" and df["flh_variable"].iloc[0] == "nflh"
+
+
+def test_sample_key_is_stable_and_spread():
+    rows, cols = np.arange(1000) // 40, np.arange(1000) % 40
+    first = matchups.sample_key("2024-12-26", rows, cols)
+    assert np.array_equal(first, matchups.sample_key("2024-12-26", rows, cols))
+    assert not np.array_equal(first, matchups.sample_key("2024-12-27", rows, cols))
+    assert ((first >= 0) & (first < 1)).all()
+    assert 0.4 < first.mean() < 0.6
@@ -0,0 +1,45 @@
+# 📁 tests/test_raster.py
+# Server-side heatmap PNGs: cells land in their place, empty cells are transparent, the extent snaps to cells
+import base64
+import io
+import numpy as np
+import pandas as pd
+from PIL import Image
+import raster
+
+
+def decode(image):
+    return np.asarray(Image.open(io.BytesIO(base64.b64decode(image["source"].split(",", 1)[1]))))
+
+
+def test_cells_and_gaps():
+    # 2 x 2 cells of the 0.25deg grid, the south-east one missing
+    cells = pd.DataFrame({"lat_bin": [-51.125, -51.125, -51.375], "lon_bin": [-59.875, -59.625, -59.875],
+                          "avg_value": [1.0, 2.0, 3.0]})
+    image = raster.rasterize(cells, "0.25deg")
+    pixels = decode(image)
+
+    assert image["extent"] == (-60.0, -51.5, -59.5, -51.0)
+    assert image["cells"] == 3 and (image["vmin"], image["vmax"]) == (1.0, 3.0)
+    height, width = pixels.shape[:2]
+    assert pixels.shape[2] == 4 and width % 2 == 0
+    north_west, north_east = pixels[0, 0], pixels[0, width - 1]
+    south_west, south_east = pixels[height - 1, 0], pixels[height - 1, width - 1]
+    assert north_west[3] > 0 and north_east[3] > 0 and south_west[3] > 0
+    assert south_east[3] == 0                                  # NO CELL: TRANSPARENT
+    assert tuple(north_west[:3]) == tuple(raster.LUT[0])       # MIN OF THE VIEW
+    assert tuple(south_west[:3]) == tuple(raster.LUT[255])     # MAX OF THE VIEW
+
+
+def test_extent_snaps_to_cells_and_drops_cells_outside():
+    cells = pd.DataFrame({"lat_bin": [-51.125, -40.125], "lon_bin": [-59.875, -59.875], "avg_value": [1.0, 2.0]})
+    image = raster.rasterize(cells, "0.25deg", extent=(-60.1, -51.6, -59.4, -50.9))
+
+    assert image["extent"] == (-60.25, -51.75, -59.25, -50.75)
+    assert image["cells"] == 1
+
+
+def test_nothing_to_draw():
+    assert raster.rasterize(pd.DataFrame(columns=["lat_bin", "lon_bin", "avg_value"])) is None
+    outside = pd.DataFrame({"lat_bin": [10.125], "lon_bin": [10.125], "avg_value": [1.0]})
+    assert raster.rasterize(outside, "0.25deg", extent=(-60.0, -52.0, -58.0, -50.0)) is None
@@ -0,0 +1,26 @@
+# 📁 version_marker.py
+# Data version marker of a file store (the Parquet lake, the cube store): a _VERSION file holding a
+# timestamp, rewritten atomically after every change. The dashboard's refresher polls it
+# (queries.data_version) and loads a new snapshot when it changes.
+import os
+import time
+from pathlib import Path
+
+FILE_NAME = "_VERSION"
+
+
+def path(root):
+    return Path(root) / FILE_NAME
+
+
+def bump(root):
+    marker = path(root)
+    tmp = marker.with_suffix(".tmp")
+    tmp.write_text(str(time.time_ns()))
+    os.replace(tmp, marker)                # READERS SEE THE OLD VERSION OR THE NEW ONE
+
+
+# Current version, or None if the store was never written
+def read(root):
+    marker = path(root)
+    return marker.read_text().strip() if marker.exists() else None